@@ -0,0 +1,94 @@
+# adaptive.py
+
+import numpy as np
+from scipy.stats import norm
+
+# two-sided 95% normal quantile used for the stopping intervals
+Z95 = float(norm.ppf(0.975))
+
+
+def buffer_size(max_sims: int, var_level: float, es_level: float, z: float = Z95) -> int:
+    """
+    Number of largest losses per date that must be kept so VaR, ES and
+    the order-statistic interval can be read off after max_sims paths.
+    """
+    p = 1 - min(var_level, es_level)
+    return int(np.ceil(p * max_sims + z * np.sqrt(p * max_sims))) + 3
+
+
+def merge_top(top: np.ndarray, losses: np.ndarray) -> np.ndarray:
+    """Largest top.shape[1] values of each row of top and losses together."""
+    both = np.concatenate([top, losses], axis=1)
+    cap = top.shape[1]
+    return np.partition(both, both.shape[1] - cap, axis=1)[:, -cap:]
+
+
+def _percentile_desc(desc, n, level):
+    """np.percentile(x, 100 * level) per row, from x's largest values in descending order."""
+    r = np.arange(len(desc))
+    h = (n - 1) * (100 * level / 100)
+    lo = np.floor(h).astype(int)
+    hi = np.minimum(lo + 1, n - 1)
+    g = h - lo
+    a, b = desc[r, n - 1 - lo], desc[r, n - 1 - hi]
+    d = b - a
+    return np.where(g >= 0.5, b - d * (1 - g), a + d * g), lo, hi
+
+
+def top_estimates(top: np.ndarray, n: np.ndarray, var_level: float, es_level: float,
+                  z: float = Z95):
+    """
+    VaR, ES and their standard errors for rows of n paths each, given
+    only each row's largest losses top (any order, -inf padded).
+    The VaR error is the distribution-free order-statistic interval
+    (ranks n*level -/+ z*sqrt(n*p*(1-p))) divided by 2z; the ES error
+    is the asymptotic sqrt((Var(L | L >= VaR) + level*(ES - VaR)^2) / (n*p)).
+    """
+    desc = -np.sort(-top, axis=1)
+    r, cap = np.arange(len(desc)), desc.shape[1]
+    var, lo, hi = _percentile_desc(desc, n, var_level)
+
+    p = 1 - var_level
+    spread = np.ceil(z * np.sqrt(n * p * (1 - p))).astype(int)
+    upper = desc[r, np.clip(n - 1 - hi - spread, 0, cap - 1)]
+    lower = desc[r, np.clip(n - 1 - lo + spread, 0, np.minimum(n, cap) - 1)]
+    var_se = (upper - lower) / (2 * z)
+
+    cutoff, _, _ = _percentile_desc(desc, n, es_level)
+    tail = desc >= cutoff[:, None]
+    k = tail.sum(axis=1)
+    es = np.where(tail, desc, 0.0).sum(axis=1) / k
+    dev = np.where(tail, desc - es[:, None], 0.0)
+    tail_var = (dev * dev).sum(axis=1) / np.maximum(k - 1, 1)
+    es_se = np.sqrt((tail_var + es_level * (es - cutoff)**2) / (n * (1 - es_level)))
+    return var, es, var_se, es_se
+
+
+def adaptive_tail(draw, rows: int, var_level: float, es_level: float,
+                  rel_tol: float = 0.01, batch: int = 1000,
+                  max_sims: int = 100_000, z: float = Z95):
+    """
+    Run batches of batch paths per date until the z-level interval of
+    both VaR and ES is within rel_tol of the estimate, or max_sims paths
+    have been used. draw(rows, n) must return the (len(rows) x n) losses
+    of the next batch for those row numbers. Only each date's largest
+    losses are kept between batches, so memory does not grow with the
+    path count.
+    Returns (var, es, var_se, es_se, n_sims) arrays.
+    """
+    max_sims = batch * max(1, max_sims // batch)
+    top = np.full((rows, buffer_size(max_sims, var_level, es_level, z)), -np.inf)
+    n = np.zeros(rows, dtype=int)
+    out = np.full((4, rows), np.nan)
+
+    active = np.arange(rows)
+    while len(active):
+        top[active] = merge_top(top[active], draw(active, batch))
+        n[active] += batch
+        est = top_estimates(top[active], n[active], var_level, es_level, z)
+        out[:, active] = est
+        var, es, var_se, es_se = est
+        done = ((z * var_se <= rel_tol * np.abs(var)) & (z * es_se <= rel_tol * np.abs(es))) \
+            | (n[active] >= max_sims)
+        active = active[~done]
+    return out[0], out[1], out[2], out[3], n
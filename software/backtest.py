@@ -0,0 +1,191 @@
+# backtest.py
+
+import numpy as np
+import pandas as pd
+from scipy.special import xlogy
+from scipy.stats import binom, chi2
+
+ZONES = np.array(["green", "yellow", "red"])
+# Basel cumulative binomial probabilities bounding the green and yellow zones
+GREEN, YELLOW = 0.95, 0.9999
+# Acerbi-Szekely 5% critical value of Z2, stable across the usual tails
+Z2_CRITICAL = -0.70
+
+
+def realized_losses(prices, horizon: int = 5, positions=None):
+    """
+    Realized horizon loss from each date, S_t - S_{t+horizon} (positive
+    when the price falls), for a price Series or a (dates x codes)
+    DataFrame. positions scales each column (e.g. shares held). The
+    last horizon dates have no realized loss and are NaN.
+    """
+    losses = prices - prices.shift(-horizon)
+    return losses if positions is None else losses * positions
+
+
+def _frame(x) -> pd.DataFrame:
+    return x.to_frame() if isinstance(x, pd.Series) else x
+
+
+def _align(losses, var):
+    """
+    Losses as a (dates x series) array matching var's columns: either
+    the same columns, one column per book when var has (model, book)
+    columns (each book's losses are reused for every model), or a
+    single column reused for every series.
+    """
+    losses, var = _frame(losses), _frame(var)
+    if isinstance(var.columns, pd.MultiIndex) and not isinstance(losses.columns, pd.MultiIndex):
+        books = var.columns.get_level_values(-1)
+    elif losses.shape[1] == 1:
+        books = [losses.columns[0]] * var.shape[1]
+    else:
+        books = var.columns
+    L = losses.reindex(index=var.index)[books].to_numpy(dtype=float)
+    return L, var.to_numpy(dtype=float)
+
+
+def exceptions(losses, var, step: int = 1):
+    """
+    Exception indicators (loss above VaR) and the mask of dates where
+    both are known, as (dates x series) arrays on var's dates. step > 1
+    keeps every step-th date so overlapping horizons do not make the
+    exceptions serially dependent (use step=horizon).
+    """
+    L, V = _align(losses, var)
+    L, V = L[::step], V[::step]
+    valid = np.isfinite(L) & np.isfinite(V)
+    return (L > V) & valid, valid
+
+
+def kupiec(n_exc, n_obs, var_level: float):
+    """
+    Kupiec proportion-of-failures likelihood ratio and its chi2(1)
+    p-value for n_exc exceptions in n_obs dates (arrays broadcast).
+    """
+    x, n = np.asarray(n_exc, dtype=float), np.asarray(n_obs, dtype=float)
+    p = 1 - var_level
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = x / n
+        lr = -2 * (xlogy(n - x, 1 - p) + xlogy(x, p) - xlogy(n - x, 1 - rate) - xlogy(x, rate))
+    return lr, chi2.sf(lr, 1)
+
+
+def christoffersen(exc: np.ndarray, valid: np.ndarray):
+    """
+    Christoffersen independence likelihood ratio and its chi2(1)
+    p-value per column, from the counts of exception transitions
+    between consecutive valid dates.
+    """
+    pair = valid[:-1] & valid[1:]
+    prev, curr = exc[:-1], exc[1:]
+    n00 = (pair & ~prev & ~curr).sum(axis=0).astype(float)
+    n01 = (pair & ~prev & curr).sum(axis=0).astype(float)
+    n10 = (pair & prev & ~curr).sum(axis=0).astype(float)
+    n11 = (pair & prev & curr).sum(axis=0).astype(float)
+    # a state never visited has no transitions and contributes 0, so a
+    # column without exceptions gets LR 0 rather than 0/0
+    n0, n1 = n00 + n01, n10 + n11
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pi = np.where(n0 + n1 > 0, (n01 + n11) / (n0 + n1), 0.0)
+        pi0 = np.where(n0 > 0, n01 / n0, 0.0)
+        pi1 = np.where(n1 > 0, n11 / n1, 0.0)
+        restricted = xlogy(n00 + n10, 1 - pi) + xlogy(n01 + n11, pi)
+        free = (xlogy(n00, 1 - pi0) + xlogy(n01, pi0)
+                + xlogy(n10, 1 - pi1) + xlogy(n11, pi1))
+    lr = -2 * (restricted - free)
+    return lr, chi2.sf(lr, 1)
+
+
+def acerbi_z2(losses, var, es, es_level: float, step: int = 1):
+    """
+    Acerbi-Szekely Z2 statistic per column,
+        Z2 = 1 - sum(L_t 1{L_t > VaR_t} / ES_t) / (T (1 - es_level)),
+    with VaR and ES both at es_level. It is 0 in expectation when ES is
+    right and negative when ES understates the tail; Z2 < Z2_CRITICAL
+    rejects at about 5%.
+    """
+    exc, valid = exceptions(losses, var, step)
+    L, E = _align(losses, es)
+    L, E = L[::step], E[::step]
+    valid &= np.isfinite(E)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tail = np.where(exc & valid, L / E, 0.0).sum(axis=0)
+        return 1 - tail / (valid.sum(axis=0) * (1 - es_level))
+
+
+def backtest(losses, var, var_level: float, es=None, es_level: float = None,
+             es_var=None, step: int = 1) -> pd.DataFrame:
+    """
+    Backtest VaR (and optionally ES) series against realized losses.
+
+    losses: realized horizon losses (see realized_losses), a Series or
+            a (dates x books) DataFrame.
+    var:    VaR Series or (dates x series) DataFrame from any model;
+            columns may be (model, book) pairs, whose losses are then
+            taken from the book's column.
+    es:     ES at es_level on the same columns; es_var is the VaR at
+            es_level used for the Z2 tail indicator (var by default,
+            i.e. when both were computed at the same level).
+    step:   keep every step-th date (step=horizon gives non-overlapping
+            periods).
+    Every statistic is computed for all columns at once.
+    Returns a DataFrame indexed by var's columns with columns n_obs,
+    exceptions, rate, expected, kupiec_lr, kupiec_p,
+    christoffersen_lr, christoffersen_p, cc_lr, cc_p (and z2, z2_reject).
+    """
+    exc, valid = exceptions(losses, var, step)
+    n_obs = valid.sum(axis=0)
+    n_exc = exc.sum(axis=0)
+    pof_lr, pof_p = kupiec(n_exc, n_obs, var_level)
+    ind_lr, ind_p = christoffersen(exc, valid)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = n_exc / n_obs
+    out = pd.DataFrame({
+        "n_obs": n_obs, "exceptions": n_exc, "rate": rate,
+        "expected": n_obs * (1 - var_level),
+        "kupiec_lr": pof_lr, "kupiec_p": pof_p,
+        "christoffersen_lr": ind_lr, "christoffersen_p": ind_p,
+        "cc_lr": pof_lr + ind_lr, "cc_p": chi2.sf(pof_lr + ind_lr, 2),
+    }, index=_frame(var).columns)
+    if es is not None:
+        es_level = var_level if es_level is None else es_level
+        z2 = acerbi_z2(losses, var if es_var is None else es_var, es, es_level, step)
+        out["z2"] = z2
+        out["z2_reject"] = z2 < Z2_CRITICAL
+    return out
+
+
+def rolling_exceptions(losses, var, window: int = 250, step: int = 1) -> pd.DataFrame:
+    """
+    Exceptions over the trailing window dates of each column, from
+    cumulative sums (NaN where the window is not full or has a date
+    without a loss or VaR).
+    """
+    exc, valid = exceptions(losses, var, step)
+    var = _frame(var)
+    out = np.full(exc.shape, np.nan)
+    c = np.vstack([np.zeros((1, exc.shape[1])), np.cumsum(exc, axis=0)])
+    m = np.vstack([np.zeros((1, exc.shape[1])), np.cumsum(valid, axis=0)])
+    counts = c[window:] - c[:-window]
+    seen = m[window:] - m[:-window]
+    out[window - 1:] = np.where(seen == window, counts, np.nan)
+    return pd.DataFrame(out, index=var.index[::step], columns=var.columns)
+
+
+def traffic_light(losses, var, var_level: float = 0.99, window: int = 250,
+                  step: int = 1) -> pd.DataFrame:
+    """
+    Basel traffic-light zone of each column on each date from the
+    exceptions in the trailing window: green while the binomial
+    probability of at most that many exceptions is below 95%, yellow
+    below 99.99%, red above (0-4 / 5-9 / 10+ for 250 days at 99%).
+    Dates without a full window are None.
+    """
+    counts = rolling_exceptions(losses, var, window, step)
+    # zone of every possible count, looked up rather than evaluated per cell
+    cdf = binom.cdf(np.arange(window + 1), window, 1 - var_level)
+    by_count = np.append(ZONES[(cdf >= GREEN).astype(int) + (cdf >= YELLOW)], None)
+    c = counts.to_numpy()
+    out = by_count[np.where(np.isnan(c), window + 1, c).astype(int)]
+    return pd.DataFrame(out, index=counts.index, columns=counts.columns)
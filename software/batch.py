@@ -0,0 +1,190 @@
+# batch.py
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from montecarlo import MEM_BUDGET, chunk_rows, tail_stats
+from random_source import get_rng
+from portfolio import delta_normal_var_es, jittered_cholesky
+import price_store
+
+
+def load_positions(path: str) -> pd.DataFrame:
+    """
+    Read a long positions file with columns book, code, shares and
+    return the weight matrix (security codes x books) of share counts.
+    """
+    pos = pd.read_csv(path, dtype={"book": str, "code": str, "shares": float})
+    missing = {"book", "code", "shares"} - set(pos.columns)
+    if missing:
+        raise ValueError(f"positions file is missing column(s): {', '.join(sorted(missing))}")
+    return pos.pivot_table(index="code", columns="book", values="shares",
+                           aggfunc="sum", fill_value=0.0)
+
+
+def book_values(prices: pd.DataFrame, weights: pd.DataFrame) -> pd.DataFrame:
+    """
+    Value of every book on every date: the (dates x codes) price matrix
+    times the (codes x books) weight matrix.
+    """
+    unknown = weights.index.difference(prices.columns)
+    if len(unknown):
+        raise KeyError(f"Unknown stock code(s): {', '.join(unknown)}")
+    P = prices[weights.index].dropna()
+    return pd.DataFrame(P.to_numpy() @ weights.to_numpy(),
+                        index=P.index, columns=weights.columns)
+
+
+def ewm_moments(R: np.ndarray, lambda_: float):
+    """
+    Exponentially weighted (adjust=False) mean vector and covariance
+    matrix of the rows of R with decay lambda_, on the latest date; the
+    diagonal matches pandas' ewm().var() of each column.
+    """
+    T = len(R)
+    w = (1 - lambda_) * lambda_ ** np.arange(T - 1, -1, -1.0)
+    w[0] = lambda_ ** (T - 1)
+    mu = w @ R
+    D = R - mu
+    cov = (D * w[:, None]).T @ D / (1 - np.sum(w**2))
+    return mu, cov
+
+
+def _book_groups(weights: pd.DataFrame):
+    """
+    Books grouped by the codes they actually hold, so each group can be
+    evaluated on the dates where all of its own codes have prices.
+    """
+    held = weights.ne(0)
+    groups = {}
+    for book in weights.columns:
+        groups.setdefault(tuple(weights.index[held[book]]), []).append(book)
+    return groups.items()
+
+
+def _evaluate_group(P: pd.DataFrame, W: pd.DataFrame, var_level: float, es_level: float,
+                    window_days: int, lambda_: float, n_sims: int, rng,
+                    mem_budget: int) -> pd.DataFrame:
+    """
+    Latest-date VaR/ES of books W (codes x books) holding only the codes
+    of the NaN-free price panel P, from their dollar exposures.
+    """
+    R = np.log(P / P.shift(1)).dropna().to_numpy()
+    if len(R) <= window_days:
+        raise ValueError(f"need more than {window_days} returns, got {len(R)} "
+                         f"for book(s) {', '.join(W.columns)}")
+    # exposures on the latest date, one row per book
+    E = (P.iloc[-1].to_numpy()[:, None] * W.to_numpy()).T
+    out = pd.DataFrame(index=W.columns)
+
+    # 1) parametric over the window_days returns before the latest date
+    window = R[-window_days - 1:-1]
+    mu, cov = window.mean(axis=0), np.atleast_2d(np.cov(window, rowvar=False))
+    sigma = np.sqrt(np.maximum(np.einsum("bi,ij,bj->b", E, cov, E), 0.0))
+    out["param_var"], out["param_es"] = delta_normal_var_es(E @ mu, sigma, var_level, es_level)
+
+    # 2) exponentially weighted moments on the latest date
+    mu_w, cov_w = ewm_moments(R, lambda_)
+    sigma_w = np.sqrt(np.maximum(np.einsum("bi,ij,bj->b", E, cov_w, E), 0.0))
+    out["ewm_var"], out["ewm_es"] = delta_normal_var_es(E @ mu_w, sigma_w,
+                                                        var_level, es_level)
+
+    # 3) historical: today's exposures revalued on each 5-day return of the window
+    growth = np.expm1(np.log(P / P.shift(5)).dropna().to_numpy()[-window_days:])
+    hist_var, hist_es = np.empty(len(E)), np.empty(len(E))
+    rows = chunk_rows(len(growth), mem_budget)
+    for start in range(0, len(E), rows):
+        sl = slice(start, start + rows)
+        hist_var[sl], hist_es[sl] = tail_stats(-E[sl] @ growth.T, var_level, es_level)
+    out["hist_var"], out["hist_es"] = hist_var, hist_es
+
+    # 4) Monte Carlo: correlated 5-day returns of the codes, one block of
+    #    paths reused by every book in the group
+    Z = rng.standard_normal((n_sims, len(mu)))
+    growth = np.expm1(5 * mu + np.sqrt(5) * Z @ jittered_cholesky(cov).T)
+    mc_var, mc_es = np.empty(len(E)), np.empty(len(E))
+    rows = chunk_rows(n_sims, mem_budget)
+    for start in range(0, len(E), rows):
+        sl = slice(start, start + rows)
+        mc_var[sl], mc_es[sl] = tail_stats(-E[sl] @ growth.T, var_level, es_level)
+    out["mc_var"], out["mc_es"] = mc_var, mc_es
+
+    out.insert(0, "value", E.sum(axis=1))
+    out.insert(0, "date", P.index[-1])
+    return out
+
+
+def evaluate_books(prices: pd.DataFrame, weights: pd.DataFrame,
+                   var_level: float, es_level: float,
+                   window_days: int = 5 * 252, lambda_: float = 0.9989,
+                   n_sims: int = 10000, rng=None,
+                   mem_budget: int = MEM_BUDGET) -> pd.DataFrame:
+    """
+    Latest-date 5-day VaR and ES of every book from its dollar exposures
+    (shares x latest price per code), under the models of
+    historical_calibration: parametric 5yr and parametric EWM as
+    delta-normal P&L (see portfolio.delta_normal_var_es), historical
+    revaluation of the exposures on each 5-day return of the window,
+    and Monte Carlo on correlated GBM draws. Long/short and zero-value
+    books need no special care since nothing is divided by book value.
+    Books holding the same codes are evaluated together as array
+    operations, on the dates where those codes all have prices, so a
+    gap in one code never shortens another book's history. Returns one
+    row per book.
+    """
+    unknown = weights.index.difference(prices.columns)
+    if len(unknown):
+        raise KeyError(f"Unknown stock code(s): {', '.join(unknown)}")
+    rng = get_rng(rng)
+    tables = []
+    for codes, books in _book_groups(weights):
+        P = prices[list(codes)].dropna()
+        if not codes:
+            # nothing held: no value and no risk
+            tables.append(pd.DataFrame({"date": P.index[-1], "value": 0.0}, index=books))
+            continue
+        tables.append(_evaluate_group(P, weights.loc[list(codes), books], var_level, es_level,
+                                      window_days, lambda_, n_sims, rng, mem_budget))
+    out = pd.concat(tables).reindex(weights.columns)
+    return out.fillna({c: 0.0 for c in out.columns if c not in ("date", "value")})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate 5-day VaR/ES for many books against one price file.")
+    parser.add_argument("--prices", required=True,
+                        help="CSV with dates as index and security codes as columns, "
+                             "or a price_store directory")
+    parser.add_argument("--positions", required=True,
+                        help="CSV with columns book, code, shares")
+    parser.add_argument("--out", default="output/books.csv")
+    parser.add_argument("--var-level", type=float, default=0.99)
+    parser.add_argument("--es-level", type=float, default=0.975)
+    parser.add_argument("--window", type=int, default=5 * 252)
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=0.9989)
+    parser.add_argument("--n-sims", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    prices = price_store.load_prices(args.prices)
+    if prices.empty:
+        print("Error: price file is empty", file=sys.stderr)
+        sys.exit(1)
+    try:
+        weights = load_positions(args.positions)
+        table = evaluate_books(prices, weights, args.var_level, args.es_level,
+                               args.window, args.lambda_, args.n_sims, args.seed)
+    except (KeyError, ValueError) as e:
+        print(f"Error: {e.args[0]}", file=sys.stderr)
+        sys.exit(1)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    table.to_csv(args.out, index_label="book")
+    print(f"Wrote {len(table)} books to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
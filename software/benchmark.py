@@ -0,0 +1,236 @@
+# benchmark.py
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import parametric5yr
+import parametric_ewm
+import historical
+import filtered_historical
+import montecarlo
+import option_parametric
+import option_mento_carlo
+import batch
+import backtest
+import stats_cache
+from portfolio import PortfolioEngine
+
+GRIDS = {
+    "quick": {"lengths": [1500, 3000], "windows": [252, 1260],
+              "sims": [1000], "assets": [1, 10]},
+    "full":  {"lengths": [1500, 3000, 6000, 12000], "windows": [252, 1260],
+              "sims": [1000, 10000], "assets": [1, 10, 50, 200]},
+}
+
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=7):
+    """Synthetic GBM price path on business days (same as the tests)."""
+    rng = np.random.default_rng(seed)
+    dt = 1/252
+    increments = rng.normal((mu - 0.5*sigma**2)*dt, sigma*np.sqrt(dt), size=days).cumsum()
+    return pd.Series(S0 * np.exp(increments),
+                     index=pd.bdate_range('2010-01-01', periods=days))
+
+
+def simulate_panel(n_assets, days, seed=7):
+    """n_assets independent GBM paths as a (dates x codes) DataFrame."""
+    rng = np.random.default_rng(seed)
+    mu = rng.uniform(0.0, 0.10, n_assets)
+    sigma = rng.uniform(0.10, 0.40, n_assets)
+    return pd.DataFrame({f"S{j}": simulate_gbm(mu[j], sigma[j], days=days, seed=seed + j)
+                         for j in range(n_assets)})
+
+
+def cases(grid):
+    """
+    Yield (name, params, func) for every benchmarked call. func returns
+    the number of result rows so throughput can be reported per row.
+    Inputs are bound as default arguments, so the cases can be
+    collected first and run later.
+    """
+    K, T = 100.0, 0.5
+    levels = [0.95, 0.975, 0.99, 0.995]
+    for n in grid["lengths"]:
+        prices = simulate_gbm(0.05, 0.20, days=n)
+        p = {"length": n}
+        yield "parametric5yr.compute_var", p, \
+            lambda x=prices: len(parametric5yr.compute_var(x, 0.99))
+        yield "parametric5yr.compute_es", p, \
+            lambda x=prices: len(parametric5yr.compute_es(x, 0.975))
+        yield "parametric_ewm.compute_var", p, \
+            lambda x=prices: len(parametric_ewm.compute_var(x, 0.99, 0.9989))
+        yield "parametric_ewm.compute_es", p, \
+            lambda x=prices: len(parametric_ewm.compute_es(x, 0.975, 0.9989))
+
+        for w in grid["windows"]:
+            if w >= n - 10:
+                continue
+            p = {"length": n, "window": w}
+            yield "historical.compute_var", p, \
+                lambda x=prices, w=w: len(historical.compute_var(x, 0.99, w))
+            yield "historical.compute_es", p, \
+                lambda x=prices, w=w: len(historical.compute_es(x, 0.975, w))
+            yield "historical.compute_var_es", {**p, "levels": len(levels)}, \
+                lambda x=prices, w=w: len(historical.compute_var_es(x, levels, levels, w))
+            yield "historical.compute_var_es_horizons", p, \
+                lambda x=prices, w=w: len(historical.compute_var_es_horizons(x, 0.99, 0.975, w,
+                                                                             (1, 5, 10)))
+            yield "filtered_historical.compute_var", p, \
+                lambda x=prices, w=w: len(filtered_historical.compute_var(x, 0.99, w))
+            yield "filtered_historical.compute_es", p, \
+                lambda x=prices, w=w: len(filtered_historical.compute_es(x, 0.975, w))
+            yield "option_parametric.compute_var_series", p, \
+                lambda x=prices, w=w: len(option_parametric.compute_var_series(x, K, T, 0.99,
+                                                                               w, 1.0))
+            yield "option_parametric.compute_es_series", p, \
+                lambda x=prices, w=w: len(option_parametric.compute_es_series(x, K, T, 0.975,
+                                                                              w, 1.0))
+            for s in grid["sims"]:
+                p = {"length": n, "window": w, "sims": s}
+                yield "montecarlo.compute_var", p, \
+                    lambda x=prices, w=w, s=s: len(montecarlo.compute_var(x, 0.99, w, s, rng=0))
+                yield "montecarlo.compute_es", p, \
+                    lambda x=prices, w=w, s=s: len(montecarlo.compute_es(x, 0.975, w, s, rng=0))
+                yield "montecarlo.compute_var_es", {**p, "levels": len(levels)}, \
+                    lambda x=prices, w=w, s=s: len(montecarlo.compute_var_es(
+                        x, levels, levels, w, s, rng=0))
+                yield "option_mento_carlo.compute_var_series", p, \
+                    lambda x=prices, w=w, s=s: len(option_mento_carlo.compute_var_series(
+                        x, K, T, 0.99, w, 1.0, n_sims=s, rng=0))
+                yield "option_mento_carlo.compute_es_series", p, \
+                    lambda x=prices, w=w, s=s: len(option_mento_carlo.compute_es_series(
+                        x, K, T, 0.975, w, 1.0, n_sims=s, rng=0))
+
+    # asset-count scaling on the shortest series with the long window
+    n, w = grid["lengths"][0], max(x for x in grid["windows"] if x < grid["lengths"][0] - 10)
+    for a in grid["assets"]:
+        panel = simulate_panel(a, n)
+        weights = pd.DataFrame(np.ones((a, 4)), index=panel.columns,
+                               columns=[f"book{b}" for b in range(4)])
+        positions = np.ones(a)
+        for s in grid["sims"]:
+            p = {"length": n, "window": w, "sims": s, "assets": a}
+            yield "batch.evaluate_books", p, \
+                lambda x=panel, b=weights, w=w, s=s: len(batch.evaluate_books(
+                    x, b, 0.99, 0.975, w, n_sims=s, rng=0))
+            yield "PortfolioEngine.mc_var_es", p, \
+                lambda x=panel, e=positions, w=w, s=s: len(PortfolioEngine(x, w).mc_var_es(
+                    e, 0.99, 0.975, n_sims=s, rng=0))
+        p = {"length": n, "window": w, "assets": a}
+        yield "PortfolioEngine.parametric_var_es", p, \
+            lambda x=panel, e=positions, w=w: len(PortfolioEngine(x, w).parametric_var_es(
+                e, 0.99, 0.975))
+        losses, var = backtest.realized_losses(panel), panel * 0.05
+        p = {"length": n, "assets": a}
+        yield "backtest.backtest", p, \
+            lambda L=losses, v=var: len(backtest.backtest(L, v, 0.99, es=v * 1.2))
+        yield "backtest.traffic_light", p, \
+            lambda L=losses, v=var: len(backtest.traffic_light(L, v, 0.99))
+
+
+def measure(func, repeat=3):
+    """
+    Best-of-repeat wall time of func() and its peak traced allocation.
+    The memory pass runs separately since tracing slows the timed runs.
+    The stats cache is cleared before every call so each run pays for
+    its own rolling moments.
+    """
+    times = []
+    for _ in range(repeat):
+        stats_cache.clear()
+        t0 = time.perf_counter()
+        rows = func()
+        times.append(time.perf_counter() - t0)
+
+    stats_cache.clear()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats_cache.clear()
+
+    best = min(times)
+    return {"seconds": best, "rows": rows,
+            "rows_per_sec": rows / best if best > 0 else float("inf"),
+            "peak_mb": peak / 2**20}
+
+
+def case_key(name, params):
+    return name + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+
+def run(grid="quick", only=None, repeat=3, verbose=True) -> dict:
+    """Time every case in the named grid (filtered by substring only)."""
+    results = {}
+    for name, params, func in cases(GRIDS[grid]):
+        if only and not any(o in name for o in only):
+            continue
+        key = case_key(name, params)
+        results[key] = {"name": name, "params": params, **measure(func, repeat)}
+        if verbose:
+            r = results[key]
+            print(f"{key:<80} {r['seconds']:9.4f}s {r['rows_per_sec']:12.1f} rows/s "
+                  f"{r['peak_mb']:9.1f} MB", flush=True)
+    return {"meta": {"grid": grid, "repeat": repeat, "python": platform.python_version(),
+                     "numpy": np.__version__, "pandas": pd.__version__,
+                     "machine": platform.machine()},
+            "results": results}
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> list:
+    """
+    Cases that are more than tolerance slower, or use more than tolerance
+    more peak memory, than the baseline. Cases missing from either side
+    are ignored.
+    """
+    regressions = []
+    for key, now in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            if old[metric] > 0 and now[metric] > old[metric] * (1 + tolerance):
+                regressions.append((key, metric, old[metric], now[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time every VaR/ES model on synthetic GBM data.")
+    parser.add_argument("--grid", choices=sorted(GRIDS), default="quick")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="run only cases whose name contains one of these")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default=None, help="write results as a JSON baseline")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown / memory growth as a fraction (default 0.25)")
+    args = parser.parse_args(argv)
+
+    current = run(args.grid, args.only, args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=1)
+        print(f"Wrote {len(current['results'])} results to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        for key, metric, old, now in regressions:
+            print(f"REGRESSION {key} {metric}: {old:.4g} -> {now:.4g} "
+                  f"({now / old - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
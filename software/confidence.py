@@ -0,0 +1,49 @@
+# confidence.py
+
+import numpy as np
+import pandas as pd
+
+
+def levels(var_level, es_level):
+    """
+    Confidence levels as given when both are single numbers, otherwise
+    both as 1-d float arrays; plus whether both were single. Every model
+    evaluates all levels on the same windows, moments or paths.
+    """
+    if np.ndim(var_level) == 0 and np.ndim(es_level) == 0:
+        return var_level, es_level, True
+    var_level = np.atleast_1d(np.asarray(var_level, dtype=float))
+    es_level = np.atleast_1d(np.asarray(es_level, dtype=float))
+    if not (len(var_level) and len(es_level)):
+        raise ValueError("at least one confidence level is needed")
+    return var_level, es_level, False
+
+
+def frame(values, index, var_level, es_level, single: bool) -> pd.DataFrame:
+    """
+    Model output from values holding the VaR column(s) then the ES
+    column(s): columns 'var' and 'es' for single levels, otherwise
+    (measure, level) columns so that out['var'] is dates x levels.
+    """
+    if single:
+        return pd.DataFrame(values, index=index, columns=["var", "es"])
+    columns = pd.MultiIndex.from_tuples(
+        [("var", lev) for lev in var_level] + [("es", lev) for lev in es_level],
+        names=[None, "level"])
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def series(values, index, level):
+    """A Series for a single level, else a dates x levels DataFrame."""
+    if np.ndim(level) == 0:
+        return pd.Series(values, index=index)
+    return pd.DataFrame(values, index=index, columns=pd.Index(np.atleast_1d(level), name="level"))
+
+
+def select(out: pd.DataFrame, measure: str):
+    """
+    out[measure] the way compute_var/compute_es return it: an unnamed
+    Series for a single level, a dates x levels DataFrame otherwise.
+    """
+    col = out[measure]
+    return col.rename(None) if isinstance(col, pd.Series) else col
@@ -0,0 +1,103 @@
+# executor.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from random_source import spawn
+
+BACKENDS = ("serial", "thread", "process")
+
+
+def _rows(arrays, start, stop):
+    return {k: a[start:stop] for k, a in arrays.items()}
+
+
+def _attach(specs, start, stop):
+    """Map shared-memory blocks back to arrays and slice rows [start, stop)."""
+    shms, views = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        shm = SharedMemory(name=name)
+        shms.append(shm)
+        views[key] = np.ndarray(shape, dtype, buffer=shm.buf)[start:stop]
+    return shms, views
+
+
+def _run_shared(func, specs, start, stop, rng, kwargs):
+    """Process-pool task: run func on its rows of the shared arrays."""
+    shms, views = _attach(specs, start, stop)
+    try:
+        # copy the result out before the shared buffers are released
+        return np.array(func(views, rng, **kwargs))
+    finally:
+        del views
+        for shm in shms:
+            shm.close()
+
+
+class Executor:
+    """
+    Runs a per-date worker over blocks of rows, serially or on a
+    thread/process pool. Workers only receive their own rows of the
+    per-date input arrays (through shared memory for processes), and
+    block k always draws from the k-th stream spawned from the seed,
+    so results depend on chunk_size but not on backend or workers.
+
+    func(arrays, rng, **kwargs) gets a dict of row slices and a
+    Generator, and returns an array with one row per input row.
+    """
+
+    def __init__(self, backend: str = "serial", workers: int = None,
+                 chunk_size: int = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    def map(self, func, arrays: dict, n_rows: int, seed=None,
+            chunk_size: int = None, **kwargs) -> np.ndarray:
+        """
+        Apply func to consecutive row blocks of arrays and reassemble the
+        results in date order. chunk_size is the caller's default block
+        size, overridden by the executor's own chunk_size if set.
+        """
+        size = max(1, self.chunk_size or chunk_size or n_rows)
+        # an empty range still makes one call so the result has the right shape
+        bounds = [(s, min(s + size, n_rows)) for s in range(0, n_rows, size)] or [(0, 0)]
+        rngs = spawn(seed, len(bounds))
+
+        if self.backend == "serial":
+            parts = [func(_rows(arrays, s, e), g, **kwargs)
+                     for (s, e), g in zip(bounds, rngs)]
+        elif self.backend == "thread":
+            with ThreadPoolExecutor(self.workers) as pool:
+                futures = [pool.submit(func, _rows(arrays, s, e), g, **kwargs)
+                           for (s, e), g in zip(bounds, rngs)]
+                parts = [f.result() for f in futures]
+        else:
+            parts = self._map_processes(func, arrays, bounds, rngs, kwargs)
+        return np.concatenate(parts)
+
+    def _map_processes(self, func, arrays, bounds, rngs, kwargs):
+        shms, specs = [], {}
+        try:
+            for key, a in arrays.items():
+                a = np.ascontiguousarray(a)
+                shm = SharedMemory(create=True, size=max(a.nbytes, 1))
+                shms.append(shm)
+                np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+                specs[key] = (shm.name, a.shape, a.dtype.str)
+            with ProcessPoolExecutor(self.workers) as pool:
+                futures = [pool.submit(_run_shared, func, specs, s, e, g, kwargs)
+                           for (s, e), g in zip(bounds, rngs)]
+                return [f.result() for f in futures]
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+
+SERIAL = Executor()
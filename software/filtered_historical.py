@@ -0,0 +1,134 @@
+# filtered_historical.py
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.signal import lfilter
+
+from historical import _rolling_tails
+import stats_cache
+import confidence
+
+VOL_MODELS = ("garch", "ewma")
+
+
+def conditional_variance(r: np.ndarray, omega: float, alpha: float, beta: float) -> np.ndarray:
+    """
+    GARCH(1,1) variance of each return given the ones before it,
+        sigma2_t = omega + alpha r_{t-1}^2 + beta sigma2_{t-1},
+    started from the sample variance. The recursion is a first-order
+    linear filter of r^2, so it runs as one lfilter call. EWMA is the
+    case omega=0, alpha=1-lambda, beta=lambda.
+    """
+    r = np.asarray(r, dtype=float)
+    # sigma2 = omega/(1-beta) + u with u_t = alpha r_{t-1}^2 + beta u_{t-1}
+    level = omega / (1 - beta)
+    u0 = np.var(r) - level
+    u = lfilter([0.0, alpha], [1.0, -beta], r**2, zi=[u0])[0]
+    return level + u
+
+
+def _neg_loglik(params, r, target):
+    alpha, beta = params
+    if alpha + beta >= 0.999:
+        return 1e10
+    s2 = conditional_variance(r, target * (1 - alpha - beta), alpha, beta)
+    return 0.5 * np.sum(np.log(s2) + r**2 / s2)
+
+
+def fit_garch(r: np.ndarray) -> tuple:
+    """
+    Gaussian maximum-likelihood GARCH(1,1) (omega, alpha, beta) with
+    variance targeting, omega = var(r) (1 - alpha - beta).
+    """
+    r = np.asarray(r, dtype=float)
+    target = np.var(r)
+    res = minimize(_neg_loglik, x0=[0.08, 0.90], args=(r, target), method="L-BFGS-B",
+                   bounds=[(1e-6, 0.5), (0.0, 0.999)])
+    alpha, beta = res.x
+    return target * (1 - alpha - beta), alpha, beta
+
+
+def vol_params(prices: pd.Series, vol_model: str = "garch", lambda_: float = 0.94) -> tuple:
+    """(omega, alpha, beta) of the daily log-returns for vol_model, fitted once per series."""
+    if vol_model == "ewma":
+        return 0.0, 1 - lambda_, lambda_
+    if vol_model != "garch":
+        raise ValueError(f"vol_model must be one of {', '.join(VOL_MODELS)}, got {vol_model!r}")
+    return stats_cache.cached(
+        (stats_cache.series_key(prices), "garch_fit"),
+        lambda: fit_garch(stats_cache.log_returns(prices).dropna().to_numpy()))
+
+
+def horizon_variance(next_var, omega, alpha, beta, days: int = 5):
+    """
+    Forecast variance of the next days' summed returns given the next
+    day's variance: days * V + (next - V)(1 - p^days)/(1 - p), with
+    persistence p = alpha + beta and long-run V = omega/(1 - p);
+    days * next when p = 1 (EWMA).
+    """
+    p = alpha + beta
+    if p >= 1 - 1e-12:
+        return days * next_var
+    V = omega / (1 - p)
+    return days * V + (next_var - V) * (1 - p**days) / (1 - p)
+
+
+def compute_var_es(prices: pd.Series, var_level: float, es_level: float,
+                   window_days: int = 500, vol_model: str = "garch",
+                   lambda_: float = 0.94, params: tuple = None,
+                   days: int = 5) -> pd.DataFrame:
+    """
+    5-day filtered historical simulation VaR and ES in dollars.
+    Daily log-returns are filtered by a GARCH(1,1) (fitted once over the
+    whole history unless params=(omega, alpha, beta) is given) or EWMA
+    (decay lambda_) variance, each days-day log-return is divided by the
+    square root of the summed daily variances over its days, and the
+    rolling quantile and tail mean of those standardized returns
+    (window_days of them, from the same sorted window as historical)
+    are rescaled by the forecast days-day volatility on each date.
+    Either level may be a sequence, all read off the same window.
+    Returns a DataFrame with columns 'var' and 'es' (see confidence.frame).
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+
+    # 1) conditional daily variances, fitted once over the full history
+    r = stats_cache.log_returns(prices).dropna()
+    omega, alpha, beta = params if params is not None else vol_params(prices, vol_model, lambda_)
+    s2 = stats_cache.cached(
+        (stats_cache.series_key(prices), "cond_var", omega, alpha, beta),
+        lambda: pd.Series(conditional_variance(r.to_numpy(), omega, alpha, beta), index=r.index))
+
+    # 2) standardized days-day returns
+    r5 = stats_cache.log_returns(prices, horizon=days).dropna()
+    period_var = s2.rolling(days).sum().reindex(r5.index)
+    z = (r5 / np.sqrt(period_var)).dropna()
+
+    # 3) rolling quantile and tail mean of z, then rescale by the forecast vol
+    index, q, es = _rolling_tails(z, 1 - np.atleast_1d(var_level),
+                                  1 - np.atleast_1d(es_level), window_days)
+    next_var = omega + alpha * r**2 + beta * s2
+    sd = np.sqrt(horizon_variance(next_var.loc[index].to_numpy(), omega, alpha, beta, days))
+    S = prices.loc[index].to_numpy(dtype=float)[:, None]
+    values = np.hstack([S * (1 - np.exp(q * sd[:, None])), S * (1 - np.exp(es * sd[:, None]))])
+    return confidence.frame(values, index, var_level, es_level, single)
+
+
+def compute_var(prices: pd.Series, var_level: float, window_days: int = 500,
+                vol_model: str = "garch", lambda_: float = 0.94) -> pd.Series:
+    """
+    5-day filtered historical simulation VaR at var_level, in dollars
+    (a dates x levels DataFrame for a sequence of levels).
+    """
+    return confidence.select(compute_var_es(prices, var_level, var_level, window_days,
+                                            vol_model, lambda_), "var")
+
+
+def compute_es(prices: pd.Series, es_level: float, window_days: int = 500,
+               vol_model: str = "garch", lambda_: float = 0.94) -> pd.Series:
+    """
+    5-day filtered historical simulation ES at es_level, in dollars
+    (a dates x levels DataFrame for a sequence of levels).
+    """
+    return confidence.select(compute_var_es(prices, es_level, es_level, window_days,
+                                            vol_model, lambda_), "es")
@@ -1,23 +1,227 @@
+import math
+from bisect import bisect_right, insort
+from collections import deque
+
 import pandas as pd
 import numpy as np
 
+import stats_cache
+import instrument
+import confidence
+from montecarlo import MEM_BUDGET, chunk_rows, tail_stats
+from random_source import get_rng
+
+HORIZON_METHODS = ("sqrt_time", "bootstrap", "non_overlapping")
+
+
+class SortedWindow:
+    """
+    Sliding window of the last `window` observations kept in sorted
+    order, so order statistics and tail sums are available without
+    re-sorting as the window moves forward one value at a time.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self._fifo = deque()
+        self._sorted = []
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def full(self) -> bool:
+        return len(self._sorted) == self.window
+
+    def push(self, x: float):
+        """Add x, evicting the oldest observation once the window is full."""
+        if len(self._fifo) == self.window:
+            old = self._fifo.popleft()
+            del self._sorted[bisect_right(self._sorted, old) - 1]
+        self._fifo.append(x)
+        insort(self._sorted, x)
+
+    def quantile(self, alpha: float) -> float:
+        """
+        alpha-quantile with the same linear interpolation (and the same
+        floating-point steps) as np.percentile(x, 100 * alpha).
+        """
+        x = self._sorted
+        n = len(x)
+        q = 100 * alpha / 100
+        h = (n - 1) * q
+        lo = math.floor(h)
+        hi = min(lo + 1, n - 1)
+        g = h - lo
+        a, b = x[lo], x[hi]
+        d = b - a
+        # np.lerp switches to interpolating from the upper point past 0.5
+        return b - d * (1 - g) if g >= 0.5 else a + d * g
+
+    def tail_mean(self, alpha: float) -> float:
+        """Mean of the observations at or below the alpha-quantile."""
+        cutoff = self.quantile(alpha)
+        k = bisect_right(self._sorted, cutoff)
+        return math.fsum(self._sorted[:k]) / k if k else np.nan
+
+
+def _rolling_tails(r: pd.Series, var_alphas, es_alphas, window_days: int):
+    """
+    Rolling alpha-quantiles and tail means of r for every alpha in
+    var_alphas and es_alphas, all read off one sorted-window pass.
+    Returns the dates (from the first full window on) and the
+    (dates x alphas) quantile and tail-mean arrays.
+    """
+    win = SortedWindow(window_days)
+    q, es = [], []
+    for x in r.to_numpy():
+        win.push(x)
+        if win.full():
+            q.append([win.quantile(a) for a in var_alphas])
+            es.append([win.tail_mean(a) for a in es_alphas])
+    instrument.count("historical.windows", len(q))
+    shape = (len(q), len(var_alphas)), (len(es), len(es_alphas))
+    return (r.index[window_days - 1:], np.array(q, dtype=float).reshape(shape[0]),
+            np.array(es, dtype=float).reshape(shape[1]))
+
+
+def _rolling_tail(r: pd.Series, var_alpha: float, es_alpha: float,
+                  window_days: int) -> pd.DataFrame:
+    """
+    Rolling alpha-quantile and tail mean of r, from one sorted-window
+    pass. Rows start once the first full window is available.
+    """
+    index, q, es = _rolling_tails(r, [var_alpha], [es_alpha], window_days)
+    return pd.DataFrame({"q": q[:, 0], "es": es[:, 0]}, index=index)
+
+
+def compute_var_es(prices: pd.Series,
+                   var_level: float,
+                   es_level: float,
+                   window_days: int) -> pd.DataFrame:
+    """
+    5-day empirical VaR and ES using 5-day log-returns and a rolling
+    window of window_days, in dollars. Both come from the same sorted
+    window, so the window is walked once, however many levels are
+    given (either level may be a sequence).
+    Returns a DataFrame with columns 'var' and 'es' (see confidence.frame).
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+
+    # 1) 5-day log returns
+    r5 = stats_cache.log_returns(prices, horizon=5)
+
+    # 2) rolling quantiles and tail means of r5
+    index, q, es = _rolling_tails(r5, 1 - np.atleast_1d(var_level),
+                                  1 - np.atleast_1d(es_level), window_days)
+
+    # 3) convert to dollar loss
+    S = prices.loc[index].to_numpy(dtype=float)[:, None]
+    values = np.hstack([S * (1 - np.exp(q)), S * (1 - np.exp(es))])
+    return confidence.frame(values, index, var_level, es_level, single)
+
+
+def _bootstrap_tail(r: np.ndarray, S: np.ndarray, horizons, var_level: float,
+                    es_level: float, window_days: int, n_boot: int, rng,
+                    mem_budget: int = MEM_BUDGET):
+    """
+    Dollar VaR and ES per horizon from n_boot paths per date of
+    max(horizons) daily log-returns resampled from the window ending on
+    that date. Every horizon reads the partial sums of the same paths.
+    Returns (var, es) arrays of shape (horizons x dates).
+    """
+    h_max = max(horizons)
+    # no date has a full window when the series is shorter than one
+    n = max(len(r) - window_days + 1, 0)
+    var, es = np.empty((len(horizons), n)), np.empty((len(horizons), n))
+    step = chunk_rows(n_boot * h_max, mem_budget, n_arrays=3)
+    for i in range(0, n, step):
+        rows = np.arange(i, min(i + step, n))
+        # row i's window is r[i : i + window_days]
+        idx = rows[:, None, None] + rng.integers(0, window_days, (len(rows), n_boot, h_max))
+        paths = np.cumsum(r[idx], axis=2)
+        for k, h in enumerate(horizons):
+            losses = S[rows, None] * (1 - np.exp(paths[:, :, h - 1]))
+            var[k, rows], es[k, rows] = tail_stats(losses, var_level, es_level)
+    return var, es
+
+
+def _non_overlapping_tail(prices: pd.Series, horizon: int, var_alpha: float,
+                          es_alpha: float, window_days: int) -> pd.DataFrame:
+    """
+    Rolling quantile and tail mean of the non-overlapping horizon-day
+    log-returns inside each window_days span: the returns ending on a
+    date and every horizon days before it. Each residue class of dates
+    mod horizon is its own sorted-window pass of window_days // horizon.
+    """
+    rh = stats_cache.log_returns(prices, horizon=horizon)
+    n = window_days // horizon
+    if n < 1:
+        raise ValueError(f"window_days={window_days} holds no {horizon}-day return")
+    return pd.concat([_rolling_tail(rh.iloc[k::horizon], var_alpha, es_alpha, n)
+                      for k in range(horizon)]).sort_index()
+
+
+def compute_var_es_horizons(prices: pd.Series,
+                            var_level: float,
+                            es_level: float,
+                            window_days: int,
+                            horizons=(1, 5, 10),
+                            method: str = "sqrt_time",
+                            n_boot: int = 2000,
+                            rng=None,
+                            mem_budget: int = MEM_BUDGET) -> pd.DataFrame:
+    """
+    Empirical VaR and ES in dollars for several horizons at once.
+    method='sqrt_time' takes the rolling 1-day log-return quantile and
+    tail mean from one sorted-window pass and scales them by
+    sqrt(horizon); method='bootstrap' resamples n_boot paths of daily
+    returns from each window and aggregates them to every horizon;
+    method='non_overlapping' uses the non-overlapping horizon-day
+    returns inside the window (window_days // horizon of them).
+    Returns a DataFrame with (measure, horizon) columns, so out['var']
+    is a dates x horizons frame. Dates start once window_days daily
+    returns are available; non-overlapping horizons that need a longer
+    history are NaN until then.
+    """
+    horizons = list(horizons)
+    if method not in HORIZON_METHODS:
+        raise ValueError(f"method must be one of {', '.join(HORIZON_METHODS)}, got {method!r}")
+
+    # 1) daily log returns and the dates with a full window
+    r1 = stats_cache.log_returns(prices)
+    index = r1.index[window_days - 1:]
+    S = prices.loc[index].to_numpy(dtype=float)
+
+    # 2) per-horizon log-return quantiles (or dollar losses) from the windows
+    if method == "sqrt_time":
+        tail = _rolling_tail(r1, 1 - var_level, 1 - es_level, window_days)
+        scale = np.sqrt(horizons)
+        var = S[:, None] * (1 - np.exp(tail["q"].to_numpy()[:, None] * scale))
+        es = S[:, None] * (1 - np.exp(tail["es"].to_numpy()[:, None] * scale))
+    elif method == "bootstrap":
+        var, es = _bootstrap_tail(r1.to_numpy(), S, horizons, var_level, es_level,
+                                  window_days, n_boot, get_rng(rng), mem_budget)
+        var, es = var.T, es.T
+    else:
+        tails = [_non_overlapping_tail(prices, h, 1 - var_level, 1 - es_level,
+                                       window_days).reindex(index) for h in horizons]
+        var = np.column_stack([S * (1 - np.exp(t["q"].to_numpy())) for t in tails])
+        es = np.column_stack([S * (1 - np.exp(t["es"].to_numpy())) for t in tails])
+
+    columns = pd.MultiIndex.from_product([["var", "es"], horizons])
+    return pd.DataFrame(np.hstack([var, es]), index=index, columns=columns)
+
+
 def compute_var(prices: pd.Series,
                 var_level: float,
                 window_days: int) -> pd.Series:
     """
     5-day empirical VaR at var_level using 5-day log-returns
     and a rolling window of window_days, returned in dollars.
+    A sequence of levels gives a dates x levels DataFrame.
     """
-    alpha = 1 - var_level
-    # 1) 5-day log returns
-    r5 = np.log(prices / prices.shift(5)).dropna()
-
-    # 2) rolling quantile of r5 at alpha
-    r_q = r5.rolling(window_days).quantile(alpha).dropna()
+    return confidence.select(compute_var_es(prices, var_level, var_level, window_days), "var")
 
-    # 3) convert to dollar loss
-    dollar_var = prices.loc[r_q.index] * (1 - np.exp(r_q))
-    return dollar_var
 
 def compute_es(prices: pd.Series,
                es_level: float,
@@ -25,18 +229,6 @@ def compute_es(prices: pd.Series,
     """
     5-day empirical ES at es_level using 5-day log-returns
     and a rolling window of window_days, returned in dollars.
+    A sequence of levels gives a dates x levels DataFrame.
     """
-    alpha = 1 - es_level
-    r5 = np.log(prices / prices.shift(5)).dropna()
-
-    def es_log(x):
-        cutoff = np.percentile(x, 100 * alpha)
-        tail   = x[x <= cutoff]
-        return tail.mean() if len(tail) else np.nan
-
-    # 1) rolling average of tail log-returns
-    r_es = r5.rolling(window_days).apply(es_log, raw=False).dropna()
-
-    # 2) convert to dollar ES
-    dollar_es = prices.loc[r_es.index] * (1 - np.exp(r_es))
-    return dollar_es
+    return confidence.select(compute_var_es(prices, es_level, es_level, window_days), "es")
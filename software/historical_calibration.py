@@ -9,29 +9,38 @@ import parametric5yr
 import parametric_ewm
 import historical
 import montecarlo
+import price_store
+import stats_cache
+import instrument
 
 def prompt_file():
     while True:
         path = input(
             "Enter the relative path to CSV file "
-            "(dates as index, security codes as columns)\n"
+            "(dates as index, security codes as columns) or price store directory\n"
             " [e.g. software/data/portfolio.csv]: "
         ).strip()
-        if os.path.isfile(path):
+        if os.path.isfile(path) or os.path.isdir(path):
             return path
         print(f"File not found: {path}")
 
 def prompt_confidence(name):
+    """One level, or a list when several are given separated by commas."""
     while True:
-        s = input(f"Enter {name} confidence level (decimal between 0 and 1) [e.g. 0.99]: ").strip()
+        s = input(f"Enter {name} confidence level(s) (decimals between 0 and 1, "
+                  f"comma-separated) [e.g. 0.99 or 0.95,0.99]: ").strip()
         try:
-            val = float(s)
-            if 0 < val < 1:
-                return val
-            print("Value must be between 0 and 1.")
+            vals = [float(v) for v in s.split(",")]
+            if all(0 < v < 1 for v in vals):
+                return vals[0] if len(vals) == 1 else vals
+            print("Values must be between 0 and 1.")
         except ValueError:
             print("Invalid number, please try again.")
 
+def by_level(x, level):
+    """{level: Series} for a model result at one or several levels."""
+    return {level: x} if isinstance(x, pd.Series) else dict(x.items())
+
 def prompt_stock_positions():
     n = int(input("Enter number of stock positions: ").strip())
     stocks = []
@@ -42,12 +51,15 @@ def prompt_stock_positions():
     return stocks
 
 def main():
+    instrument.from_env()
+
     # --- load data and confidences ---
     price_file = prompt_file()
     var_level  = prompt_confidence("VaR")
     es_level   = prompt_confidence("ES")
 
-    df = pd.read_csv(price_file, parse_dates=True, index_col=0)
+    with instrument.stage("load"):
+        df = price_store.load_prices(price_file)
     if df.empty:
         print("Error: price file is empty", file=sys.stderr)
         sys.exit(1)
@@ -67,61 +79,90 @@ def main():
     WINDOW   = 5 * 252
     N_SIMS   = 10000
 
-    var1 = parametric5yr.compute_var(stock_series, var_level)
-    es1  = parametric5yr.compute_es(stock_series, es_level)
+    # returns and rolling moments go into the stats cache once and are
+    # shared by the models below
+    with instrument.stage("returns"):
+        stats_cache.log_returns(stock_series)
+        stats_cache.log_returns(stock_series, horizon=5)
+    with instrument.stage("rolling stats"):
+        parametric5yr.rolling_moments(stock_series, WINDOW)
+        stats_cache.ewm_moments(stock_series, LAMBDA)
+
+    with instrument.stage("parametric5yr"):
+        par1 = parametric5yr.compute_var_es(stock_series, var_level, es_level)
+        var1, es1 = par1["var"], par1["es"]
 
-    var2 = parametric_ewm.compute_var(stock_series, var_level, LAMBDA)
-    es2  = parametric_ewm.compute_es(stock_series, es_level, LAMBDA)
+    with instrument.stage("parametric_ewm"):
+        ewm2 = parametric_ewm.compute_var_es(stock_series, var_level, es_level, LAMBDA)
+        var2, es2 = ewm2["var"], ewm2["es"]
 
-    var3 = historical.compute_var(stock_series, var_level, WINDOW)
-    es3  = historical.compute_es(stock_series, es_level, WINDOW)
+    with instrument.stage("historical"):
+        # VaR and ES off one walk of the sorted window
+        hist3 = historical.compute_var_es(stock_series, var_level, es_level, WINDOW)
+        var3, es3 = hist3["var"], hist3["es"]
 
-    var4 = montecarlo.compute_var(stock_series, var_level, WINDOW, N_SIMS)
-    es4  = montecarlo.compute_es(stock_series, es_level, WINDOW, N_SIMS)
+    with instrument.stage("montecarlo"):
+        mc4  = montecarlo.compute_var_es(stock_series, var_level, es_level, WINDOW, N_SIMS)
+        var4, es4 = mc4["var"], mc4["es"]
 
     # --- print summary of latest VaR & ES ---
+    # every level comes from the same model run
+    results = [
+        ("Parametric 5yr", by_level(var1, var_level), by_level(es1, es_level)),
+        ("Parametric EWM", by_level(var2, var_level), by_level(es2, es_level)),
+        ("Historical",     by_level(var3, var_level), by_level(es3, es_level)),
+        ("Monte Carlo",    by_level(var4, var_level), by_level(es4, es_level)),
+    ]
     print("\nStock Portfolio VaR and ES:")
-    print(f"{'Method':<20}{'VaR':>12}{'ES':>12}")
-    for name, v, e in [
-        ("Parametric 5yr", var1,  es1),
-        ("Parametric EWM", var2,  es2),
-        ("Historical",      var3,  es3),
-        ("Monte Carlo",     var4,  es4),
-    ]:
-        print(f"{name:<20}{v.iloc[-1]:12.2f}{e.iloc[-1]:12.2f}")
+    header = "".join(f"{'VaR ' + format(lv, '.1%'):>14}" for lv in results[0][1]) \
+        + "".join(f"{'ES ' + format(lv, '.1%'):>14}" for lv in results[0][2])
+    print(f"{'Method':<20}{header}")
+    for name, v, e in results:
+        cells = [s.iloc[-1] for s in v.values()] + [s.iloc[-1] for s in e.values()]
+        print(f"{name:<20}" + "".join(f"{c:14.2f}" for c in cells))
+
+    # plots show the first level of each
+    var1, var2, var3, var4 = (next(iter(v.values())) for _, v, _ in results)
+    es1, es2, es3, es4 = (next(iter(e.values())) for _, _, e in results)
+    var_level = next(iter(results[0][1]))
+    es_level = next(iter(results[0][2]))
 
     # --- plot VaR comparison ---
     os.makedirs("output", exist_ok=True)
-    plt.figure(figsize=(10,6))
-    for series, label in [
-        (var1, "Parametric 5yr"),
-        (var2, "Parametric EWM"),
-        (var3, "Historical"),
-        (var4, "Monte Carlo"),
-    ]:
-        plt.plot(series.index, series, label=label, alpha=0.8)
-    plt.title(f"5-day VaR @ {var_level*100:.1f}% (Portfolio)")
-    plt.ylabel("VaR (Loss)")
-    plt.legend(loc="best")
-    plt.tight_layout()
-    plt.savefig("output/var_comparison.png", dpi=150)
-    plt.close()
+    with instrument.stage("plot"):
+        plt.figure(figsize=(10,6))
+        for series, label in [
+            (var1, "Parametric 5yr"),
+            (var2, "Parametric EWM"),
+            (var3, "Historical"),
+            (var4, "Monte Carlo"),
+        ]:
+            plt.plot(series.index, series, label=label, alpha=0.8)
+        plt.title(f"5-day VaR @ {var_level*100:.1f}% (Portfolio)")
+        plt.ylabel("VaR (Loss)")
+        plt.legend(loc="best")
+        plt.tight_layout()
+        plt.savefig("output/var_comparison.png", dpi=150)
+        plt.close()
 
     # --- plot ES comparison ---
-    plt.figure(figsize=(10,6))
-    for series, label in [
-        (es1, "Parametric 5yr"),
-        # (es2, "Parametric EWM"),
-        (es3, "Historical"),
-        (es4, "Monte Carlo"),
-    ]:
-        plt.plot(series.index, series, label=label, alpha=0.8)
-    plt.title(f"5-day ES @ {es_level*100:.1f}% (Portfolio)")
-    plt.ylabel("ES (Loss)")
-    plt.legend(loc="best")
-    plt.tight_layout()
-    plt.savefig("output/es_comparison.png", dpi=150)
-    plt.close()
+    with instrument.stage("plot"):
+        plt.figure(figsize=(10,6))
+        for series, label in [
+            (es1, "Parametric 5yr"),
+            (es2, "Parametric EWM"),
+            (es3, "Historical"),
+            (es4, "Monte Carlo"),
+        ]:
+            plt.plot(series.index, series, label=label, alpha=0.8)
+        plt.title(f"5-day ES @ {es_level*100:.1f}% (Portfolio)")
+        plt.ylabel("ES (Loss)")
+        plt.legend(loc="best")
+        plt.tight_layout()
+        plt.savefig("output/es_comparison.png", dpi=150)
+        plt.close()
+
+    instrument.finish()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,187 @@
+# incremental.py
+
+import pickle
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import parametric5yr
+import parametric_ewm
+import historical
+from historical import SortedWindow
+from parametric5yr import gbm_var_es
+
+
+class ModelState:
+    """
+    Persisted state of one model on one price series. Built once from
+    full history, saved after the nightly run and advanced with the new
+    price rows only, returning just the new tail of the VaR/ES series.
+    Subclasses keep whatever running statistics their model needs and
+    implement _step(price) -> (var, es), or None before enough history.
+    """
+
+    def __init__(self, var_level: float, es_level: float):
+        self.var_level = var_level
+        self.es_level = es_level
+        self.last_price = None
+        self.results = pd.DataFrame(columns=["var", "es"], dtype=float)
+
+    def update(self, new_prices: pd.Series) -> pd.DataFrame:
+        """
+        Advance by the given price rows (dates after the last seen one)
+        and return the VaR/ES rows they produce.
+        """
+        if len(self.results) and len(new_prices) and new_prices.index[0] <= self.results.index[-1]:
+            raise ValueError("new prices must be dated after the last processed date")
+        rows = {}
+        for date, price in new_prices.dropna().items():
+            out = self._step(float(price))
+            self.last_price = float(price)
+            if out is not None:
+                rows[date] = out
+        tail = pd.DataFrame.from_dict(rows, orient="index", columns=["var", "es"], dtype=float)
+        self.results = tail if self.results.empty else pd.concat([self.results, tail])
+        return tail
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path: str) -> "ModelState":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+class Parametric5yrState(ModelState):
+    """
+    parametric5yr state: the last WINDOW daily log-returns. Each new
+    date costs one O(window) mean/std over that buffer.
+    """
+
+    def __init__(self, var_level: float, es_level: float,
+                 window: int = parametric5yr.WINDOW):
+        super().__init__(var_level, es_level)
+        self.window = window
+        self.returns = deque(maxlen=window)
+
+    @classmethod
+    def from_prices(cls, prices: pd.Series, var_level: float, es_level: float):
+        state = cls(var_level, es_level)
+        prices = prices.dropna()
+        log_ret = np.log(prices / prices.shift(1)).dropna()
+        state.returns.extend(log_ret.iloc[-state.window:].to_numpy())
+        state.last_price = float(prices.iloc[-1])
+        state.results = parametric5yr.compute_var_es(prices, var_level, es_level)
+        return state
+
+    def _step(self, price):
+        out = None
+        if self.last_price is not None and len(self.returns) == self.window:
+            data = np.fromiter(self.returns, float, self.window)
+            out = gbm_var_es(price, data.mean(), data.std(ddof=1),
+                             self.var_level, self.es_level)
+        if self.last_price is not None:
+            self.returns.append(np.log(price / self.last_price))
+        return out
+
+
+class EwmState(ModelState):
+    """
+    parametric_ewm state: the exponentially weighted mean, covariance
+    and weight sums, updated in O(1) with the same recursion (and bias
+    correction) as pandas' ewm(adjust=False).mean()/.var().
+    """
+
+    def __init__(self, var_level: float, es_level: float, lambda_: float):
+        super().__init__(var_level, es_level)
+        self.lambda_ = lambda_
+        self.mean = np.nan
+        self.cov = 0.0
+        self.sum_wt = 1.0
+        self.sum_wt2 = 1.0
+
+    @classmethod
+    def from_prices(cls, prices: pd.Series, var_level: float, es_level: float,
+                    lambda_: float):
+        state = cls(var_level, es_level, lambda_)
+        prices = prices.dropna()
+        log_ret = np.log(prices / prices.shift(1)).dropna()
+        for r in log_ret.to_numpy():
+            state._advance(r)
+        state.last_price = float(prices.iloc[-1])
+        state.results = parametric_ewm.compute_var_es(prices, var_level, es_level, lambda_)
+        return state
+
+    def _advance(self, r):
+        if np.isnan(self.mean):
+            self.mean = r
+            return
+        alpha = 1 - self.lambda_
+        old_mean = self.mean
+        # old weight is renormalized to 1 after every step (adjust=False)
+        old_wt = 1 - alpha
+        self.sum_wt *= old_wt
+        self.sum_wt2 *= old_wt * old_wt
+        if self.mean != r:
+            self.mean = (old_wt * old_mean + alpha * r) / (old_wt + alpha)
+        self.cov = (old_wt * (self.cov + (old_mean - self.mean)**2)
+                    + alpha * (r - self.mean)**2) / (old_wt + alpha)
+        self.sum_wt += alpha
+        self.sum_wt2 += alpha * alpha
+        total = old_wt + alpha
+        self.sum_wt /= total
+        self.sum_wt2 /= total * total
+
+    def sigma(self) -> float:
+        """Bias-corrected EWM std, NaN until two returns have been seen."""
+        numerator = self.sum_wt * self.sum_wt
+        denominator = numerator - self.sum_wt2
+        return np.sqrt(numerator / denominator * self.cov) if denominator > 0 else np.nan
+
+    def _step(self, price):
+        if self.last_price is None:
+            return None
+        self._advance(np.log(price / self.last_price))
+        sigma = self.sigma()
+        if np.isnan(sigma):
+            return None
+        return gbm_var_es(price, self.mean, sigma, self.var_level, self.es_level)
+
+
+class HistoricalState(ModelState):
+    """
+    historical state: the sorted window of 5-day log-returns plus the
+    last five prices. Each new date is one O(window) insert/evict.
+    """
+
+    def __init__(self, var_level: float, es_level: float, window_days: int):
+        super().__init__(var_level, es_level)
+        self.window = SortedWindow(window_days)
+        self.recent = deque(maxlen=5)
+
+    @classmethod
+    def from_prices(cls, prices: pd.Series, var_level: float, es_level: float,
+                    window_days: int):
+        state = cls(var_level, es_level, window_days)
+        prices = prices.dropna()
+        r5 = np.log(prices / prices.shift(5)).dropna()
+        for x in r5.iloc[-window_days:].to_numpy():
+            state.window.push(x)
+        state.recent.extend(prices.iloc[-5:].to_numpy(dtype=float))
+        state.last_price = float(prices.iloc[-1])
+        state.results = historical.compute_var_es(prices, var_level, es_level, window_days)
+        return state
+
+    def _step(self, price):
+        out = None
+        if len(self.recent) == 5:
+            self.window.push(np.log(price / self.recent[0]))
+            if self.window.full():
+                q = self.window.quantile(1 - self.var_level)
+                tail = self.window.tail_mean(1 - self.es_level)
+                out = (price * (1 - np.exp(q)), price * (1 - np.exp(tail)))
+        self.recent.append(price)
+        return out
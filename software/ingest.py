@@ -0,0 +1,232 @@
+# ingest.py
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import price_store
+
+MANIFEST = "manifest.json"
+CALENDARS = "calendars"
+
+
+def scan(directory: str, pattern: str = "*-bloomberg.csv") -> dict:
+    """Ticker -> path for every Bloomberg export in directory, sorted by ticker."""
+    paths = glob.glob(os.path.join(directory, pattern))
+    return dict(sorted((price_store.ticker_from_path(p), p) for p in paths))
+
+
+def file_signature(path: str) -> dict:
+    """mtime, size and sha256 of a file, used to skip unchanged inputs."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    st = os.stat(path)
+    return {"mtime": st.st_mtime, "size": st.st_size, "sha256": h.hexdigest()}
+
+
+def _unchanged(path: str, old: dict):
+    """
+    Signature of path and whether it matches the manifest entry old.
+    A matching mtime and size is trusted without hashing.
+    """
+    st = os.stat(path)
+    if old and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+        return old, True
+    sig = file_signature(path)
+    return sig, bool(old) and old["sha256"] == sig["sha256"]
+
+
+def _read_dates(path: str) -> np.ndarray:
+    dates = pd.read_csv(path, usecols=[0]).iloc[:, 0]
+    try:
+        dates = pd.to_datetime(dates, format=price_store.DATE_FORMAT)
+    except ValueError:
+        dates = pd.to_datetime(dates)
+    return pd.DatetimeIndex(dates).as_unit("ns").asi8
+
+
+def _read_fields(path: str, fields) -> pd.DataFrame:
+    df = price_store.read_bloomberg_csv(path)
+    return df.reindex(columns=list(fields))
+
+
+def _calendar(date_sets, how: str) -> np.ndarray:
+    if how == "union":
+        return np.unique(np.concatenate(date_sets))
+    if how == "intersection":
+        out = date_sets[0]
+        for d in date_sets[1:]:
+            out = np.intersect1d(out, d)
+        return np.unique(out)
+    raise ValueError(f"how must be 'union' or 'intersection', got {how!r}")
+
+
+def _check_replaceable(store_dir: str):
+    """
+    Refuse to overwrite store_dir unless it is missing, empty or a store
+    written by a previous run (it holds meta.json or manifest.json).
+    """
+    if not os.path.exists(store_dir):
+        return
+    if not os.path.isdir(store_dir):
+        raise FileExistsError(f"{store_dir} exists and is not a store directory")
+    names = os.listdir(store_dir)
+    if names and not {price_store.META, MANIFEST} & set(names):
+        raise FileExistsError(
+            f"{store_dir} is not empty and does not hold a price store; refusing to replace it")
+
+
+def _swap_in(tmp_dir: str, store_dir: str):
+    """Move tmp_dir to store_dir, keeping the old store aside until the rename succeeded."""
+    old_dir = store_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(store_dir):
+        os.replace(store_dir, old_dir)
+    try:
+        os.replace(tmp_dir, store_dir)
+    except OSError:
+        if os.path.exists(old_dir):
+            os.replace(old_dir, store_dir)
+        raise
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def ingest(directory: str, store_dir: str, how: str = "union",
+           fill: str = None, fill_limit: int = None,
+           fields=("PX_LAST",), workers: int = None,
+           chunk_files: int = 256, csv_path: str = None) -> dict:
+    """
+    Align every *-bloomberg.csv in directory into a price_store.
+
+    1) Read only the date column of changed files (cached per ticker for
+       unchanged ones) and build the union or intersection calendar.
+    2) Parse files chunk_files at a time on a process pool and write each
+       chunk's columns straight into the memory-mapped store, so memory
+       is bounded by one chunk rather than the whole panel.
+    fill is None (leave gaps as NaN) or 'ffill' (carry the last price
+    forward, at most fill_limit days). Files whose mtime/size or sha256
+    match the previous run, with the same calendar and settings, are
+    copied from the previous store instead of being parsed again.
+    Optionally also writes the PX_LAST panel to csv_path in row chunks.
+    store_dir must be missing, empty or a previous store; anything else
+    raises FileExistsError before any work is done.
+    Returns the tickers that were parsed and reused.
+    """
+    if fill not in (None, "ffill"):
+        raise ValueError(f"fill must be None or 'ffill', got {fill!r}")
+    files = scan(directory)
+    if not files:
+        raise FileNotFoundError(f"no *-bloomberg.csv files in {directory}")
+    _check_replaceable(store_dir)
+    fields = list(fields)
+    settings = {"how": how, "fill": fill, "fill_limit": fill_limit, "fields": fields}
+
+    old_manifest = {}
+    if os.path.isfile(os.path.join(store_dir, MANIFEST)):
+        with open(os.path.join(store_dir, MANIFEST)) as f:
+            old_manifest = json.load(f)
+    old_files = old_manifest.get("files", {})
+
+    # 1) calendar from date columns only
+    signatures, unchanged, date_sets = {}, {}, []
+    for ticker, path in files.items():
+        signatures[ticker], unchanged[ticker] = _unchanged(path, old_files.get(ticker))
+        cached = os.path.join(store_dir, CALENDARS, f"{ticker}.npy")
+        if unchanged[ticker] and os.path.isfile(cached):
+            date_sets.append(np.load(cached))
+        else:
+            unchanged[ticker] = False
+            date_sets.append(_read_dates(path))
+    calendar = _calendar(date_sets, how)
+    dates = pd.DatetimeIndex(calendar.view("datetime64[ns]"))
+
+    # columns from the previous store can be reused only if nothing that
+    # shapes them changed
+    old_codes = []
+    if old_manifest.get("settings") == settings:
+        old_dates, old_codes, _ = price_store.open_store(store_dir, fields[0])
+        if not np.array_equal(old_dates.view("int64"), calendar):
+            old_codes = []
+    reuse = [t for t in files if unchanged[t] and t in old_codes]
+
+    # 2) write the new store next to the old one, then swap it in
+    tmp_dir = store_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    out = price_store.create(tmp_dir, dates, list(files), fields)
+    os.makedirs(os.path.join(tmp_dir, CALENDARS))
+    for (ticker, _), d in zip(files.items(), date_sets):
+        np.save(os.path.join(tmp_dir, CALENDARS, f"{ticker}.npy"), d)
+
+    col = {t: j for j, t in enumerate(files)}
+    for field in fields:
+        if reuse:
+            _, _, old_values = price_store.open_store(store_dir, field)
+            for t in reuse:
+                out[field][:, col[t]] = old_values[:, old_codes.index(t)]
+
+    todo = [t for t in files if t not in reuse]
+    with ProcessPoolExecutor(workers) as pool:
+        for start in range(0, len(todo), chunk_files):
+            chunk = todo[start:start + chunk_files]
+            frames = pool.map(_read_fields, [files[t] for t in chunk],
+                              [fields] * len(chunk))
+            for t, df in zip(chunk, frames):
+                df = df[~df.index.duplicated(keep="last")].reindex(dates)
+                if fill == "ffill":
+                    df = df.ffill(limit=fill_limit)
+                for field in fields:
+                    out[field][:, col[t]] = df[field].to_numpy()
+    for m in out.values():
+        m.flush()
+    del out
+
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+        json.dump({"settings": settings, "files": signatures}, f, indent=1)
+    _swap_in(tmp_dir, store_dir)
+
+    if csv_path:
+        write_csv(store_dir, csv_path)
+    return {"parsed": todo, "reused": reuse}
+
+
+def write_csv(store_dir: str, csv_path: str, field: str = "PX_LAST",
+              chunk_rows: int = 10000):
+    """Write one field of a store as a dates x codes CSV, chunk_rows at a time."""
+    frame = price_store.load_frame(store_dir, field)
+    for start in range(0, len(frame), chunk_rows):
+        frame.iloc[start:start + chunk_rows].to_csv(
+            csv_path, mode="w" if start == 0 else "a", header=start == 0,
+            date_format="%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Align a directory of *-bloomberg.csv files into a price store.")
+    parser.add_argument("directory")
+    parser.add_argument("--out", required=True, help="store directory")
+    parser.add_argument("--how", choices=["union", "intersection"], default="union")
+    parser.add_argument("--fill", choices=["ffill"], default=None)
+    parser.add_argument("--fill-limit", type=int, default=None)
+    parser.add_argument("--fields", nargs="+", default=["PX_LAST"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-files", type=int, default=256)
+    parser.add_argument("--csv", default=None, help="also write the PX_LAST panel here")
+    args = parser.parse_args(argv)
+
+    summary = ingest(args.directory, args.out, args.how, args.fill, args.fill_limit,
+                     args.fields, args.workers, args.chunk_files, args.csv)
+    print(f"Parsed {len(summary['parsed'])} file(s), reused {len(summary['reused'])} "
+          f"unchanged file(s); store written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 # portfolio_var_es.py
 
 import numpy as np
+import pandas as pd
 from scipy.stats import norm
 
+from option_parametric import bs_price_vec, is_call
+from random_source import get_rng
+import option_portfolio
+
 def parametric_var(S, pos, mu, sigma, var_level):
     """
     5-day parametric VaR for a stock position.
@@ -36,23 +41,28 @@ def parametric_es(S, pos, mu, sigma, es_level):
     es_loss = -S * (cond_moment - 1) * pos
     return es_loss
 
-def mc_var(S, pos, mu, sigma, var_level, n_sims):
+def _draws(n_sims, rng, Z):
+    """Standard normals to simulate with: Z if given, else fresh from rng."""
+    return get_rng(rng).standard_normal(n_sims) if Z is None else Z
+
+def mc_var(S, pos, mu, sigma, var_level, n_sims, rng=None, Z=None):
     """
     5-day Monte Carlo VaR for a stock position.
+    Pass the same Z block to every call on a date for common random numbers.
     """
     mu5  = (mu - 0.5*sigma**2) * 5
     sig5 = sigma * np.sqrt(5)
-    sims = np.random.normal(mu5, sig5, size=n_sims)
+    sims = mu5 + sig5*_draws(n_sims, rng, Z)
     losses = -S*(np.exp(sims) - 1)*pos
     return np.percentile(losses, 100*var_level)
 
-def mc_es(S, pos, mu, sigma, es_level, n_sims):
+def mc_es(S, pos, mu, sigma, es_level, n_sims, rng=None, Z=None):
     """
     5-day Monte Carlo ES for a stock position.
     """
     mu5  = (mu - 0.5*sigma**2) * 5
     sig5 = sigma * np.sqrt(5)
-    sims = np.random.normal(mu5, sig5, size=n_sims)
+    sims = mu5 + sig5*_draws(n_sims, rng, Z)
     losses = -S*(np.exp(sims) - 1)*pos
     cutoff = np.percentile(losses, 100*es_level)
     tail   = losses[losses >= cutoff]
@@ -90,35 +100,37 @@ def option_parametric_es(S, pos, K, T, r, q, mu, sigma, es_level, option_type='c
     P0, delta = bs_price_delta(S, K, r, T, sigma, q, option_type)
     return parametric_es(S, delta*pos, mu, sigma, es_level)
 
-def option_mc_var(S, pos, K, T, r, q, mu, sigma, var_level, n_sims, option_type='call'):
+def _option_losses(S, S5, pos, K, T, r, q, sigma, option_type):
+    """
+    Repricing losses for all simulated spots S5 at once.
+    """
+    call = is_call(option_type)
+    P0 = bs_price_vec(S, K, r, q, T, sigma, call)
+    P5 = bs_price_vec(S5, K, r, q, T-5/252, sigma, call)
+    return (P0 - P5)*pos
+
+def option_mc_var(S, pos, K, T, r, q, mu, sigma, var_level, n_sims, option_type='call',
+                  rng=None, Z=None):
     """
     5-day MC VaR for an option by full repricing.
     """
     mu5  = (mu - 0.5*sigma**2) * 5
     sig5 = sigma * np.sqrt(5)
-    sims = np.random.normal(mu5, sig5, size=n_sims)
+    sims = mu5 + sig5*_draws(n_sims, rng, Z)
     S5   = S * np.exp(sims)
-    losses = []
-    for s5 in S5:
-        P0, _ = bs_price_delta(S, K, r, T, sigma, q, option_type)
-        P5, _ = bs_price_delta(s5, K, r, T-5/252, sigma, q, option_type)
-        losses.append((P0 - P5)*pos)
+    losses = _option_losses(S, S5, pos, K, T, r, q, sigma, option_type)
     return np.percentile(losses, 100*var_level)
 
-def option_mc_es(S, pos, K, T, r, q, mu, sigma, es_level, n_sims, option_type='call'):
+def option_mc_es(S, pos, K, T, r, q, mu, sigma, es_level, n_sims, option_type='call',
+                 rng=None, Z=None):
     """
     5-day MC ES for an option by repricing.
     """
     mu5  = (mu - 0.5*sigma**2) * 5
     sig5 = sigma * np.sqrt(5)
-    sims = np.random.normal(mu5, sig5, size=n_sims)
-    losses = []
-    for s5 in sims:
-        S5 = S * np.exp(s5)
-        P0, _ = bs_price_delta(S, K, r, T, sigma, q, option_type)
-        P5, _ = bs_price_delta(S5, K, r, T-5/252, sigma, q, option_type)
-        losses.append((P0 - P5)*pos)
-    losses = np.array(losses)
+    sims = mu5 + sig5*_draws(n_sims, rng, Z)
+    S5   = S * np.exp(sims)
+    losses = _option_losses(S, S5, pos, K, T, r, q, sigma, option_type)
     cutoff = np.percentile(losses, 100*es_level)
     tail = losses[losses >= cutoff]
     return tail.mean() if len(tail)>0 else 0.0
@@ -155,23 +167,73 @@ def main():
     var_level = float(input("VaR confidence (e.g. 0.99): "))
     es_level  = float(input("ES confidence (e.g. 0.975): "))
     n_sims    = int(input("MC sims (e.g. 10000): "))
+    seed      = input("MC seed (blank for random): ").strip()
+
+    # one block of draws per underlying: positions on the same code share
+    # its paths, different codes are independent, in every table below
+    underlyings = _underlyings(stocks, options)
+    rng = get_rng(int(seed) if seed else None)
+    shocks = rng.standard_normal((len(underlyings), n_sims))
+    Z = dict(zip(underlyings.index, shocks))
+    print("\nMC: each underlying has its own independent draws; positions on the same "
+          "underlying share them.")
 
     print("\n=== Stock Parametric VaR/ES ===")
     for code, pos, S, mu, sigma in stocks:
         v_p = parametric_var(S, pos, mu, sigma, var_level)
         e_p = parametric_es(S, pos, mu, sigma, es_level)
-        v_m = mc_var(S, pos, mu, sigma, var_level, n_sims)
-        e_m = mc_es(S, pos, mu, sigma, es_level, n_sims)
+        v_m = mc_var(S, pos, mu, sigma, var_level, n_sims, Z=Z[code])
+        e_m = mc_es(S, pos, mu, sigma, es_level, n_sims, Z=Z[code])
         print(f"{code}:  Parametric VaR={v_p:.2f}, ES={e_p:.2f} | MC VaR={v_m:.2f}, ES={e_m:.2f}")
 
     print("\n=== Option Parametric VaR/ES ===")
     for code, pos, S, K, T, r, q, mu, sigma, otype in options:
         v_p = option_parametric_var(S, pos, K, T, r, q, mu, sigma, var_level, otype)
         e_p = option_parametric_es(S, pos, K, T, r, q, mu, sigma, es_level, otype)
-        v_m = option_mc_var(S, pos, K, T, r, q, mu, sigma, var_level, n_sims, otype)
-        e_m = option_mc_es(S, pos, K, T, r, q, mu, sigma, es_level, n_sims, otype)
+        z = Z[code]
+        v_m = option_mc_var(S, pos, K, T, r, q, mu, sigma, var_level, n_sims, otype, Z=z)
+        e_m = option_mc_es(S, pos, K, T, r, q, mu, sigma, es_level, n_sims, otype, Z=z)
         print(f"{code}:  Parametric VaR={v_p:.2f}, ES={e_p:.2f} | MC VaR={v_m:.2f}, ES={e_m:.2f}")
 
+    if stocks or options:
+        print("\n=== Portfolio MC VaR/ES (same paths as above, underlyings independent) ===")
+        table = _portfolio_var_es(underlyings, stocks, options, var_level, es_level,
+                                  n_sims, shocks)
+        for code, row in table.iterrows():
+            print(f"{code}:  MC VaR={row['var']:.2f}, ES={row['es']:.2f}")
+
+
+def _underlyings(stocks, options) -> pd.DataFrame:
+    """
+    S, mu and sigma per underlying code, in the order the codes were
+    entered. A code entered twice must have the same inputs each time.
+    """
+    entries = [(code, (S, mu, sigma)) for code, pos, S, mu, sigma in stocks]
+    entries += [(code, (S, mu, sigma))
+                for code, pos, S, K, T, r, q, mu, sigma, otype in options]
+    underlyings = {}
+    for code, inputs in entries:
+        if underlyings.setdefault(code, inputs) != inputs:
+            raise ValueError(f"{code} was entered with S, mu, sigma = {underlyings[code]} "
+                             f"and {inputs}; use the same inputs for one underlying")
+    return pd.DataFrame.from_dict(underlyings, orient="index", columns=["S", "mu", "sigma"])
+
+
+def _portfolio_var_es(underlyings, stocks, options, var_level, es_level, n_sims, shocks):
+    """
+    Book VaR/ES from option_portfolio, with each underlying simulated
+    once in this module's units (mu, sigma per day over 5 days; options
+    age 5/252 years) on its row of shocks, the same draws the
+    per-position figures use.
+    """
+    return option_portfolio.compute_var_es(
+        underlyings, var_level, es_level,
+        stocks=[(code, pos) for code, pos, *_ in stocks],
+        options=[{"code": code, "position": pos, "K": K, "T": T, "r": r, "q": q,
+                  "sigma": sigma, "option_type": otype}
+                 for code, pos, S, K, T, r, q, mu, sigma, otype in options],
+        n_sims=n_sims, horizon=5, decay=5/252, Z=shocks)
+
 
 if __name__ == "__main__":
     main()
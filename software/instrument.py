@@ -0,0 +1,188 @@
+# instrument.py
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+from functools import wraps
+
+ENV = "VARES_INSTRUMENT"          # e.g. "1", "profile", "memory", "profile,memory"
+ENV_OUT = "VARES_INSTRUMENT_OUT"  # JSON report path used by finish()
+
+_on = False
+_opts = {"profile": False, "memory": False}
+_stages = {}
+_counters = {}
+_stack = []
+_profiler = None
+_NULL = nullcontext()
+
+
+def enable(profile: bool = False, memory: bool = False):
+    """
+    Start collecting stage timings and counters. profile=True also runs
+    cProfile for the whole session; memory=True traces allocations so
+    each stage reports its peak.
+    """
+    global _on, _profiler
+    _on = True
+    _opts.update(profile=profile, memory=memory)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if profile and _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def disable():
+    global _on, _profiler
+    _on = False
+    if _profiler is not None:
+        _profiler.disable()
+    if _opts["memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def enabled() -> bool:
+    return _on
+
+
+def reset():
+    """Forget collected stages, counters and profile data."""
+    global _profiler
+    _stages.clear()
+    _counters.clear()
+    _stack.clear()
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler = cProfile.Profile()
+        if _on and _opts["profile"]:
+            _profiler.enable()
+
+
+def from_env():
+    """Enable instrumentation if the VARES_INSTRUMENT variable is set."""
+    value = os.environ.get(ENV, "").strip().lower()
+    if value and value not in ("0", "off", "false"):
+        opts = {v.strip() for v in value.split(",")}
+        enable(profile="profile" in opts, memory="memory" in opts)
+
+
+class _Stage:
+    __slots__ = ("name", "t0", "peak")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.peak = 0
+        if _opts["memory"]:
+            # carry the peak so far up to the enclosing stage before
+            # resetting it for this one
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        _stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        _stack.pop()
+        path = "/".join([s.name for s in _stack] + [self.name])
+        rec = _stages.setdefault(path, {"calls": 0, "seconds": 0.0})
+        rec["calls"] += 1
+        rec["seconds"] += elapsed
+        if _opts["memory"]:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            rec["peak_mb"] = max(rec.get("peak_mb", 0.0), self.peak / 2**20)
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, self.peak)
+        return False
+
+
+def stage(name: str):
+    """
+    Context manager timing the enclosed block as stage name (nested
+    stages are reported as parent/child). A shared no-op when disabled.
+    """
+    return _Stage(name) if _on else _NULL
+
+
+def timed(name: str = None):
+    """Decorator: run the function inside stage(name or its qualified name)."""
+    def wrap(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def inner(*args, **kwargs):
+            if not _on:
+                return func(*args, **kwargs)
+            with _Stage(label):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def count(name: str, n: int = 1):
+    """Add n to counter name (simulations drawn, windows evaluated, ...)."""
+    if _on:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def report(top: int = 25) -> dict:
+    """Stages, counters and (if profiling) the top cumulative-time functions."""
+    out = {"stages": {k: dict(v) for k, v in _stages.items()},
+           "counters": dict(_counters)}
+    if _profiler is not None:
+        _profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(_profiler, stream=stream).sort_stats("cumulative").print_stats(top)
+        out["profile"] = stream.getvalue()
+        if _on and _opts["profile"]:
+            _profiler.enable()
+    return out
+
+
+def print_table(rep: dict = None, file=None):
+    """Console table of a report (the current one by default)."""
+    rep = report() if rep is None else rep
+    file = file or sys.stdout
+    memory = any("peak_mb" in r for r in rep["stages"].values())
+    print(f"\n{'Stage':<48}{'Calls':>7}{'Seconds':>11}" + (f"{'Peak MB':>10}" if memory else ""),
+          file=file)
+    for path, r in rep["stages"].items():
+        line = f"{path:<48}{r['calls']:>7}{r['seconds']:>11.4f}"
+        if memory:
+            line += f"{r.get('peak_mb', float('nan')):>10.1f}"
+        print(line, file=file)
+    if rep["counters"]:
+        print(f"\n{'Counter':<48}{'Value':>18}", file=file)
+        for name, n in rep["counters"].items():
+            print(f"{name:<48}{n:>18,}", file=file)
+
+
+def write_report(path: str, rep: dict = None):
+    rep = report() if rep is None else rep
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(rep, f, indent=1)
+
+
+def finish(path: str = None):
+    """
+    End of a run: if enabled, print the table and write the JSON report
+    to path (default $VARES_INSTRUMENT_OUT or output/instrument.json).
+    """
+    if not _on:
+        return
+    rep = report()
+    print_table(rep)
+    path = path or os.environ.get(ENV_OUT, "output/instrument.json")
+    write_report(path, rep)
+    print(f"Instrumentation report written to {path}")
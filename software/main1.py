@@ -7,11 +7,12 @@ import parametric5yr
 import parametric_ewm
 import historical
 import montecarlo
+import price_store
 
 def prompt_file():
     while True:
         path = input("Enter the relative path to CSV file (dates as index, security codes as columns): (software/data/portfolio.csv)").strip()
-        if os.path.isfile(path):
+        if os.path.isfile(path) or os.path.isdir(path):
             return path
         print(f"File not found: {path}")
 
@@ -33,7 +34,7 @@ def main():
 
     # Load CSV
     try:
-        df = pd.read_csv(price_file, parse_dates=True, index_col=0)
+        df = price_store.load_prices(price_file)
     except Exception as e:
         print(f"Error reading {price_file}: {e}", file=sys.stderr)
         sys.exit(1)
@@ -52,12 +53,12 @@ def main():
     # Compute VaR and ES series
     var1 = parametric5yr.compute_var(portfolio, var_level)
     es1  = parametric5yr.compute_es(portfolio, es_level)
-    var2 = parametric_ewm.compute_var(portfolio, var_level, LAMBDA)
-    # es2  = parametric_ewm.compute_es(portfolio, es_level, LAMBDA)
+    ewm2 = parametric_ewm.compute_var_es(portfolio, var_level, es_level, LAMBDA)
+    var2, es2 = ewm2["var"], ewm2["es"]
     var3 = historical.compute_var(portfolio, var_level, WINDOW)
     es3  = historical.compute_es(portfolio, es_level, WINDOW)
-    var4 = montecarlo.compute_var(portfolio, var_level, WINDOW, N_SIMS)
-    es4  = montecarlo.compute_es(portfolio, es_level, WINDOW, N_SIMS)
+    mc4  = montecarlo.compute_var_es(portfolio, var_level, es_level, WINDOW, N_SIMS)
+    var4, es4 = mc4["var"], mc4["es"]
 
     # Plot VaR comparison
     plt.figure(figsize=(10,6))
@@ -77,7 +78,7 @@ def main():
     plt.figure(figsize=(10,6))
     for series, label in [
         (es1, "Parametric 5yr"),
-        # (es2, "Parametric EWM"),
+        (es2, "Parametric EWM"),
         (es3, "Historical"),
         (es4, "Monte Carlo")
     ]:
@@ -91,7 +92,7 @@ def main():
     print(f"{'Method':<15}{'Latest VaR':>12}{'Latest ES':>12}")
     for name, v, e in [
         ("Parametric5yr", var1, es1),
-        # ("ParametricEWM", var2, es2),
+        ("ParametricEWM", var2, es2),
         ("Historical",    var3, es3),
         ("MonteCarlo",    var4, es4)
     ]:
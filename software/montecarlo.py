@@ -2,59 +2,394 @@ import pandas as pd
 import numpy as np
 from scipy.stats import norm
 
-def compute_var(prices: pd.Series, var_level: float,
-                window_days: int, n_sims: int) -> pd.Series:
+from parametric5yr import rolling_moments
+from random_source import get_rng, normals
+from executor import Executor, SERIAL
+import instrument
+from adaptive import adaptive_tail, buffer_size
+import confidence
+
+# upper bound on the working memory of one simulated block of dates
+MEM_BUDGET = 256 * 2**20
+
+
+def chunk_rows(n_sims: int, mem_budget: int = MEM_BUDGET, n_arrays: int = 3) -> int:
     """
-    5-day VaR at var_level via Monte Carlo GBM simulation,
-    parameters estimated over window_days.
-    """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    var = pd.Series(index=prices.index, dtype=float)
-    for i in range(window_days, len(log_ret)):
-        date = log_ret.index[i]
-        data = log_ret.iloc[i - window_days : i]
-        mu = data.mean()
-        sigma = data.std()
-        mean5 = 5 * mu
-        std5 = np.sqrt(5) * sigma
-        sims = np.random.normal(mean5, std5, size=n_sims)
-        S = prices.loc[date]
-        losses = -S * (np.exp(sims) - 1)
-        var.loc[date] = np.percentile(losses, 100 * var_level)
-    return var.dropna()
+    Number of dates that fit in one (dates x n_sims) block when
+    n_arrays float64 arrays of that shape are alive at once.
+    """
+    return max(1, int(mem_budget // (n_arrays * 8 * n_sims)))
 
 
-def compute_es(prices: pd.Series,
-               es_level: float,
-               window_days: int,
-               n_sims: int) -> pd.Series:
+def _percentile_rows(part: np.ndarray, level: float) -> np.ndarray:
     """
-    5-day ES at es_level via Monte Carlo GBM simulation,
-    parameters estimated over window_days.
+    Row-wise np.percentile(x, 100 * level) on an array already
+    partitioned around the two order statistics it needs.
+    """
+    n = part.shape[1]
+    h = (n - 1) * (100 * level / 100)
+    lo = int(np.floor(h))
+    hi = min(lo + 1, n - 1)
+    g = h - lo
+    a, b = part[:, lo], part[:, hi]
+    d = b - a
+    return b - d * (1 - g) if g >= 0.5 else a + d * g
+
+
+def _kth(n: int, level: float):
+    h = (n - 1) * (100 * level / 100)
+    lo = int(np.floor(h))
+    return [lo, min(lo + 1, n - 1)]
+
+
+def _tail_mean_rows(part: np.ndarray, level: float) -> np.ndarray:
+    """
+    Row-wise mean of the values at or above the level percentile, on an
+    array partitioned around that percentile's order statistics.
+    """
+    lo, hi = _kth(part.shape[1], level)
+    cutoff = _percentile_rows(part, level)
+
+    # everything from position hi on is >= cutoff; below hi only values
+    # tied with the cutoff can qualify, so rows with ties take the full mask
+    es = part[:, hi:].mean(axis=1)
+    ties = part[:, lo] >= cutoff
+    if ties.any():
+        rows = part[ties]
+        tail = rows >= cutoff[ties, None]
+        es[ties] = np.where(tail, rows, 0.0).sum(axis=1) / tail.sum(axis=1)
+    return es
+
+
+def tail_stats(losses: np.ndarray, var_level, es_level):
+    """
+    Row-wise VaR (the var_level percentile of losses) and ES (the mean
+    of losses at or above the es_level percentile), using a single
+    np.partition per block instead of full sorts. Either level may be a
+    sequence; all of them share the one partition and the results are
+    then (rows x levels).
+    """
+    n = losses.shape[1]
+    var_levels, es_levels = np.atleast_1d(var_level), np.atleast_1d(es_level)
+    kth = sorted({k for level in (*var_levels, *es_levels) for k in _kth(n, level)})
+    part = np.partition(losses, kth, axis=1)
+    var = np.column_stack([_percentile_rows(part, level) for level in var_levels])
+    es = np.column_stack([_tail_mean_rows(part, level) for level in es_levels])
+    if np.ndim(var_level) == 0 and np.ndim(es_level) == 0:
+        return var[:, 0], es[:, 0]
+    return var, es
+
+
+def weighted_tail_stats(losses: np.ndarray, weights: np.ndarray,
+                        var_level, es_level):
+    """
+    Row-wise VaR and ES from likelihood-ratio weighted paths (importance
+    sampling). With the tail mass c(x) = sum of w_i over L_i >= x, / n,
+    VaR is the largest loss whose tail mass reaches 1 - var_level and ES
+    is the mean loss over the top 1 - es_level of probability mass.
+    Sequences of levels share the one sort, as in tail_stats.
+    """
+    rows, n = losses.shape
+    order = np.argsort(losses, axis=1)[:, ::-1]
+    L = np.take_along_axis(losses, order, axis=1)
+    w = np.take_along_axis(weights, order, axis=1) / n
+    mass = np.cumsum(w, axis=1)
+    w *= L
+    wl = np.cumsum(w, axis=1)
+    r = np.arange(rows)
+
+    def at(p):
+        k = np.minimum((mass < p).sum(axis=1), n - 1)
+        q = L[r, k]
+        before = k > 0
+        m0 = np.where(before, mass[r, k - 1], 0.0)
+        s0 = np.where(before, wl[r, k - 1], 0.0)
+        return q, (s0 + (p - m0) * q) / p
+
+    if np.ndim(var_level) == 0 and np.ndim(es_level) == 0:
+        var, _ = at(1 - var_level)
+        _, es = at(1 - es_level)
+        return var, es
+    var = np.column_stack([at(1 - level)[0] for level in np.atleast_1d(var_level)])
+    es = np.column_stack([at(1 - level)[1] for level in np.atleast_1d(es_level)])
+    return var, es
+
+
+def _replicate_stats(x: np.ndarray, n_rep: int, var_level: float, es_level: float,
+                     weights: np.ndarray = None):
+    """Per-replicate VaR and ES, each of shape (rows, n_rep)."""
+    rows, n = x.shape
+    shape = (rows * n_rep, n // n_rep)
+    if weights is None:
+        var_r, es_r = tail_stats(x.reshape(shape), var_level, es_level)
+    else:
+        var_r, es_r = weighted_tail_stats(x.reshape(shape), weights.reshape(shape),
+                                          var_level, es_level)
+    return var_r.reshape(rows, n_rep), es_r.reshape(rows, n_rep)
+
+
+def _control_adjust(y, y_r, x, x_r):
+    """
+    Control-variate estimate y - beta * x, where x (and each replicate
+    x_r) is a control's error against its known value, with beta fitted
+    per row across replicates. Returns the estimate and its standard error.
+    """
+    n_rep = y_r.shape[1]
+    xc = x_r - x_r.mean(axis=1, keepdims=True)
+    yc = y_r - y_r.mean(axis=1, keepdims=True)
+    sxx = (xc * xc).sum(axis=1)
+    beta = np.divide((xc * yc).sum(axis=1), sxx, out=np.zeros_like(sxx), where=sxx > 0)
+    resid = y_r - beta[:, None] * x_r
+    return y - beta * x, resid.std(axis=1, ddof=1) / np.sqrt(n_rep)
+
+
+def tail_estimates(losses: np.ndarray, var_level: float, es_level: float,
+                   n_rep: int, control: np.ndarray = None,
+                   weights: np.ndarray = None):
+    """
+    Row-wise VaR and ES with standard errors. The columns of losses are
+    n_rep equal, independent replicate samples (see
+    random_source.normals); the estimates use all of them and the
+    standard errors come from the spread of the per-replicate estimates.
+    control, if given, is a standard normal loss of the same shape that
+    moves with losses (e.g. -Z for a long stock). Its VaR and ES are
+    known exactly (the standardized closed-form GBM quantile of
+    parametric5yr), so its sampling error is regressed out of both.
+    weights are importance-sampling likelihood ratios, if any.
+    Returns (var, es, var_se, es_se).
+    """
+    var, es = _tail(losses, var_level, es_level, weights)
+    var_r, es_r = _replicate_stats(losses, n_rep, var_level, es_level, weights)
+    if control is None:
+        scale = 1 / np.sqrt(n_rep)
+        return (var, es, var_r.std(axis=1, ddof=1) * scale,
+                es_r.std(axis=1, ddof=1) * scale)
+
+    known_var = norm.ppf(var_level)
+    known_es = norm.pdf(norm.ppf(es_level)) / (1 - es_level)
+    cvar, ces = _tail(control, var_level, es_level, weights)
+    cvar_r, ces_r = _replicate_stats(control, n_rep, var_level, es_level, weights)
+    var, var_se = _control_adjust(var, var_r, cvar - known_var, cvar_r - known_var)
+    es, es_se = _control_adjust(es, es_r, ces - known_es, ces_r - known_es)
+    return var, es, var_se, es_se
+
+
+def _tail(losses, var_level, es_level, weights=None):
+    if weights is None:
+        return tail_stats(losses, var_level, es_level)
+    return weighted_tail_stats(losses, weights, var_level, es_level)
+
+
+def tilt(Z: np.ndarray, direction, shift):
+    """
+    Importance sampling by mean shift: move the standard normal loss
+    direction * Z up by shift and return the shifted draws with their
+    likelihood ratios phi(x) / phi(x - shift), x the shifted loss.
+    """
+    Z += direction * shift
+    weights = np.multiply(direction * Z, -shift)
+    weights += 0.5 * shift**2
+    return Z, np.exp(weights, out=weights)
+
+
+def importance_shift(importance, var_level: float, es_level: float):
+    """
+    Mean shift for importance sampling: None (off), a number, or 'auto'
+    for the standard normal quantile of the deeper of the two levels,
+    which centres the draws on the tail being estimated.
+    """
+    if importance is None:
+        return None
+    if importance == "auto":
+        return float(norm.ppf(max(np.max(var_level), np.max(es_level))))
+    return float(importance)
+
+
+def check_replicates(n_sims: int, n_rep: int, control: bool):
+    """
+    Validated replicate count: None (no standard errors) unless
+    requested or needed by the control variate (default 10).
     """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    es = pd.Series(index=prices.index, dtype=float)
+    if n_rep is None and control:
+        n_rep = 10
+    if n_rep is not None and (n_rep < 2 or n_sims % n_rep):
+        raise ValueError(f"n_rep must be at least 2 and divide n_sims={n_sims}, got {n_rep}")
+    return n_rep
 
-    # For each date, estimate mu/sigma on the past window_days,
-    # simulate n_sims 5-day log-returns, convert to dollar losses,
-    # then average the worst es_level tail.
-    for i in range(window_days, len(log_ret)):
-        date = log_ret.index[i]
-        data = log_ret.iloc[i - window_days : i]
-        mu, sigma = data.mean(), data.std()
 
-        # simulate 5-day log-returns
-        sims = np.random.normal(5*mu, np.sqrt(5)*sigma, size=n_sims)
+def _mc_block(arrays, rng, n_sims, var_level, es_level,
+              sampler="pseudo", n_rep=None, control=False, shift=None):
+    """
+    Executor worker: simulate one block of dates and return its
+    (VaR, ES) columns, plus their standard errors when n_rep is set.
+    """
+    # simulate 5-day log-returns for the whole block
+    rows, reps = len(arrays["S"]), n_rep or 1
+    sims = normals((rows, reps, n_sims // reps), rng, sampler).reshape(rows, n_sims)
+    # the loss falls as Z rises, so -Z is the matching standard normal loss
+    weights = None
+    if shift is not None:
+        sims, weights = tilt(sims, -1.0, shift)
+    control = -sims if control else None
+    sims *= arrays["std5"][:, None]
+    sims += arrays["mean5"][:, None]
+
+    # convert to dollar losses in place
+    losses = np.expm1(sims, out=sims)
+    losses *= -arrays["S"][:, None]
+    if n_rep is None:
+        return np.column_stack(_tail(losses, var_level, es_level, weights))
+    return np.column_stack(tail_estimates(losses, var_level, es_level, n_rep,
+                                          control, weights))
 
-        # convert to dollar losses
-        S = prices.loc[date]
-        losses = -S * (np.exp(sims) - 1)
 
-        # find the cutoff at the es_level percentile (e.g. 99th)
-        cutoff = np.percentile(losses, 100 * es_level)
+def compute_var_es(prices: pd.Series,
+                   var_level: float,
+                   es_level: float,
+                   window_days: int,
+                   n_sims: int,
+                   mem_budget: int = MEM_BUDGET,
+                   rng=None,
+                   executor: Executor = SERIAL,
+                   sampler: str = "pseudo",
+                   n_rep: int = None,
+                   control: bool = False,
+                   importance=None) -> pd.DataFrame:
+    """
+    5-day VaR and ES via Monte Carlo GBM simulation, parameters
+    estimated over window_days. All dates are simulated as one
+    (dates x n_sims) array, in blocks sized to mem_budget bytes, and
+    VaR and ES are read off the same paths. rng is a Generator or
+    seed (see random_source.get_rng); equal seeds give equal paths.
+    Blocks run on executor (serial by default), each with its own
+    stream spawned from rng.
+    sampler picks the draw scheme (see random_source.normals). With
+    n_rep the paths are drawn as n_rep independent replicates and the
+    standard errors are returned too; control=True adds the closed-form
+    GBM quantile as a control variate (n_rep defaults to 10).
+    importance='auto' (or a shift in standard deviations) draws the
+    shocks from a normal shifted into the loss tail and reweights them
+    by the likelihood ratio, so deep-tail VaR/ES need far fewer paths.
+    var_level and es_level may be sequences; every level is read off
+    the same paths (see confidence.frame for the columns).
+    Returns a DataFrame with columns 'var' and 'es' (and 'var_se',
+    'es_se' when n_rep or control is set).
+    """
+    n_rep = check_replicates(n_sims, n_rep, control)
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    if n_rep is not None and not single:
+        raise ValueError("standard errors (n_rep/control) need a single var_level "
+                         "and es_level")
+    mu, sigma = rolling_moments(prices, window_days)
+    valid = (mu.notna() & sigma.notna()).to_numpy()
+    index = mu.index[valid]
+    arrays = {
+        "mean5": 5 * mu.to_numpy()[valid],
+        "std5":  np.sqrt(5) * sigma.to_numpy()[valid],
+        "S":     prices.loc[index].to_numpy(dtype=float),
+    }
+    shift = importance_shift(importance, var_level, es_level)
+    n_arrays = (5 if control else 3) + (3 if shift is not None else 0)
+    out = executor.map(_mc_block, arrays, len(index), seed=get_rng(rng),
+                       chunk_size=chunk_rows(n_sims, mem_budget, n_arrays),
+                       n_sims=n_sims, var_level=var_level, es_level=es_level,
+                       sampler=sampler, n_rep=n_rep, control=control, shift=shift)
+    instrument.count("montecarlo.simulations", len(index) * n_sims)
+    if n_rep is None:
+        return confidence.frame(out, index, var_level, es_level, single)
+    return pd.DataFrame(out, index=index, columns=["var", "es", "var_se", "es_se"])
 
-        # average *only* the losses in the worst (1 − es_level) tail
-        tail_losses = losses[losses >= cutoff]
-        es.loc[date] = tail_losses.mean() if len(tail_losses) else np.nan
 
-    return es.dropna()
+def _adaptive_block(arrays, rng, var_level, es_level, rel_tol, batch, max_sims, sampler):
+    """
+    Executor worker: adaptive path counts for one block of dates,
+    returning (VaR, ES, VaR se, ES se, paths used) columns.
+    """
+    def draw(rows, n):
+        sims = normals((len(rows), n), rng, sampler)
+        sims *= arrays["std5"][rows, None]
+        sims += arrays["mean5"][rows, None]
+        losses = np.expm1(sims, out=sims)
+        losses *= -arrays["S"][rows, None]
+        return losses
+
+    return np.column_stack(adaptive_tail(draw, len(arrays["S"]), var_level, es_level,
+                                         rel_tol, batch, max_sims))
+
+
+def compute_var_es_adaptive(prices: pd.Series,
+                            var_level: float,
+                            es_level: float,
+                            window_days: int,
+                            rel_tol: float = 0.01,
+                            batch: int = 1000,
+                            max_sims: int = 100_000,
+                            mem_budget: int = MEM_BUDGET,
+                            rng=None,
+                            executor: Executor = SERIAL,
+                            sampler: str = "pseudo") -> pd.DataFrame:
+    """
+    5-day Monte Carlo VaR and ES like compute_var_es, but each date
+    draws batches of paths until the 95% interval of both estimates is
+    within rel_tol of the estimate (or max_sims is reached), so calm
+    dates stop early and stressed dates get more paths.
+    The stopping rule needs a single var_level and es_level.
+    Returns a DataFrame with columns 'var', 'es', 'var_se', 'es_se' and
+    'n_sims' (paths used on each date).
+    """
+    if not confidence.levels(var_level, es_level)[2]:
+        raise ValueError("the adaptive path count needs a single var_level and es_level")
+    mu, sigma = rolling_moments(prices, window_days)
+    valid = (mu.notna() & sigma.notna()).to_numpy()
+    index = mu.index[valid]
+    arrays = {
+        "mean5": 5 * mu.to_numpy()[valid],
+        "std5":  np.sqrt(5) * sigma.to_numpy()[valid],
+        "S":     prices.loc[index].to_numpy(dtype=float),
+    }
+    cap = buffer_size(max_sims, var_level, es_level)
+    out = executor.map(_adaptive_block, arrays, len(index), seed=get_rng(rng),
+                       chunk_size=chunk_rows(cap + batch, mem_budget, n_arrays=3),
+                       var_level=var_level, es_level=es_level, rel_tol=rel_tol,
+                       batch=batch, max_sims=max_sims, sampler=sampler)
+    out = pd.DataFrame(out, index=index, columns=["var", "es", "var_se", "es_se", "n_sims"])
+    out["n_sims"] = out["n_sims"].astype(int)
+    instrument.count("montecarlo.simulations", int(out["n_sims"].sum()))
+    return out
+
+
+def compute_var(prices: pd.Series, var_level: float,
+                window_days: int, n_sims: int, rng=None,
+                executor: Executor = SERIAL,
+                sampler: str = "pseudo", control: bool = False,
+                importance=None) -> pd.Series:
+    """
+    5-day VaR at var_level via Monte Carlo GBM simulation,
+    parameters estimated over window_days. A sequence of levels gives
+    a dates x levels DataFrame from one set of paths.
+    """
+    return confidence.select(compute_var_es(prices, var_level, var_level,
+                                            window_days, n_sims, rng=rng, executor=executor,
+                                            sampler=sampler, control=control,
+                                            importance=importance), "var")
+
+
+def compute_es(prices: pd.Series,
+               es_level: float,
+               window_days: int,
+               n_sims: int,
+               rng=None,
+               executor: Executor = SERIAL,
+               sampler: str = "pseudo",
+               control: bool = False,
+               importance=None) -> pd.Series:
+    """
+    5-day ES at es_level via Monte Carlo GBM simulation,
+    parameters estimated over window_days. A sequence of levels gives
+    a dates x levels DataFrame from one set of paths.
+    """
+    # average *only* the losses in the worst (1 − es_level) tail
+    return confidence.select(compute_var_es(prices, es_level, es_level,
+                                            window_days, n_sims, rng=rng, executor=executor,
+                                            sampler=sampler, control=control,
+                                            importance=importance), "es")
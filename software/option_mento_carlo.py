@@ -1,88 +1,184 @@
 import numpy as np
 import pandas as pd
 from scipy.stats import norm
-from math import exp, sqrt
 
-# reuse bs_price from parametric file or re-import here
-from option_parametric import bs_price
+# reuse the pricer from parametric file
+from option_parametric import bs_price_vec, is_call
+from parametric5yr import rolling_moments
+from montecarlo import (MEM_BUDGET, chunk_rows, tail_stats, tail_estimates, check_replicates,
+                        weighted_tail_stats, tilt, importance_shift)
+from random_source import get_rng, normals
+from executor import Executor, SERIAL
+import instrument
+import confidence
 
-def compute_var(S, K, T, mu, sigma, position, var_level, r=0.05, q=0.0,
-                option_type='call', n_sims=10000) -> float:
+DAYS = 5
+
+
+def _reprice_losses(S, K, T, mu, sigma, position, r, q, call, Z):
     """
-    Monte Carlo VaR for an option position.
+    5-day option P&L losses by full repricing on simulated underlying
+    paths. S, mu and sigma may be column vectors (one row per date)
+    that broadcast against a (dates x paths) block Z.
     """
     # simulate 5-day underlying
-    days = 5
-    dt = days * (1/252)
+    dt = DAYS * (1/252)
     drift = (mu - 0.5*sigma**2) * dt
-    vol = sigma * sqrt(dt)
-    Z = np.random.randn(n_sims)
+    vol = sigma * np.sqrt(dt)
     S5 = S * np.exp(drift + vol * Z)
 
-    # reprice options
-    P0 = bs_price(S, K, r, q, T, sigma, option_type)
-    P5 = np.array([bs_price(s5, K, r, q, T-dt, sigma, option_type) for s5 in S5])
+    # reprice options, all paths in one call
+    P0 = bs_price_vec(S, K, r, q, T, sigma, call)
+    P5 = bs_price_vec(S5, K, r, q, T-dt, sigma, call)
+    return (P0 - P5) * position
 
-    losses = (P0 - P5) * position
-    var = np.percentile(losses, 100*(1-var_level))
-    return max(var, 0.0)
 
+def _simulate_losses(S, K, T, mu, sigma, position, r, q, option_type,
+                     n_sims, rng, Z, sampler="pseudo"):
+    """
+    Losses for a single date. Z, if given, is a block of standard
+    normals to reuse; otherwise n_sims are drawn with sampler.
+    """
+    if Z is None:
+        Z = normals(n_sims, rng, sampler)
+    return _reprice_losses(S, K, T, mu, sigma, position, r, q,
+                           is_call(option_type), Z)
 
-def compute_es(S, K, T, mu, sigma, position, es_level, r=0.05, q=0.0,
-               option_type='call', n_sims=10000) -> float:
+
+def compute_var(S, K, T, mu, sigma, position, var_level, r=0.05, q=0.0,
+                option_type='call', n_sims=10000, rng=None, Z=None,
+                sampler="pseudo") -> float:
     """
-    Monte Carlo ES for an option position.
+    Monte Carlo VaR for an option position.
+    rng is a Generator or seed; Z optionally supplies the standard
+    normal draws (common random numbers) and overrides n_sims and
+    sampler (see random_source.normals). A sequence of levels gives an
+    array of VaRs from the same paths.
     """
-    days = 5
-    dt = days * (1/252)
-    drift = (mu - 0.5*sigma**2) * dt
-    vol = sigma * sqrt(dt)
-    Z = np.random.randn(n_sims)
-    S5 = S * np.exp(drift + vol * Z)
+    losses = _simulate_losses(S, K, T, mu, sigma, position, r, q,
+                              option_type, n_sims, rng, Z, sampler)
+    var = np.percentile(losses, 100*np.asarray(var_level))
+    return max(var, 0.0) if np.ndim(var) == 0 else np.maximum(var, 0.0)
 
-    P0 = bs_price(S, K, r, q, T, sigma, option_type)
-    P5 = np.array([bs_price(s5, K, r, q, T-dt, sigma, option_type) for s5 in S5])
 
-    losses = (P0 - P5) * position
-    cutoff = np.percentile(losses, 100*(1-es_level))
+def compute_es(S, K, T, mu, sigma, position, es_level, r=0.05, q=0.0,
+               option_type='call', n_sims=10000, rng=None, Z=None,
+               sampler="pseudo") -> float:
+    """
+    Monte Carlo ES for an option position.
+    rng, Z and sampler as in compute_var; a sequence of levels gives
+    an array of ESs from the same paths.
+    """
+    losses = _simulate_losses(S, K, T, mu, sigma, position, r, q,
+                              option_type, n_sims, rng, Z, sampler)
+    if np.ndim(es_level) > 0:
+        _, es = tail_stats(losses[None, :], es_level, es_level)
+        return np.maximum(es[0], 0.0)
+    cutoff = np.percentile(losses, 100*es_level)
     tail = losses[losses >= cutoff]
     es = tail.mean() if len(tail)>0 else 0.0
     return max(es, 0.0)
 
+
+def _option_block(arrays, rng, n_sims, K, T, position, r, q, call,
+                  var_level, es_level, sampler="pseudo", n_rep=None, control=False,
+                  shift=None):
+    """
+    Executor worker: reprice one block of dates and return its
+    (VaR, ES) columns, plus their standard errors when n_rep is set.
+    """
+    rows, reps = len(arrays["S"]), n_rep or 1
+    Z = normals((rows, reps, n_sims // reps), rng, sampler).reshape(rows, n_sims)
+    # the option loss is monotone in Z: falling for long calls and short
+    # puts, rising otherwise; the control and the tilt follow that sign
+    direction = -np.sign(position) * np.where(call, 1.0, -1.0)
+    weights = None
+    if shift is not None:
+        Z, weights = tilt(Z, direction, shift)
+    losses = _reprice_losses(arrays["S"][:, None], K, T, arrays["mu"][:, None],
+                             arrays["sigma"][:, None], position, r, q, call, Z)
+    if n_rep is None:
+        if weights is None:
+            var, es = tail_stats(losses, var_level, es_level)
+        else:
+            var, es = weighted_tail_stats(losses, weights, var_level, es_level)
+        return np.column_stack([np.maximum(var, 0.0), np.maximum(es, 0.0)])
+
+    var, es, var_se, es_se = tail_estimates(losses, var_level, es_level, n_rep,
+                                            direction * Z if control else None, weights)
+    return np.column_stack([np.maximum(var, 0.0), np.maximum(es, 0.0), var_se, es_se])
+
+
+def compute_var_es_series(prices: pd.Series, K: float, T: float,
+                          var_level: float, es_level: float,
+                          window_days: int, position: float,
+                          r=0.05, q=0.0, option_type='call',
+                          n_sims=10000, rng=None,
+                          mem_budget: int = MEM_BUDGET,
+                          executor: Executor = SERIAL,
+                          sampler: str = "pseudo", n_rep: int = None,
+                          control: bool = False, importance=None) -> pd.DataFrame:
+    """
+    Rolling Monte Carlo VaR and ES series for an option. All dates are
+    repriced as one (dates x paths) matrix, in blocks sized to
+    mem_budget bytes and run on executor.
+    sampler, n_rep and control as in montecarlo.compute_var_es; the
+    control variate is the underlying's own normal shock, whose
+    quantile and tail mean are known in closed form. importance='auto'
+    (or a shift) tilts the shock towards the losing side of the
+    position and reweights, as in montecarlo.compute_var_es. Either
+    level may be a sequence; all are read off the same repriced paths.
+    Returns a DataFrame with columns 'var' and 'es' (and 'var_se',
+    'es_se' when n_rep or control is set; see confidence.frame).
+    """
+    n_rep = check_replicates(n_sims, n_rep, control)
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    if n_rep is not None and not single:
+        raise ValueError("standard errors (n_rep/control) need a single var_level "
+                         "and es_level")
+    shift = importance_shift(importance, var_level, es_level)
+    mu_d, sigma_d = rolling_moments(prices, window_days)
+    valid = (mu_d.notna() & sigma_d.notna()).to_numpy()
+    index = mu_d.index[valid]
+    sigma_est = sigma_d.to_numpy()[valid] * np.sqrt(252)
+    mu = mu_d.to_numpy()[valid] * 252 + 0.5*sigma_est**2
+    arrays = {"S": prices.loc[index].to_numpy(dtype=float),
+              "mu": mu, "sigma": sigma_est}
+
+    out = executor.map(_option_block, arrays, len(index), seed=get_rng(rng),
+                       chunk_size=chunk_rows(n_sims, mem_budget,
+                                             n_arrays=4 if shift is None else 7),
+                       n_sims=n_sims, K=K, T=T, position=position, r=r, q=q,
+                       call=is_call(option_type),
+                       var_level=var_level, es_level=es_level,
+                       sampler=sampler, n_rep=n_rep, control=control, shift=shift)
+    instrument.count("option_mento_carlo.simulations", len(index) * n_sims)
+    if n_rep is None:
+        return confidence.frame(out, index, var_level, es_level, single)
+    return pd.DataFrame(out, index=index, columns=["var", "es", "var_se", "es_se"])
+
+
 def compute_var_series(prices: pd.Series, K: float, T: float,
                        var_level: float, window_days: int,
                        position: float, r=0.05, q=0.0,
-                       option_type='call', n_sims=10000) -> pd.Series:
-    """Rolling Monte Carlo VaR series for an option."""
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    var_ser = pd.Series(index=prices.index, dtype=float)
-    for i in range(window_days, len(log_ret)):
-        date = log_ret.index[i]
-        window_data = log_ret.iloc[i-window_days:i]
-        sigma_est = window_data.std()*np.sqrt(252)
-        mu = window_data.mean()*(252) + 0.5*sigma_est**2
-        var_ser.loc[date] = compute_var(
-            prices.loc[date], K, T, mu, sigma_est,
-            position, var_level, r, q, option_type, n_sims
-        )
-    return var_ser.dropna()
+                       option_type='call', n_sims=10000, rng=None,
+                       executor: Executor = SERIAL, sampler: str = "pseudo",
+                       control: bool = False, importance=None) -> pd.Series:
+    """Rolling Monte Carlo VaR series for an option (dates x levels for several levels)."""
+    return confidence.select(compute_var_es_series(
+        prices, K, T, var_level, var_level, window_days, position, r, q, option_type,
+        n_sims, rng, executor=executor, sampler=sampler,
+        control=control, importance=importance), "var")
 
 
 def compute_es_series(prices: pd.Series, K: float, T: float,
                       es_level: float, window_days: int,
                       position: float, r=0.05, q=0.0,
-                      option_type='call', n_sims=10000) -> pd.Series:
-    """Rolling Monte Carlo ES series for an option."""
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    es_ser = pd.Series(index=prices.index, dtype=float)
-    for i in range(window_days, len(log_ret)):
-        date = log_ret.index[i]
-        window_data = log_ret.iloc[i-window_days:i]
-        sigma_est = window_data.std()*np.sqrt(252)
-        mu = window_data.mean()*252 + 0.5*sigma_est**2
-        es_ser.loc[date] = compute_es(
-            prices.loc[date], K, T, mu, sigma_est,
-            position, es_level, r, q,
-            option_type, n_sims
-        )
-    return es_ser.dropna()
\ No newline at end of file
+                      option_type='call', n_sims=10000, rng=None,
+                      executor: Executor = SERIAL, sampler: str = "pseudo",
+                      control: bool = False, importance=None) -> pd.Series:
+    """Rolling Monte Carlo ES series for an option (dates x levels for several levels)."""
+    return confidence.select(compute_var_es_series(
+        prices, K, T, es_level, es_level, window_days, position, r, q, option_type,
+        n_sims, rng, executor=executor, sampler=sampler,
+        control=control, importance=importance), "es")
@@ -1,20 +1,157 @@
 import numpy as np
 import pandas as pd
 from scipy.stats import norm
-from scipy.stats import norm
+from scipy.special import ndtr
 from math import exp, sqrt
 
+from montecarlo import tail_stats
+from random_source import get_rng
+import stats_cache
+import confidence
+
+def is_call(option_type):
+    """Boolean mask from 'call'/'put' (a string or an array of them)."""
+    return np.asarray(option_type) == 'call'
+
+
+def bs_price_vec(S, K, r, q, T, sigma, call=True):
+    """
+    Vectorized Black-Scholes price for European calls and puts.
+    All arguments broadcast against each other, so a whole array of
+    simulated spots (or a dates x paths matrix) is repriced in one call.
+    call is a boolean mask, True for calls (see is_call).
+    """
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S/K) + (r - q + 0.5*sigma**2)*T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    # call: S e^{-qT} N(d1) - K e^{-rT} N(d2); put is the same with
+    # every sign flipped
+    sign = np.where(call, 1.0, -1.0)
+    return sign * (S * np.exp(-q*T) * ndtr(sign*d1) - K * np.exp(-r*T) * ndtr(sign*d2))
+
+
 def bs_price(S, K, r, q, T, sigma, option_type='call'):
     """
     Black-Scholes price for European call or put.
     """
-    d1 = (np.log(S/K) + (r - q + 0.5*sigma**2)*T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    if option_type == 'call':
-        price = S * np.exp(-q*T) * norm.cdf(d1) - K * np.exp(-r*T) * norm.cdf(d2)
+    price = bs_price_vec(S, K, r, q, T, sigma, is_call(option_type))
+    return price[()] if np.ndim(price) == 0 else price
+
+
+def greeks(S, K, r, q, T, sigma, call=True) -> dict:
+    """
+    Vectorized Black-Scholes price and Greeks (broadcast like
+    bs_price_vec): delta, gamma, vega (per unit of sigma) and theta
+    (per year of calendar time, i.e. -dP/dT).
+    """
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S/K) + (r - q + 0.5*sigma**2)*T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    sign = np.where(call, 1.0, -1.0)
+    disc_q, disc_r = np.exp(-q*T), np.exp(-r*T)
+    pdf = norm.pdf(d1)
+    return {
+        "price": sign * (S * disc_q * ndtr(sign*d1) - K * disc_r * ndtr(sign*d2)),
+        "delta": sign * disc_q * ndtr(sign*d1),
+        "gamma": disc_q * pdf / (S * sigma * sqrt_T),
+        "vega":  S * disc_q * pdf * sqrt_T,
+        "theta": -S * disc_q * pdf * sigma / (2*sqrt_T)
+                 - sign * (r * K * disc_r * ndtr(sign*d2) - q * S * disc_q * ndtr(sign*d1)),
+    }
+
+
+def delta_gamma_coefficients(S, K, T, mu, sigma, position, r=0.05, q=0.0,
+                             option_type='call', days=5, vol_shock=0.0):
+    """
+    Quadratic P&L of an option book over days trading days,
+        dP ~ c0 + c1 Z + c2 Z^2 + v W,
+    with Z the underlying's standard normal shock and W an independent
+    one for the volatility. mu and sigma are annual; the spot move
+    S (exp((mu - sigma^2/2) dt + sigma sqrt(dt) Z) - 1), dt = days/252,
+    is expanded to second order in Z, and the option by
+    theta dt + delta dS + gamma dS^2 / 2 (+ vega * vol_shock * W, the
+    delta-gamma-vega form, vol_shock being the horizon std of sigma).
+    All arguments broadcast; the last axis indexes the positions of
+    the book and is summed over.
+    Returns (c0, c1, c2, v).
+    """
+    dt = days / 252
+    g = greeks(S, K, r, q, T, sigma, is_call(option_type))
+    m = (mu - 0.5*sigma**2) * dt
+    s = sigma * np.sqrt(dt)
+    growth = S * np.exp(m)
+    a0, a1, a2 = growth - S, growth * s, 0.5 * growth * s**2
+
+    pos = np.asarray(position, dtype=float)
+    c0 = pos * (g["theta"]*dt + g["delta"]*a0 + 0.5*g["gamma"]*a0**2)
+    c1 = pos * (g["delta"]*a1 + g["gamma"]*a0*a1)
+    c2 = pos * (g["delta"]*a2 + 0.5*g["gamma"]*(a1**2 + 2*a0*a2))
+    v = pos * g["vega"] * vol_shock
+    return tuple(np.atleast_1d(c).sum(axis=-1) for c in (c0, c1, c2, v))
+
+
+def _cornish_fisher(c0, c1, c2, v, var_level, es_level):
+    """
+    VaR and ES of the loss -(c0 + c1 Z + c2 Z^2 + v W) from its first
+    four cumulants by the Cornish-Fisher expansion. ES is the tail
+    average of the expansion, which has a closed form because the
+    expansion is a polynomial in the normal quantile.
+    """
+    k1 = -(c0 + c2)
+    k2 = c1**2 + 2*c2**2 + v**2
+    k3 = -(6*c1**2*c2 + 8*c2**3)
+    k4 = 48*c1**2*c2**2 + 48*c2**4
+    sd = np.sqrt(k2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        skew = np.where(k2 > 0, k3 / sd**3, 0.0)
+        kurt = np.where(k2 > 0, k4 / k2**2, 0.0)
+
+    z = norm.ppf(var_level)
+    w = (z + (z**2 - 1)*skew/6 + (z**3 - 3*z)*kurt/24
+         - (2*z**3 - 5*z)*skew**2/36)
+
+    # E[w(Z) | Z > z_a] using the normal tail integrals of z^k phi(z)
+    za = norm.ppf(es_level)
+    tail = norm.pdf(za) / (1 - es_level)
+    w_es = tail * (1 + skew*za/6 + kurt*(za**2 - 1)/24 - skew**2*(2*za**2 - 1)/36)
+    return k1 + sd*w, k1 + sd*w_es
+
+
+def delta_gamma_var_es(S, K, T, mu, sigma, position, var_level, es_level,
+                       r=0.05, q=0.0, option_type='call', days=5, vol_shock=0.0,
+                       method="cornish_fisher", n_sims=10000, rng=None):
+    """
+    VaR and ES of an option book (options on one underlying, or one
+    option per row when S, mu, sigma are column vectors of dates) from
+    the delta-gamma(-vega) quadratic P&L of delta_gamma_coefficients.
+    method='cornish_fisher' is closed form; method='mc' simulates the
+    quadratic P&L on n_sims draws from rng, with no repricing.
+    Either level may be a sequence, adding a trailing levels axis.
+    Returns (var, es), floored at zero like compute_var.
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    coef = delta_gamma_coefficients(S, K, T, mu, sigma, position, r, q,
+                                    option_type, days, vol_shock)
+    scalar = np.ndim(coef[0]) == 0
+    c0, c1, c2, v = (np.atleast_1d(c) for c in coef)
+    if method == "cornish_fisher":
+        if single:
+            var, es = _cornish_fisher(c0, c1, c2, v, var_level, es_level)
+        else:
+            var, es = _cornish_fisher(c0[:, None], c1[:, None], c2[:, None], v[:, None],
+                                      var_level, es_level)
+    elif method == "mc":
+        rng = get_rng(rng)
+        Z = rng.standard_normal(n_sims)
+        W = rng.standard_normal(n_sims) if np.any(v) else 0.0
+        losses = -(c0[:, None] + c1[:, None]*Z + c2[:, None]*Z**2 + v[:, None]*W)
+        var, es = tail_stats(losses, var_level, es_level)
     else:
-        price = K * np.exp(-r*T) * norm.cdf(-d2) - S * np.exp(-q*T) * norm.cdf(-d1)
-    return price
+        raise ValueError(f"method must be 'cornish_fisher' or 'mc', got {method!r}")
+    var, es = np.maximum(var, 0.0), np.maximum(es, 0.0)
+    if scalar:
+        return (float(var[0]), float(es[0])) if single else (var[0], es[0])
+    return var, es
 
 
 def compute_var(S, K, T, mu, sigma, position, var_level, r=0.05, q=0.0, option_type='call') -> float:
@@ -26,7 +163,7 @@ def compute_var(S, K, T, mu, sigma, position, var_level, r=0.05, q=0.0, option_t
       mu   : drift of underlying
       sigma: volatility of underlying
       position: number of option contracts (positive for long)
-      var_level: VaR confidence (e.g. 0.99)
+      var_level: VaR confidence (e.g. 0.99, or a sequence of levels)
       r    : risk-free rate (default 0.05)
       q    : dividend yield (default 0)
       option_type: 'call' or 'put'
@@ -47,15 +184,16 @@ def compute_var(S, K, T, mu, sigma, position, var_level, r=0.05, q=0.0, option_t
     mu_P = delta * S * (exp(drift)-1)
     sigma_P = abs(delta * S * (exp(drift) * sqrt(np.exp(vol5**2)-1)))  # approx
 
-    z = norm.ppf(1 - var_level)
-    var = -(mu_P + z * sigma_P) * position
-    return max(var, 0.0)
+    z = norm.ppf(1 - np.asarray(var_level))
+    # the loss is -position * dP, so short positions lose in the upper tail
+    var = -mu_P * position - z * sigma_P * abs(position)
+    return max(var, 0.0) if np.ndim(var) == 0 else np.maximum(var, 0.0)
 
 
 def compute_es(S, K, T, mu, sigma, position, es_level, r=0.05, q=0.0, option_type='call') -> float:
     """
     Parametric ES for an option position via normal tail formula.
-    Returns ES (positive number).
+    Returns ES (positive number; an array for a sequence of levels).
     """
     # compute delta same as above
     d1 = (np.log(S/K) + (r - q + 0.5*sigma**2)*T) / (sigma * np.sqrt(T))
@@ -69,49 +207,113 @@ def compute_es(S, K, T, mu, sigma, position, es_level, r=0.05, q=0.0, option_typ
     mu_P = delta * S * (exp(drift)-1)
     sigma_P = abs(delta * S * (exp(drift) * sqrt(np.exp(vol5**2)-1)))
 
-    alpha = 1 - es_level
+    alpha = 1 - np.asarray(es_level)
     z = norm.ppf(alpha)
     phi = norm.pdf(z)
-    es = -(mu_P + sigma_P * phi/alpha) * position
-    return max(es, 0.0)
+    es = -mu_P * position + sigma_P * phi/alpha * abs(position)
+    return max(es, 0.0) if np.ndim(es) == 0 else np.maximum(es, 0.0)
+
+def _window_estimates(prices: pd.Series, window_days: int):
+    """
+    Annualized (mu, sigma) on each date from the window_days-1
+    log-returns ending two days before it (lag=2), i.e. the window_days
+    prices up to two days before the date. Returned as Series on the
+    log-return index.
+    """
+    mu_d, sigma_d = stats_cache.rolling_moments(prices, window_days - 1, lag=2)
+    sigma_est = sigma_d / np.sqrt(1/252)
+    mu = mu_d / (1/252) + 0.5 * sigma_est**2
+    return mu.iloc[window_days:], sigma_est.iloc[window_days:]
+
+
+def _delta_normal(S, K, T, mu, sigma, position, var_level, es_level, r, q, call, days):
+    """
+    Delta-normal VaR and ES arrays over days trading days, with annual
+    mu and sigma (dt = days/252); every argument broadcasts. The loss
+    is -position * delta * dS, so the sign of the position picks the
+    tail.
+    """
+    dt = days / 252
+    delta = greeks(S, K, r, q, T, sigma, call)["delta"]
+    drift = (mu - 0.5*sigma**2) * dt
+    mu_P = delta * S * (np.exp(drift) - 1)
+    sigma_P = np.abs(delta * S * np.exp(drift) * np.sqrt(np.exp(sigma**2 * dt) - 1))
+
+    z = norm.ppf(var_level)
+    alpha = 1 - es_level
+    tail = norm.pdf(norm.ppf(alpha)) / alpha
+    var = -position * mu_P + abs(position) * z * sigma_P
+    es = -position * mu_P + abs(position) * tail * sigma_P
+    return np.maximum(var, 0.0), np.maximum(es, 0.0)
+
+
+def compute_var_es_series(prices: pd.Series, K: float, T: float,
+                          var_level: float, es_level: float,
+                          window_days: int, position: float,
+                          r=0.05, q=0.0, option_type='call',
+                          method: str = "delta_normal", decay: bool = True,
+                          days: int = 5, vol_shock: float = 0.0) -> pd.DataFrame:
+    """
+    Rolling parametric VaR and ES series for an option, evaluated for
+    all dates at once. The annualized mu/sigma come from one rolling
+    pass (_window_estimates) and the Greeks are arrays over the dates.
+    T is the time to maturity on the first date; with decay=True it
+    shrinks by 1/252 per date and dates on or after expiry are dropped.
+    method='delta_normal' uses the delta-only normal P&L,
+    method='delta_gamma' the Cornish-Fisher delta-gamma(-vega) P&L of
+    delta_gamma_var_es. Either level may be a sequence.
+    Returns a DataFrame with columns 'var' and 'es' (see confidence.frame).
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    mu, sigma = _window_estimates(prices, window_days)
+    valid = (mu.notna() & sigma.notna()).to_numpy()
+    index = mu.index[valid]
+    mu, sigma = mu.to_numpy()[valid], sigma.to_numpy()[valid]
+    S = prices.loc[index].to_numpy(dtype=float)
+
+    # 1) time to maturity on each date
+    T_t = T - np.arange(len(index)) / 252 if decay else np.full(len(index), float(T))
+    live = T_t > 0
+    index, S, mu, sigma, T_t = index[live], S[live], mu[live], sigma[live], T_t[live]
+
+    # 2) VaR/ES for every date (and level) as arrays
+    if method == "delta_normal":
+        if not single:
+            S, mu, sigma, T_t = S[:, None], mu[:, None], sigma[:, None], T_t[:, None]
+        var, es = _delta_normal(S, K, T_t, mu, sigma, position, var_level, es_level,
+                                r, q, is_call(option_type), days)
+    elif method == "delta_gamma":
+        var, es = delta_gamma_var_es(S[:, None], K, T_t[:, None], mu[:, None],
+                                     sigma[:, None], position, var_level, es_level,
+                                     r, q, option_type, days, vol_shock)
+    else:
+        raise ValueError(f"method must be 'delta_normal' or 'delta_gamma', got {method!r}")
+    return confidence.frame(np.column_stack([var, es]), index, var_level, es_level, single)
+
 
 def compute_var_series(prices: pd.Series, K: float, T: float,
                        var_level: float, window_days: int,
                        position: float, r=0.05, q=0.0,
-                       option_type='call') -> pd.Series:
+                       option_type='call', method: str = "delta_normal",
+                       decay: bool = True) -> pd.Series:
     """
-    Rolling 5-day parametric VaR series for an option.
+    Rolling 5-day parametric VaR series for an option (dates x levels
+    for a sequence of levels).
     """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    var_ser = pd.Series(index=prices.index, dtype=float)
-    for i in range(window_days, len(log_ret)):
-        date = log_ret.index[i]
-        window_prices = prices.iloc[i-window_days:i]
-        sigma_est = np.log(window_prices / window_prices.shift(1)).dropna().std() / np.sqrt(1/252)
-        mu = np.log(window_prices / window_prices.shift(1)).dropna().mean() / (1/252) + 0.5* sigma_est**2
-        var_ser.loc[date] = compute_var(
-            prices.loc[date], K, T, mu, sigma_est,
-            position, var_level, r, q, option_type
-        )
-    return var_ser.dropna()
+    return confidence.select(compute_var_es_series(
+        prices, K, T, var_level, var_level, window_days, position, r, q, option_type,
+        method, decay), "var")
 
 
 def compute_es_series(prices: pd.Series, K: float, T: float,
                       es_level: float, window_days: int,
                       position: float, r=0.05, q=0.0,
-                      option_type='call') -> pd.Series:
-    """
-    Rolling 5-day parametric ES series for an option.
-    """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    es_ser = pd.Series(index=prices.index, dtype=float)
-    for i in range(window_days, len(log_ret)):
-        date = log_ret.index[i]
-        window_prices = prices.iloc[i-window_days:i]
-        sigma_est = np.log(window_prices / window_prices.shift(1)).dropna().std() / np.sqrt(1/252)
-        mu = np.log(window_prices / window_prices.shift(1)).dropna().mean() / (1/252) + 0.5* sigma_est**2
-        es_ser.loc[date] = compute_es(
-            prices.loc[date], K, T, mu, sigma_est,
-            position, es_level, r, q, option_type
-        )
-    return es_ser.dropna()
\ No newline at end of file
+                      option_type='call', method: str = "delta_normal",
+                      decay: bool = True) -> pd.Series:
+    """
+    Rolling 5-day parametric ES series for an option (dates x levels
+    for a sequence of levels).
+    """
+    return confidence.select(compute_var_es_series(
+        prices, K, T, es_level, es_level, window_days, position, r, q, option_type,
+        method, decay), "es")
@@ -0,0 +1,179 @@
+# option_portfolio.py
+
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import CubicSpline
+
+from option_parametric import bs_price_vec, is_call
+from montecarlo import MEM_BUDGET, chunk_rows, tail_stats
+from random_source import get_rng
+import confidence
+
+METHODS = ("exact", "grid")
+
+
+def _frame(rows, columns) -> pd.DataFrame:
+    """Positions as a DataFrame from a DataFrame, list of dicts or list of tuples."""
+    if rows is None:
+        return pd.DataFrame(columns=columns)
+    if isinstance(rows, pd.DataFrame):
+        return rows
+    rows = list(rows)
+    if not rows or not isinstance(rows[0], dict):
+        return pd.DataFrame(rows, columns=columns)
+    return pd.DataFrame(rows)
+
+
+def simulate_underlyings(underlyings: pd.DataFrame, n_sims: int, horizon: float = 5/252,
+                         rng=None, corr=None, Z=None) -> np.ndarray:
+    """
+    GBM spots of every underlying at the horizon, one row per
+    underlying (in underlyings' order) and n_sims paths, with
+    S_h = S exp((mu - sigma^2/2) h + sigma sqrt(h) Z). mu and sigma are
+    in the units of horizon (annual for the default 5/252). corr, if
+    given, correlates the shocks through its Cholesky factor. Z, if
+    given, supplies the (underlyings x n_sims) independent shocks.
+    """
+    S = underlyings["S"].to_numpy(dtype=float)[:, None]
+    mu = underlyings["mu"].to_numpy(dtype=float)[:, None]
+    sigma = underlyings["sigma"].to_numpy(dtype=float)[:, None]
+    if Z is None:
+        Z = get_rng(rng).standard_normal((len(S), n_sims))
+    if corr is not None:
+        Z = np.linalg.cholesky(np.asarray(corr, dtype=float)) @ Z
+    return S * np.exp((mu - 0.5*sigma**2)*horizon + sigma*np.sqrt(horizon)*Z)
+
+
+def _option_value(spots, opts, T_h, mem_budget=MEM_BUDGET):
+    """
+    Position-weighted value of every option in opts at each spot,
+    summed over the options, priced with T_h years left. Options are
+    repriced in chunks so at most mem_budget bytes of prices are alive.
+    """
+    spots = np.asarray(spots, dtype=float)
+    value = np.zeros(spots.shape)
+    K = opts["K"].to_numpy(dtype=float)[:, None]
+    r = opts["r"].to_numpy(dtype=float)[:, None]
+    q = opts["q"].to_numpy(dtype=float)[:, None]
+    sigma = opts["sigma"].to_numpy(dtype=float)[:, None]
+    call = is_call(opts["option_type"].to_numpy())[:, None]
+    pos = opts["position"].to_numpy(dtype=float)
+    # at or past expiry BS tends to the payoff, so a tiny T stands in for 0
+    T = np.maximum(np.asarray(T_h, dtype=float), 1e-10)[:, None]
+    step = chunk_rows(spots.size, mem_budget, n_arrays=4)
+    for i in range(0, len(pos), step):
+        c = slice(i, i + step)
+        prices = bs_price_vec(spots[None, :], K[c], r[c], q[c], T[c], sigma[c], call[c])
+        value += pos[c] @ prices
+    return value
+
+
+def _grid_value(spots, opts, T_h, tol, n_grid=33, max_grid=4097):
+    """
+    Option value at each spot from a cubic spline over a log-spot grid
+    spanning the simulated spots. The book is linear in the option
+    prices, so one spline of the summed value per underlying replaces
+    a spline per strike/expiry. The grid is doubled until the spline is
+    within tol at every grid midpoint (tol is absolute, in dollars);
+    if that is not reached by max_grid points, the spots are repriced
+    exactly instead.
+    """
+    lo, hi = np.log(spots.min()), np.log(spots.max())
+    if hi - lo < 1e-12:
+        return _option_value(spots, opts, T_h)
+    x = np.linspace(lo, hi, n_grid)
+    v = _option_value(np.exp(x), opts, T_h)
+    while True:
+        mid = 0.5 * (x[1:] + x[:-1])
+        v_mid = _option_value(np.exp(mid), opts, T_h)
+        spline = CubicSpline(x, v)
+        if np.max(np.abs(spline(mid) - v_mid)) <= tol:
+            return spline(np.log(spots))
+        if 2 * len(x) - 1 > max_grid:
+            warnings.warn(f"spot grid did not reach tol={tol} with {len(x)} points; "
+                          "repricing exactly")
+            return _option_value(spots, opts, T_h)
+        # interleave the midpoints, which are already priced
+        x = np.insert(x, np.arange(1, len(x)), mid)
+        v = np.insert(v, np.arange(1, len(v)), v_mid)
+
+
+def book_losses(underlyings, stocks=None, options=None, n_sims: int = 10000,
+                horizon: float = 5/252, decay: float = None, rng=None, corr=None,
+                Z=None, method: str = "exact", tol: float = 0.01,
+                min_expiry: float = 2/252,
+                mem_budget: int = MEM_BUDGET) -> pd.DataFrame:
+    """
+    Horizon P&L losses of a book of stocks and European options on the
+    same simulated paths, one column per underlying plus 'total'.
+
+    underlyings: DataFrame indexed by code with columns S, mu, sigma.
+    stocks:      code, position (shares).
+    options:     code (underlying), position, K, T, r, q, sigma
+                 (pricing vol; the underlying's sigma when missing or
+                 NaN) and option_type ('call'/'put').
+    Each underlying is simulated once (see simulate_underlyings) and
+    all of its options are repriced on those spots, after decay years
+    (default horizon), either exactly with the vectorized pricer
+    (method='exact') or from a cubic spot grid accurate to tol dollars
+    (method='grid'; options with less than min_expiry years left after
+    the horizon are still repriced exactly).
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}, got {method!r}")
+    stocks = _frame(stocks, ["code", "position"])
+    options = _frame(options, ["code", "position", "K", "T", "r", "q", "sigma", "option_type"])
+    unknown = (set(stocks["code"]) | set(options["code"])) - set(underlyings.index)
+    if unknown:
+        raise KeyError(f"Unknown underlying code(s): {', '.join(sorted(map(str, unknown)))}")
+    decay = horizon if decay is None else decay
+    if "sigma" not in options:
+        options = options.assign(sigma=np.nan)
+    options = options.assign(
+        sigma=options["sigma"].fillna(options["code"].map(underlyings["sigma"])))
+
+    spots = simulate_underlyings(underlyings, n_sims, horizon, rng, corr, Z)
+    losses = {}
+    for i, (code, S) in enumerate(underlyings["S"].items()):
+        S_h = spots[i]
+        shares = stocks.loc[stocks["code"] == code, "position"].astype(float).sum()
+        pnl = shares * (S_h - S)
+        opts = options[options["code"] == code]
+        if len(opts):
+            T = opts["T"].to_numpy(dtype=float)
+            v0 = _option_value(np.array([float(S)]), opts, T)[0]
+            T_h = T - decay
+            if method == "exact":
+                v_h = _option_value(S_h, opts, T_h, mem_budget)
+            else:
+                # options at or near expiry have kinked prices that no
+                # spline fits well; those few are repriced exactly
+                smooth = T_h >= min_expiry
+                v_h = _option_value(S_h, opts[~smooth], T_h[~smooth], mem_budget)
+                if smooth.any():
+                    v_h += _grid_value(S_h, opts[smooth], T_h[smooth], tol)
+            pnl = pnl + (v_h - v0)
+        losses[code] = -pnl
+    out = pd.DataFrame(losses, columns=list(underlyings.index))
+    out["total"] = out.sum(axis=1)
+    return out
+
+
+def compute_var_es(underlyings, var_level: float, es_level: float,
+                   stocks=None, options=None, n_sims: int = 10000, **kwargs) -> pd.DataFrame:
+    """
+    Horizon VaR and ES of the whole book (row 'total') and of each
+    underlying's positions, all read off the same paths, so the total
+    reflects netting and diversification rather than a sum of
+    per-position numbers. kwargs as in book_losses. Either level may
+    be a sequence, read off the same paths.
+    Returns a DataFrame indexed by underlying code and 'total' with
+    columns 'var' and 'es' (see confidence.frame).
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    losses = book_losses(underlyings, stocks, options, n_sims, **kwargs)
+    var, es = tail_stats(losses.to_numpy().T, var_level, es_level)
+    return confidence.frame(np.column_stack([var, es]), losses.columns,
+                            var_level, es_level, single)
@@ -4,57 +4,76 @@ import pandas as pd
 import numpy as np
 from scipy.stats import norm
 
+import stats_cache
+import confidence
+
+WINDOW = 5 * 252
+
+
+def rolling_moments(prices: pd.Series, window: int = WINDOW):
+    """
+    Mean and std of daily log-returns over the `window` returns
+    preceding each date, computed in one O(n) rolling pass.
+    Returns (mu, sigma) as Series on the log-return index.
+    """
+    # shifted by one so the estimate on date t only uses returns up to t-1;
+    # shared with every other model through the stats cache
+    return stats_cache.rolling_moments(prices, window, lag=1)
+
+
+def gbm_var_es(S, mu, sigma, var_level: float, es_level: float):
+    """
+    5-day GBM VaR and closed-form ES in dollars for spot S and daily
+    log-return mean/std mu, sigma (scalars or arrays that broadcast).
+    """
+    # VaR quantile in log-return space
+    z = norm.ppf(1 - var_level)
+    q = 5 * mu + z * np.sqrt(5) * sigma
+    var = np.maximum(-S * (np.exp(q) - 1), 0.0)
+
+    # conditional moment: E[e^{R_5} | R_5 <= q]
+    # = exp(mu5 + 0.5*sig5^2) * Phi(z_alpha - sig5) / Phi(z_alpha)
+    z_alpha = norm.ppf(1 - es_level)
+    mu5 = 5 * mu
+    sig5 = np.sqrt(5) * sigma
+    phi_tail = norm.cdf(z_alpha)
+    cond_moment = np.exp(mu5 + 0.5 * sig5**2) * norm.cdf(z_alpha - sig5) / phi_tail
+    es = S * (1 - cond_moment)
+    return var, es
+
+
+def compute_var_es(prices: pd.Series, var_level: float, es_level: float) -> pd.DataFrame:
+    """
+    5-day parametric VaR and closed-form ES from a single pass of
+    rolling moments over a 5-year window (≈1260 trading days).
+    Either level may be a sequence, evaluated on the same moments.
+    Returns a DataFrame with columns 'var' and 'es' (see confidence.frame).
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    mu, sigma = rolling_moments(prices, WINDOW)
+    valid = mu.notna() & sigma.notna()
+    index = valid[valid].index
+    S, mu, sigma = (x.to_numpy() for x in (prices.loc[index], mu[valid], sigma[valid]))
+    if not single:
+        # one column per level
+        S, mu, sigma = S[:, None], mu[:, None], sigma[:, None]
+    var, es = gbm_var_es(S, mu, sigma, var_level, es_level)
+    return confidence.frame(np.column_stack([var, es]), index, var_level, es_level, single)
+
+
 def compute_var(prices: pd.Series, var_level: float) -> pd.Series:
     """
     5-day VaR at var_level using GBM parameters estimated
     over a 5‐year rolling window (≈1260 trading days).
+    A sequence of levels gives a dates x levels DataFrame.
     """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    window = 5 * 252
-    z = norm.ppf(1 - var_level)
-
-    var = pd.Series(index=prices.index, dtype=float)
-    for i in range(window, len(log_ret)):
-        date = log_ret.index[i]
-        data = log_ret.iloc[i - window : i]
-        mu = data.mean()
-        sigma = data.std()
-        q = 5 * mu + z * np.sqrt(5) * sigma
-        S = prices.loc[date]
-        loss = -S * (np.exp(q) - 1)
-        var.loc[date] = max(loss, 0.0)
-    return var.dropna()
+    return confidence.select(compute_var_es(prices, var_level, var_level), "var")
 
 
 def compute_es(prices: pd.Series, es_level: float) -> pd.Series:
     """
     5-day parametric ES at es_level using GBM parameters estimated
     over a 5‐year rolling window (≈1260 days), closed-form.
+    A sequence of levels gives a dates x levels DataFrame.
     """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    window = 5 * 252
-    alpha = 1 - es_level
-    z_alpha = norm.ppf(alpha)
-
-    es = pd.Series(index=prices.index, dtype=float)
-    for i in range(window, len(log_ret)):
-        date = log_ret.index[i]
-        data  = log_ret.iloc[i - window : i]
-        mu    = data.mean()
-        sigma = data.std()
-        mu5   = 5 * mu
-        sig5  = np.sqrt(5) * sigma
-
-        # VaR quantile in log-return space
-        # q = mu5 + sig5 * z_alpha
-
-        # conditional moment: E[e^{R_5} | R_5 <= q]
-        # = exp(mu5 + 0.5*sig5^2) * Phi(z_alpha - sig5) / Phi(z_alpha)
-        phi_tail = norm.cdf(z_alpha)
-        cond_moment = np.exp(mu5 + 0.5 * sig5**2) * norm.cdf(z_alpha - sig5) / phi_tail
-
-        S = prices.loc[date]
-        # dollar ES = E[ loss ] = S * (1 - E[e^{R_5} | tail])
-        es.loc[date] = S * (1 - cond_moment)
-
-    return es.dropna()
+    return confidence.select(compute_var_es(prices, es_level, es_level), "es")
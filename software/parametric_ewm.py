@@ -1,54 +1,83 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
+
+from random_source import get_rng
+from montecarlo import chunk_rows, tail_stats
+from executor import Executor, SERIAL
+from parametric5yr import gbm_var_es
+import stats_cache
+import confidence
+import instrument
+
+def ewm_moments(prices: pd.Series, lambda_: float):
+    """
+    Exponentially weighted mean and std of daily log-returns (decay
+    lambda_), as numpy arrays restricted to dates where both exist,
+    plus that date index.
+    """
+    mu_ewm, sigma_ewm = stats_cache.ewm_moments(prices, lambda_)
+    valid = (mu_ewm.notna() & sigma_ewm.notna()).to_numpy()
+    return mu_ewm.index[valid], mu_ewm.to_numpy()[valid], sigma_ewm.to_numpy()[valid]
+
+def compute_var_es(prices: pd.Series, var_level: float, es_level: float,
+                   lambda_: float) -> pd.DataFrame:
+    """
+    5-day VaR and closed-form (lognormal tail moment) ES using GBM
+    parameters estimated by exponential weighting (decay lambda_),
+    in one pass over the return array. Either level may be a sequence.
+    Returns a DataFrame with columns 'var' and 'es' (see confidence.frame).
+    """
+    var_level, es_level, single = confidence.levels(var_level, es_level)
+    index, mu, sigma = ewm_moments(prices, lambda_)
+    S = prices.loc[index].to_numpy(dtype=float)
+    if not single:
+        S, mu, sigma = S[:, None], mu[:, None], sigma[:, None]
+    var, es = gbm_var_es(S, mu, sigma, var_level, es_level)
+    return confidence.frame(np.column_stack([var, es]), index, var_level, es_level, single)
 
 def compute_var(prices: pd.Series, var_level: float, lambda_: float) -> pd.Series:
     """
     5-day VaR at var_level using GBM parameters estimated
-    by exponential weighting (decay lambda_).
+    by exponential weighting (decay lambda_). A sequence of levels
+    gives a dates x levels DataFrame.
     """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    alpha = 1 - lambda_
-    mu_ewm = log_ret.ewm(alpha=alpha, adjust=False).mean()
-    var_ewm = log_ret.ewm(alpha=alpha, adjust=False).var()
-    sigma_ewm = np.sqrt(var_ewm)
-    z = norm.ppf(1 - var_level)
+    return confidence.select(compute_var_es(prices, var_level, var_level, lambda_), "var")
 
-    var = pd.Series(index=prices.index, dtype=float)
-    for date in log_ret.index:
-        mu = mu_ewm.loc[date]
-        sigma = sigma_ewm.loc[date]
-        if pd.isna(mu) or pd.isna(sigma):
-            continue
-        q = 5 * mu + z * np.sqrt(5) * sigma
-        S = prices.loc[date]
-        loss = -S * (np.exp(q) - 1)
-        var.loc[date] = max(loss, 0.0)
-    return var.dropna()
+def _es_block(arrays, rng, n_sims, es_level):
+    """
+    Executor worker: Monte Carlo ES for one block of dates.
+    """
+    sims = rng.standard_normal((len(arrays["S"]), n_sims))
+    sims *= arrays["std5"][:, None]
+    sims += arrays["mean5"][:, None]
+    losses = -arrays["S"][:, None] * (np.exp(sims) - 1)
+    _, es = tail_stats(losses, es_level, es_level)
+    return es
 
-def compute_es(prices: pd.Series, es_level: float, lambda_: float, n_sims: int = 10000) -> pd.Series:
+def compute_es(prices: pd.Series, es_level: float, lambda_: float, n_sims: int = 10000,
+               rng=None, executor: Executor = SERIAL,
+               method: str = "closed_form") -> pd.Series:
     """
     5-day ES at es_level using GBM parameters estimated
-    by exponential weighting (decay lambda_). Uses Monte Carlo.
-    """
-    log_ret = np.log(prices / prices.shift(1)).dropna()
-    alpha = 1 - lambda_
-    mu_ewm = log_ret.ewm(alpha=alpha, adjust=False).mean()
-    var_ewm = log_ret.ewm(alpha=alpha, adjust=False).var()
-    sigma_ewm = np.sqrt(var_ewm)
-    tail = 1 - es_level
+    by exponential weighting (decay lambda_).
+    method='closed_form' uses the lognormal tail moment (as in
+    parametric5yr); method='mc' simulates n_sims paths per date with
+    draws from rng, with blocks of dates run on executor. A sequence of
+    levels gives a dates x levels DataFrame (from one set of paths).
+    """
+    if method == "closed_form":
+        return confidence.select(compute_var_es(prices, es_level, es_level, lambda_), "es")
+    if method != "mc":
+        raise ValueError(f"method must be 'closed_form' or 'mc', got {method!r}")
 
-    es = pd.Series(index=prices.index, dtype=float)
-    for date in log_ret.index:
-        mu = mu_ewm.loc[date]
-        sigma = sigma_ewm.loc[date]
-        if pd.isna(mu) or pd.isna(sigma):
-            continue
-        mean5 = 5 * mu
-        std5 = np.sqrt(5) * sigma
-        sims = np.random.normal(mean5, std5, size=n_sims)
-        S = prices.loc[date]
-        losses = -S * (np.exp(sims) - 1)
-        cutoff = np.percentile(losses, 100 * tail)
-        es.loc[date] = losses[losses >= cutoff].mean()
-    return es.dropna()
+    index, mu, sigma = ewm_moments(prices, lambda_)
+    arrays = {
+        "mean5": 5 * mu,
+        "std5":  np.sqrt(5) * sigma,
+        "S":     prices.loc[index].to_numpy(dtype=float),
+    }
+    es = executor.map(_es_block, arrays, len(index), seed=get_rng(rng),
+                      chunk_size=chunk_rows(n_sims),
+                      n_sims=n_sims, es_level=es_level)
+    instrument.count("parametric_ewm.simulations", len(index) * n_sims)
+    return confidence.series(es, index, es_level)
@@ -0,0 +1,164 @@
+# portfolio.py
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from montecarlo import MEM_BUDGET, chunk_rows, tail_stats
+from random_source import get_rng
+
+
+def delta_normal_var_es(mu, sigma, var_level: float, es_level: float):
+    """
+    5-day delta-normal VaR and ES in dollars of a book whose daily
+    dollar P&L has mean mu and std sigma (arrays that broadcast): the
+    5-day P&L is normal with mean 5 mu and std sqrt(5) sigma.
+    """
+    mu5 = 5 * mu
+    sig5 = np.sqrt(5) * sigma
+
+    z = norm.ppf(var_level)
+    var = np.maximum(-mu5 + z * sig5, 0.0)
+
+    alpha = 1 - es_level
+    es = -mu5 + norm.pdf(norm.ppf(alpha)) / alpha * sig5
+    return var, es
+
+
+def jittered_cholesky(cov: np.ndarray) -> np.ndarray:
+    """
+    Lower Cholesky factor of one covariance matrix or a stack of them.
+    Semi-definite ones (e.g. flat prices) get a tiny diagonal jitter.
+    """
+    n = cov.shape[-1]
+    scale = np.trace(cov, axis1=-2, axis2=-1) / n
+    jitter = 1e-12 * np.where(scale > 0, scale, 1.0)
+    return np.linalg.cholesky(cov + jitter[..., None, None] * np.eye(n))
+
+
+class PortfolioEngine:
+    """
+    Multi-asset GBM engine over a price panel (dates as index, security
+    codes as columns). Per-asset daily log-returns, rolling mean vectors
+    and rolling covariance matrices are computed once per universe, so
+    VaR/ES for any vector of share positions costs a few matrix-vector
+    products over the cached moments instead of a fresh rolling pass.
+
+    Memory for the cached covariances is dates x assets^2 floats; the
+    rolling pass that builds them works in blocks of dates bounded by
+    mem_budget.
+    """
+
+    def __init__(self, prices: pd.DataFrame, window_days: int = 5 * 252,
+                 mem_budget: int = MEM_BUDGET):
+        self.prices = prices.dropna()
+        self.window_days = window_days
+        self.codes = list(self.prices.columns)
+
+        # 1) per-asset log returns, demeaned over the full sample so the
+        #    running sums below do not lose precision to cancellation
+        X = np.log(self.prices / self.prices.shift(1)).dropna()
+        R = X.to_numpy()
+        center = R.mean(axis=0)
+        Rc = R - center
+
+        # 2) window sums of returns from prefix sums (returns t-window ..
+        #    t-1 for date t)
+        w = window_days
+        n = Rc.shape[1]
+        S1 = np.concatenate([np.zeros((1, n)), np.cumsum(Rc, axis=0)])
+        s1 = S1[w:-1] - S1[:-w - 1]
+        self.index = X.index[w:]
+        self.mu = s1 / w + center
+
+        # 3) window sums of cross-products, one block of dates at a time:
+        #    the first window of a block is summed directly and the rest
+        #    add the return entering and drop the one leaving, so only the
+        #    output and one block of n x n updates are ever allocated
+        self.cov = np.empty((len(self.index), n, n))
+        rows = chunk_rows(n * n, mem_budget, n_arrays=2)
+        for a in range(0, len(self.index), rows):
+            b = min(a + rows, len(self.index))
+            s2 = self.cov[a:b]
+            s2[0] = Rc[a:a + w].T @ Rc[a:a + w]
+            if b - a > 1:
+                new, old = Rc[a + w:b + w - 1], Rc[a:b - 1]
+                np.cumsum(new[:, :, None] * new[:, None, :] - old[:, :, None] * old[:, None, :],
+                          axis=0, out=s2[1:])
+                s2[1:] += s2[0]
+            s2 -= s1[a:b, :, None] * s1[a:b, None, :] / w
+            s2 /= w - 1
+        self._chol = None
+
+    def exposures(self, positions) -> np.ndarray:
+        """
+        Dollar exposure per asset on each evaluation date for share
+        positions given as a dict/Series keyed by code or an array
+        ordered like self.codes.
+        """
+        if isinstance(positions, (dict, pd.Series)):
+            positions = pd.Series(positions, dtype=float)
+            unknown = positions.index.difference(self.codes)
+            if len(unknown):
+                raise KeyError(f"Unknown stock code(s): {', '.join(unknown)}")
+            positions = positions.reindex(self.codes, fill_value=0.0).to_numpy()
+        return self.prices.loc[self.index].to_numpy() * np.asarray(positions, dtype=float)
+
+    def moments(self, positions):
+        """
+        Portfolio value V and the dollar mean and std of the book's daily
+        P&L, from the exposures e directly: e'mu and sqrt(e' Sigma e).
+        Nothing is divided by V, so long/short and dollar-neutral books
+        are handled like any other.
+        """
+        e = self.exposures(positions)
+        V = e.sum(axis=1)
+        mu_p = np.einsum("ti,ti->t", e, self.mu)
+        var_p = np.einsum("ti,tij,tj->t", e, self.cov, e)
+        return V, mu_p, np.sqrt(np.maximum(var_p, 0.0))
+
+    def parametric_var_es(self, positions, var_level: float,
+                          es_level: float) -> pd.DataFrame:
+        """
+        5-day delta-normal VaR and ES of the book in dollars: the P&L is
+        taken as e' r over 5 days, normal with mean 5 e'mu and std
+        sqrt(5 e' Sigma e), so short positions read the upper tail of
+        their assets through the sign of e.
+        """
+        _, mu, sigma = self.moments(positions)
+        var, es = delta_normal_var_es(mu, sigma, var_level, es_level)
+        return pd.DataFrame({"var": var, "es": es}, index=self.index)
+
+    def cholesky(self) -> np.ndarray:
+        """
+        Lower Cholesky factor of every cached covariance, computed once
+        and reused for all books (see jittered_cholesky).
+        """
+        if self._chol is None:
+            self._chol = jittered_cholesky(self.cov)
+        return self._chol
+
+    def mc_var_es(self, positions, var_level: float, es_level: float,
+                  n_sims: int, rng=None,
+                  mem_budget: int = MEM_BUDGET) -> pd.DataFrame:
+        """
+        5-day Monte Carlo VaR and ES of the book with correlated draws
+        r = 5 mu + sqrt(5) L z, each asset revalued on its own path.
+        """
+        e = self.exposures(positions)
+        L = self.cholesky()
+        n = len(self.codes)
+        rng = get_rng(rng)
+
+        var = np.empty(len(self.index))
+        es = np.empty(len(self.index))
+        rows = chunk_rows(n_sims * n, mem_budget)
+        for start in range(0, len(self.index), rows):
+            sl = slice(start, start + rows)
+            Z = rng.standard_normal((len(e[sl]), n_sims, n))
+            sims = np.sqrt(5) * np.einsum("tij,tsj->tsi", L[sl], Z)
+            sims += 5 * self.mu[sl, None, :]
+            losses = -np.einsum("tsi,ti->ts", np.expm1(sims), e[sl])
+            var[sl], es[sl] = tail_stats(losses, var_level, es_level)
+
+        return pd.DataFrame({"var": var, "es": es}, index=self.index)
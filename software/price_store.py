@@ -0,0 +1,140 @@
+# price_store.py
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BLOOMBERG_FIELDS = ("PX_LAST", "PX_OPEN", "PX_HIGH", "PX_LOW",
+                    "PX_VOLUME", "PX_CLOSE_1D")
+DATE_FORMAT = "%m/%d/%Y"
+META = "meta.json"
+DATES = "dates.npy"
+
+
+def ticker_from_path(path: str) -> str:
+    """'data/AAPL-bloomberg.csv' -> 'AAPL'."""
+    name = os.path.basename(path)
+    return name[:-len("-bloomberg.csv")] if name.endswith("-bloomberg.csv") else os.path.splitext(name)[0]
+
+
+def read_bloomberg_csv(path: str) -> pd.DataFrame:
+    """
+    Read a Bloomberg export (Dates, PX_LAST, PX_OPEN, ...) with the
+    M/D/YYYY dates parsed by an explicit format instead of inference.
+    """
+    df = pd.read_csv(path)
+    dates = df.pop(df.columns[0])
+    try:
+        index = pd.to_datetime(dates, format=DATE_FORMAT)
+    except ValueError:
+        index = pd.to_datetime(dates)
+    df.index = pd.DatetimeIndex(index, name="Dates")
+    return df.astype(float)
+
+
+def create(store_dir: str, dates, codes, fields=("PX_LAST",)) -> dict:
+    """
+    Lay out an empty store: an int64 date index, the column codes and one
+    (dates x codes) float64 .npy matrix per field, NaN-filled. Returns the
+    writable memory-mapped matrices so callers can fill them column by
+    column without holding the panel in memory.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    dates = pd.DatetimeIndex(dates)
+    np.save(os.path.join(store_dir, DATES), dates.as_unit("ns").asi8)
+    with open(os.path.join(store_dir, META), "w") as f:
+        json.dump({"codes": list(codes), "fields": list(fields)}, f)
+    out = {}
+    for field in fields:
+        m = np.lib.format.open_memmap(os.path.join(store_dir, f"{field}.npy"), mode="w+",
+                                      dtype=np.float64, shape=(len(dates), len(codes)))
+        m[:] = np.nan
+        out[field] = m
+    return out
+
+
+def open_store(store_dir: str, field: str = "PX_LAST", mmap: bool = True):
+    """
+    (dates, codes, values) for one field of a store. values is memory
+    mapped read-only, so nothing is parsed or copied on load.
+    """
+    with open(os.path.join(store_dir, META)) as f:
+        meta = json.load(f)
+    if field not in meta["fields"]:
+        raise KeyError(f"field {field} not in store (has {', '.join(meta['fields'])})")
+    dates = np.load(os.path.join(store_dir, DATES)).view("datetime64[ns]")
+    values = np.load(os.path.join(store_dir, f"{field}.npy"), mmap_mode="r" if mmap else None)
+    return dates, meta["codes"], values
+
+
+def load_frame(store_dir: str, field: str = "PX_LAST", codes=None) -> pd.DataFrame:
+    """
+    One field as a (dates x codes) DataFrame backed by the memory map.
+    """
+    dates, all_codes, values = open_store(store_dir, field)
+    frame = pd.DataFrame(values, index=pd.DatetimeIndex(dates, name="Dates"),
+                         columns=all_codes, copy=False)
+    return frame if codes is None else frame[list(codes)]
+
+
+def load_prices(path: str, field: str = "PX_LAST") -> pd.DataFrame:
+    """
+    Prices from either a store directory or a CSV with dates as index
+    and security codes as columns.
+    """
+    if os.path.isdir(path):
+        return load_frame(path, field)
+    return pd.read_csv(path, parse_dates=True, index_col=0)
+
+
+def convert_bloomberg(paths, store_dir: str, fields=BLOOMBERG_FIELDS):
+    """
+    Ingest Bloomberg CSVs (one ticker each) into a store on the union of
+    their calendars; dates a ticker does not trade are NaN.
+    """
+    frames = {ticker_from_path(p): read_bloomberg_csv(p) for p in paths}
+    fields = [f for f in fields if any(f in df.columns for df in frames.values())]
+    dates = pd.DatetimeIndex(sorted(set().union(*(df.index for df in frames.values()))))
+    out = create(store_dir, dates, list(frames), fields)
+    for j, df in enumerate(frames.values()):
+        rows = dates.get_indexer(df.index)
+        for field in fields:
+            if field in df.columns:
+                out[field][rows, j] = df[field].to_numpy()
+    for m in out.values():
+        m.flush()
+
+
+def convert_panel(csv_path: str, store_dir: str, field: str = "PX_LAST"):
+    """
+    Ingest a panel CSV (dates as index, codes as columns, e.g.
+    portfolio.csv) as a single-field store.
+    """
+    df = pd.read_csv(csv_path, parse_dates=True, index_col=0)
+    out = create(store_dir, df.index, df.columns, (field,))
+    out[field][:] = df.to_numpy(dtype=float)
+    out[field].flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert price CSVs into a memory-mapped columnar store.")
+    parser.add_argument("csv", nargs="+",
+                        help="*-bloomberg.csv files, or one panel CSV with --panel")
+    parser.add_argument("--out", required=True, help="store directory")
+    parser.add_argument("--panel", action="store_true",
+                        help="input is a dates x codes panel such as portfolio.csv")
+    args = parser.parse_args(argv)
+
+    if args.panel:
+        convert_panel(args.csv[0], args.out)
+    else:
+        convert_bloomberg(args.csv, args.out)
+    print(f"Wrote store to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
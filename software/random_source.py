@@ -0,0 +1,84 @@
+# random_source.py
+
+import warnings
+
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+SAMPLERS = ("pseudo", "antithetic", "stratified", "sobol", "halton")
+
+# keeps inverse-normal draws finite
+_TINY = 2.0**-53
+
+
+def get_rng(seed=None) -> np.random.Generator:
+    """
+    Random source shared by the Monte Carlo models.
+    seed may be a Generator (returned as is), a SeedSequence, an int,
+    or None for fresh OS entropy.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)
+
+
+def spawn(seed, n: int) -> list:
+    """
+    n statistically independent Generators derived from seed via
+    SeedSequence.spawn, e.g. one per worker or per block of dates.
+    The same seed always yields the same streams.
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(s) for s in seed.spawn(n)]
+
+
+def standard_normals(size, rng=None) -> np.ndarray:
+    """
+    Block of N(0, 1) draws. Draw once and pass the block to every
+    VaR/ES call and position on a date to use common random numbers.
+    """
+    return get_rng(rng).standard_normal(size)
+
+
+def normals(shape, rng=None, sampler: str = "pseudo") -> np.ndarray:
+    """
+    Block of N(0, 1) draws in which every slice along the last axis is
+    one sample, drawn with the given scheme:
+      pseudo      plain draws from rng (same stream as standard_normals)
+      antithetic  half the draws and their negatives
+      stratified  one uniform per equal-probability stratum
+      sobol       scrambled Sobol points (scipy.stats.qmc)
+      halton      scrambled Halton points
+    All but pseudo use the inverse-normal transform. For sobol and
+    halton one scrambled point set is shared by the block and each
+    sample gets its own random (Cranley-Patterson) shift mod 1, so the
+    samples stay independent of one another, which is what replicate
+    standard errors need.
+    """
+    rng = get_rng(rng)
+    shape = (int(shape),) if np.ndim(shape) == 0 else tuple(shape)
+    if sampler == "pseudo":
+        return rng.standard_normal(shape)
+    rows, m = int(np.prod(shape[:-1])), shape[-1]
+
+    if sampler == "antithetic":
+        half = rng.standard_normal((rows, (m + 1) // 2))
+        return np.concatenate([half, -half], axis=1)[:, :m].reshape(shape)
+
+    if sampler == "stratified":
+        u = (np.arange(m) + rng.random((rows, m))) / m
+    elif sampler in ("sobol", "halton"):
+        engine = (qmc.Sobol if sampler == "sobol" else qmc.Halton)(1, scramble=True, rng=rng)
+        with warnings.catch_warnings():
+            # Sobol balance is best at powers of two, but any m is usable
+            warnings.simplefilter("ignore", UserWarning)
+            base = engine.random(m)[:, 0]
+        u = base + rng.random((rows, 1))
+        u -= np.floor(u)
+    else:
+        raise ValueError(f"sampler must be one of {', '.join(SAMPLERS)}, got {sampler!r}")
+    return ndtri(np.clip(u, _TINY, 1 - _TINY)).reshape(shape)
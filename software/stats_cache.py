@@ -0,0 +1,108 @@
+# stats_cache.py
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+_cache = OrderedDict()
+_config = {"maxsize": 128, "disk_dir": None}
+_counts = {"hits": 0, "misses": 0}
+
+
+def configure(maxsize: int = None, disk_dir: str = None):
+    """
+    Set the in-memory LRU size and, optionally, a directory where every
+    computed entry is also pickled so later runs can start warm.
+    disk_dir='' turns the disk layer off again.
+    """
+    if maxsize is not None:
+        _config["maxsize"] = maxsize
+    if disk_dir is not None:
+        _config["disk_dir"] = disk_dir or None
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+    while len(_cache) > _config["maxsize"]:
+        _cache.popitem(last=False)
+
+
+def clear():
+    """Drop the in-memory entries and reset the hit/miss counters."""
+    _cache.clear()
+    _counts.update(hits=0, misses=0)
+
+
+def stats() -> dict:
+    return {**_counts, "size": len(_cache)}
+
+
+def series_key(prices: pd.Series) -> str:
+    """Content hash of a price series (values and index)."""
+    row_hashes = pd.util.hash_pandas_object(prices, index=True).to_numpy()
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+
+def cached(key: tuple, compute):
+    """
+    Value for key from memory, then disk, else compute() and store it.
+    Entries are shared between callers and must not be modified.
+    """
+    if key in _cache:
+        _cache.move_to_end(key)
+        _counts["hits"] += 1
+        return _cache[key]
+
+    path = None
+    if _config["disk_dir"]:
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        path = os.path.join(_config["disk_dir"], f"{name}.pkl")
+    if path and os.path.isfile(path):
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+        _counts["hits"] += 1
+    else:
+        with instrument.stage(f"stats_cache.{key[1]}"):
+            value = compute()
+        _counts["misses"] += 1
+        if path:
+            with open(path, "wb") as f:
+                pickle.dump(value, f)
+
+    _cache[key] = value
+    if len(_cache) > _config["maxsize"]:
+        _cache.popitem(last=False)
+    return value
+
+
+def log_returns(prices: pd.Series, horizon: int = 1) -> pd.Series:
+    """horizon-day log-returns log(P_t / P_{t-horizon}), NaNs dropped."""
+    return cached((series_key(prices), "log_ret", horizon),
+                  lambda: np.log(prices / prices.shift(horizon)).dropna())
+
+
+def rolling_moments(prices: pd.Series, window: int, lag: int = 1):
+    """
+    Mean and std of daily log-returns over `window` returns ending `lag`
+    returns before each date (lag=1: up to the previous day), as Series
+    on the log-return index.
+    """
+    def compute():
+        roll = log_returns(prices).rolling(window)
+        return roll.mean().shift(lag), roll.std().shift(lag)
+    return cached((series_key(prices), "rolling_mean_std", window, lag), compute)
+
+
+def ewm_moments(prices: pd.Series, lambda_: float):
+    """
+    Exponentially weighted (adjust=False) mean and std of daily
+    log-returns with decay lambda_, as Series on the log-return index.
+    """
+    def compute():
+        ewm = log_returns(prices).ewm(alpha=1 - lambda_, adjust=False)
+        return ewm.mean(), np.sqrt(ewm.var())
+    return cached((series_key(prices), "ewm_mean_std", lambda_), compute)
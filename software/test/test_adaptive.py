@@ -0,0 +1,46 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import parametric5yr
+import montecarlo
+from adaptive import top_estimates
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=2):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.RangeIndex(days))
+
+def test_top_estimates_match_full_sample():
+    L = np.random.default_rng(0).standard_normal((3, 5000))
+    top = np.sort(L, axis=1)[:, -200:]
+    var, es, _, _ = top_estimates(top, np.full(3, 5000), 0.99, 0.975)
+    ref_var, ref_es = montecarlo.tail_stats(L, 0.99, 0.975)
+    assert np.allclose(var, ref_var) and np.allclose(es, ref_es)
+
+def test_adaptive_stops_at_tolerance():
+    prices = simulate_gbm(0.05, 0.20)
+    ref = parametric5yr.compute_var_es(prices, 0.99, 0.975)
+    out = montecarlo.compute_var_es_adaptive(prices, 0.99, 0.975, 5*252, rel_tol=0.05,
+                                             batch=500, max_sims=20_000, rng=4)
+    assert list(out.columns) == ["var", "es", "var_se", "es_se", "n_sims"]
+    assert out["n_sims"].min() < out["n_sims"].max() <= 20_000
+    assert (out["n_sims"] % 500 == 0).all()
+
+    # intervals are honest: about 95% cover the closed form
+    err = (out[["var", "es"]] - ref.loc[out.index]).abs()
+    assert (err["var"] <= 1.96 * out["var_se"]).mean() > 0.85
+    assert (err["es"] <= 1.96 * out["es_se"]).mean() > 0.85
+    stopped = out["n_sims"] < 20_000
+    assert (1.96 * out.loc[stopped, "var_se"] <= 0.05 * out.loc[stopped, "var"]).all()
+
+    # a cap is respected even when the tolerance cannot be met
+    capped = montecarlo.compute_var_es_adaptive(prices.iloc[:1400], 0.99, 0.975, 5*252,
+                                                rel_tol=1e-6, batch=500, max_sims=1_800, rng=4)
+    assert (capped["n_sims"] == 1_500).all()
@@ -0,0 +1,89 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import backtest
+import historical
+import parametric5yr
+
+def simulate_gbm(mu, sigma, S0=100.0, days=10*252, seed=1):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal((mu - 0.5*sigma**2)*dt, sigma*np.sqrt(dt), size=days).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.RangeIndex(days))
+
+def test_matches_hand_rolled_exception_count():
+    prices = simulate_gbm(0.00, 0.01)
+    var = parametric5yr.compute_var(prices, 0.99)
+    pnl5 = (prices.shift(-5) - prices).loc[var.index]
+    res = backtest.backtest(backtest.realized_losses(prices), var, 0.99)
+    assert res["exceptions"].iloc[0] == (pnl5 < -var).sum()
+    assert res["n_obs"].iloc[0] == pnl5.notna().sum()
+    assert res["kupiec_p"].iloc[0] > 0.01
+
+def test_kupiec_and_christoffersen_known_values():
+    # x = 10 exceptions in 250 days at 99%: LR = 2 [10 ln(4) + 240 ln(0.96/0.99)]
+    lr, p = backtest.kupiec(10, 250, 0.99)
+    assert lr == pytest.approx(2 * (10*np.log(4) + 240*np.log(0.96/0.99)))
+    assert p == pytest.approx(3.2e-4, abs=1e-5)
+    # clustered exceptions fail independence, spread-out ones do not
+    exc = np.zeros((1000, 2), dtype=bool)
+    exc[100:110, 0] = True
+    exc[::100, 1] = True
+    lr, p = backtest.christoffersen(exc, np.ones_like(exc))
+    assert p[0] < 1e-6 and p[1] > 0.3
+
+def test_no_exceptions_is_independent():
+    # no exceptions at all, and a single one on the last date (never followed)
+    exc = np.zeros((500, 2), dtype=bool)
+    exc[-1, 1] = True
+    lr, p = backtest.christoffersen(exc, np.ones_like(exc))
+    np.testing.assert_allclose(lr, 0.0, atol=1e-12)
+    np.testing.assert_allclose(p, 1.0)
+    prices = simulate_gbm(0.0, 0.01, days=3*252)
+    res = backtest.backtest(backtest.realized_losses(prices), prices * 0 + 1e6, 0.99)
+    assert res["exceptions"].iloc[0] == 0
+    assert res["christoffersen_lr"].iloc[0] == 0.0
+    assert np.isfinite(res[["cc_lr", "cc_p"]].to_numpy()).all()
+
+def test_batched_models_and_books():
+    rng = np.random.default_rng(0)
+    n, books = 5000, ["a", "b", "c"]
+    losses = pd.DataFrame(rng.standard_normal((n, 3)), columns=books)
+    good_var = pd.DataFrame(norm.ppf(0.99), index=losses.index, columns=books)
+    low_var = good_var * 0.7
+    var = pd.concat({"good": good_var, "low": low_var}, axis=1)
+    es = pd.concat({"good": good_var * 0 + norm.pdf(norm.ppf(0.99)) / 0.01,
+                    "low": low_var * 0 + 0.7 * norm.pdf(norm.ppf(0.99)) / 0.01}, axis=1)
+    res = backtest.backtest(losses, var, 0.99, es=es)
+    assert res.shape[0] == 6
+    assert (res.loc["good", "kupiec_p"] > 0.01).all()
+    assert (res.loc["low", "kupiec_p"] < 1e-6).all()
+    assert (res.loc["good", "z2"].abs() < 0.5).all()
+    assert res.loc["low", "z2_reject"].all()
+
+def test_traffic_light_zones():
+    n = 600
+    losses = pd.Series(np.zeros(n))
+    var = pd.Series(np.ones(n))
+    losses.iloc[[100, 110, 120, 130]] = 2.0          # 4 in the first window
+    losses.iloc[300:306] = 2.0                       # 6 more, 10 once windows overlap
+    zones = backtest.traffic_light(losses, var, 0.99, 250)[0]
+    assert zones.iloc[:249].isna().all()
+    assert zones.iloc[249] == "green"
+    assert zones.iloc[305] == "red"                  # 4 + 6 in the window ending at 305
+    assert zones.iloc[380] == "yellow"               # only the 6 later ones
+    assert zones.iloc[599] == "green"
+    counts = backtest.rolling_exceptions(losses, var, 250)[0]
+    assert counts.iloc[305] == 10 and counts.iloc[380] == 6
+
+def test_historical_es_backtest_runs():
+    prices = simulate_gbm(0.05, 0.2, days=6*252)
+    out = historical.compute_var_es(prices, 0.975, 0.975, 252)
+    res = backtest.backtest(backtest.realized_losses(prices), out["var"], 0.975,
+                            es=out["es"], es_level=0.975, step=5)
+    assert res["n_obs"].iloc[0] == pytest.approx(len(out) / 5, abs=2)
+    assert np.isfinite(res["z2"].iloc[0])
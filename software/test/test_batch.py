@@ -0,0 +1,59 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import parametric5yr
+import parametric_ewm
+import historical
+import batch
+from portfolio import PortfolioEngine
+
+def simulate_panel(S0=100.0, days=6*252, seed=5):
+    rng = np.random.default_rng(seed)
+    dt = 1/252
+    inc = rng.normal(0.05*dt, 0.2*np.sqrt(dt), size=(days, 2)).cumsum(axis=0)
+    return pd.DataFrame(S0 * np.exp(inc), columns=["A", "B"],
+                        index=pd.bdate_range('2000-01-03', periods=days))
+
+def test_books_match_single_series_models():
+    prices = simulate_panel()
+    weights = pd.DataFrame({"mixed": [1.0, 2.0], "only_b": [0.0, 3.0]},
+                           index=["A", "B"])
+    table = batch.evaluate_books(prices, weights, 0.99, 0.975, n_sims=2_000, rng=0)
+
+    # one code: the same models on the price series, up to the
+    # delta-normal and tail-mean-of-losses approximations
+    series = prices @ weights["only_b"]
+    param = parametric5yr.compute_var_es(series, 0.99, 0.975).iloc[-1]
+    hist = historical.compute_var_es(series, 0.99, 0.975, 5*252).iloc[-1]
+    ewm = parametric_ewm.compute_var_es(series, 0.99, 0.975, 0.9989).iloc[-1]
+    row = table.loc["only_b"]
+    assert np.isclose(row["param_var"], param["var"], rtol=0.05)
+    assert np.isclose(row["param_es"], param["es"], rtol=0.05)
+    assert np.isclose(row["hist_var"], hist["var"], rtol=1e-4)
+    assert np.isclose(row["hist_es"], hist["es"], rtol=1e-3)
+    assert np.isclose(row["ewm_var"], ewm["var"], rtol=0.05)
+    assert np.isclose(row["ewm_es"], ewm["es"], rtol=0.05)
+
+    # several codes: the same delta-normal book as PortfolioEngine
+    for book in weights.columns:
+        engine = PortfolioEngine(prices).parametric_var_es(weights[book], 0.99, 0.975)
+        row = table.loc[book]
+        assert np.isclose(row["param_var"], engine["var"].iloc[-1])
+        assert np.isclose(row["param_es"], engine["es"].iloc[-1])
+        assert abs(row["mc_var"] / row["param_var"] - 1) < 0.1
+
+def test_books_are_evaluated_independently():
+    prices = simulate_panel()
+    base = batch.evaluate_books(prices, pd.DataFrame({"A": [1.0, 0.0]}, index=["A", "B"]),
+                                0.99, 0.975, n_sims=2_000, rng=0)
+    # a gap in B and long/short or empty books leave book A alone
+    prices.iloc[-300:-290, 1] = np.nan
+    weights = pd.DataFrame({"A": [1.0, 0.0], "LS": [1.0, -1.0], "zero": [0.0, 0.0]},
+                           index=["A", "B"])
+    table = batch.evaluate_books(prices, weights, 0.99, 0.975, n_sims=2_000, rng=0)
+    cols = ["param_var", "param_es", "ewm_var", "ewm_es", "hist_var", "hist_es"]
+    pd.testing.assert_series_equal(table.loc["A", cols], base.loc["A", cols])
+    assert (table.loc["LS", cols] > 0).all()
+    assert (table.loc["zero", cols + ["value"]] == 0).all()
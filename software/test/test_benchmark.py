@@ -0,0 +1,32 @@
+import sys, os
+import copy
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import benchmark
+
+def test_run_and_compare_against_baseline():
+    current = benchmark.run("quick", only=["parametric5yr"], repeat=1, verbose=False)
+    keys = list(current["results"])
+    assert keys == ["parametric5yr.compute_var[length=1500]",
+                    "parametric5yr.compute_es[length=1500]",
+                    "parametric5yr.compute_var[length=3000]",
+                    "parametric5yr.compute_es[length=3000]"]
+    r = current["results"][keys[0]]
+    assert r["rows"] == 1500 - 1 - 5*252
+    assert r["seconds"] > 0 and r["peak_mb"] > 0
+
+    assert benchmark.compare(current, current) == []
+    baseline = copy.deepcopy(current)
+    baseline["results"][keys[0]]["seconds"] = r["seconds"] / 2
+    (key, metric, _, _), = benchmark.compare(current, baseline, tolerance=0.25)
+    assert (key, metric) == (keys[0], "seconds")
+
+def test_collected_cases_keep_their_inputs():
+    grid = {"lengths": [1300, 1400], "windows": [252], "sims": [100], "assets": [1]}
+    rows = {}
+    for name, p, func in list(benchmark.cases(grid)):
+        if name in ("parametric5yr.compute_var", "historical.compute_var"):
+            rows[name, p["length"]] = func()
+    assert rows[("parametric5yr.compute_var", 1300)] == 1300 - 1 - 5*252
+    assert rows[("parametric5yr.compute_var", 1400)] == 1400 - 1 - 5*252
+    assert rows[("historical.compute_var", 1300)] + 100 == rows[("historical.compute_var", 1400)]
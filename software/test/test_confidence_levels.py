@@ -0,0 +1,102 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import parametric5yr
+import parametric_ewm
+import historical
+import filtered_historical
+import montecarlo
+import option_parametric
+import option_mento_carlo
+import option_portfolio
+from montecarlo import tail_stats, weighted_tail_stats
+
+LEVELS = [0.95, 0.975, 0.99, 0.995]
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=11):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal((mu - 0.5*sigma**2)*dt, sigma*np.sqrt(dt), size=days).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.bdate_range('2010-01-01', periods=days))
+
+def check_levels(multi, single_at, exact=True):
+    assert list(multi.columns) == LEVELS
+    for level in LEVELS:
+        single = single_at(level)
+        if exact:
+            pd.testing.assert_series_equal(multi[level].rename(None), single, check_names=False)
+        else:
+            np.testing.assert_allclose(multi[level].to_numpy(), single.to_numpy(), rtol=1e-12)
+
+def test_price_models_match_single_level_runs():
+    prices = simulate_gbm(0.05, 0.2)
+    check_levels(parametric5yr.compute_var(prices, LEVELS),
+                 lambda l: parametric5yr.compute_var(prices, l))
+    check_levels(parametric_ewm.compute_es(prices, LEVELS, 0.99),
+                 lambda l: parametric_ewm.compute_es(prices, l, 0.99))
+    check_levels(historical.compute_var(prices, LEVELS, 252),
+                 lambda l: historical.compute_var(prices, l, 252))
+    check_levels(historical.compute_es(prices, LEVELS, 252),
+                 lambda l: historical.compute_es(prices, l, 252))
+    check_levels(filtered_historical.compute_es(prices, LEVELS, 252),
+                 lambda l: filtered_historical.compute_es(prices, l, 252))
+    # same seed, same paths: every level matches its own run
+    check_levels(montecarlo.compute_var(prices, LEVELS, 252, 2000, rng=4),
+                 lambda l: montecarlo.compute_var(prices, l, 252, 2000, rng=4))
+    check_levels(montecarlo.compute_es(prices, LEVELS, 252, 2000, rng=4),
+                 lambda l: montecarlo.compute_es(prices, l, 252, 2000, rng=4))
+    check_levels(parametric_ewm.compute_es(prices, LEVELS, 0.99, n_sims=1000, rng=2, method="mc"),
+                 lambda l: parametric_ewm.compute_es(prices, l, 0.99, n_sims=1000, rng=2,
+                                                     method="mc"))
+
+def test_compute_var_es_columns_and_errors():
+    prices = simulate_gbm(0.05, 0.2)
+    out = montecarlo.compute_var_es(prices, [0.95, 0.99], [0.975], 252, 1000, rng=0)
+    assert list(out.columns) == [("var", 0.95), ("var", 0.99), ("es", 0.975)]
+    assert list(out["var"].columns) == [0.95, 0.99]
+    assert (out["var"][0.99] >= out["var"][0.95]).all()
+    with pytest.raises(ValueError):
+        montecarlo.compute_var_es(prices, LEVELS, LEVELS, 252, 1000, n_rep=10)
+    with pytest.raises(ValueError, match="single"):
+        montecarlo.compute_var_es_adaptive(prices, [0.95, 0.99], 0.975, 252)
+
+def test_option_models_match_single_level_runs():
+    prices = simulate_gbm(0.05, 0.25, days=400)
+    args = (prices, 100.0, 0.5)
+    for method in ("delta_normal", "delta_gamma"):
+        check_levels(option_parametric.compute_var_series(*args, LEVELS, 252, -1.0, method=method),
+                     lambda l: option_parametric.compute_var_series(*args, l, 252, -1.0,
+                                                                    method=method),
+                     exact=False)
+    check_levels(option_mento_carlo.compute_es_series(*args, LEVELS, 252, 1.0, n_sims=1000, rng=5),
+                 lambda l: option_mento_carlo.compute_es_series(*args, l, 252, 1.0,
+                                                                n_sims=1000, rng=5))
+    var = option_parametric.compute_var(100, 100, 0.5, 0.05, 0.2, 1, LEVELS)
+    assert var == pytest.approx([option_parametric.compute_var(100, 100, 0.5, 0.05, 0.2, 1, l)
+                                 for l in LEVELS])
+    es = option_mento_carlo.compute_es(100, 100, 0.5, 0.05, 0.2, 1, LEVELS, rng=1)
+    assert es == pytest.approx([option_mento_carlo.compute_es(100, 100, 0.5, 0.05, 0.2, 1, l,
+                                                              rng=1) for l in LEVELS])
+    book = option_portfolio.compute_var_es(
+        pd.DataFrame({"S": [100.0], "mu": [0.05], "sigma": [0.2]}, index=["A"]),
+        LEVELS, LEVELS, stocks=[("A", 10.0)], n_sims=2000, rng=0)
+    assert list(book["var"].columns) == LEVELS and list(book.index) == ["A", "total"]
+
+def test_tail_stats_share_one_partition():
+    rng = np.random.default_rng(0)
+    losses = rng.standard_normal((5, 999))
+    weights = np.exp(rng.standard_normal((5, 999)) * 0.1)
+    var, es = tail_stats(losses, LEVELS, LEVELS[1:])
+    wvar, wes = weighted_tail_stats(losses, weights, LEVELS, LEVELS[1:])
+    assert var.shape == (5, 4) and es.shape == (5, 3)
+    for k, level in enumerate(LEVELS):
+        v, e = tail_stats(losses, level, level)
+        np.testing.assert_array_equal(var[:, k], v)
+        if k:
+            # the tail is summed in partition order, so only to rounding
+            np.testing.assert_allclose(es[:, k - 1], e, rtol=1e-12)
+        wv, we = weighted_tail_stats(losses, weights, level, level)
+        np.testing.assert_array_equal(wvar[:, k], wv)
@@ -0,0 +1,59 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import option_parametric
+import option_mento_carlo
+import option_portfolio
+from option_parametric import bs_price_vec, greeks
+
+def test_greeks_match_finite_differences():
+    S, K, r, q, T, sigma, h = 100.0, 95.0, 0.05, 0.01, 0.5, 0.25, 1e-3
+    for call in (True, False):
+        g = greeks(S, K, r, q, T, sigma, call)
+        P = lambda S=S, T=T, sigma=sigma: bs_price_vec(S, K, r, q, T, sigma, call)
+        assert g["price"] == pytest.approx(P())
+        assert g["delta"] == pytest.approx((P(S+h) - P(S-h)) / (2*h), rel=1e-5)
+        assert g["gamma"] == pytest.approx((P(S+h) - 2*P() + P(S-h)) / h**2, rel=1e-4)
+        assert g["vega"] == pytest.approx((P(sigma=sigma+h) - P(sigma=sigma-h)) / (2*h), rel=1e-5)
+        assert g["theta"] == pytest.approx(-(P(T=T+h) - P(T=T-h)) / (2*h), rel=1e-5)
+
+def test_delta_gamma_close_to_full_repricing():
+    for option_type, position, K in [("call", 1.0, 100.0), ("put", 1.0, 95.0),
+                                     ("call", -1.0, 105.0), ("put", -1.0, 100.0)]:
+        args = (100.0, K, 0.25, 0.05, 0.3, position)
+        full_var = option_mento_carlo.compute_var(*args, 0.99, option_type=option_type,
+                                                  n_sims=200_000, rng=1)
+        full_es = option_mento_carlo.compute_es(*args, 0.975, option_type=option_type,
+                                                n_sims=200_000, rng=1)
+        for method in ("cornish_fisher", "mc"):
+            var, es = option_parametric.delta_gamma_var_es(
+                *args, 0.99, 0.975, option_type=option_type, method=method,
+                n_sims=200_000, rng=2)
+            assert var == pytest.approx(full_var, rel=0.03)
+            assert es == pytest.approx(full_es, rel=0.03)
+
+def test_book_aggregation_and_vega():
+    rng = np.random.default_rng(0)
+    n = 1000
+    K = 100 * rng.uniform(0.8, 1.2, n)
+    T = rng.uniform(0.1, 1.0, n)
+    position = rng.integers(-10, 10, n).astype(float)
+    option_type = rng.choice(["call", "put"], n)
+    var, es = option_parametric.delta_gamma_var_es(100.0, K, T, 0.05, 0.3, position,
+                                                   0.99, 0.975, option_type=option_type)
+    book = pd.DataFrame({"code": "A", "position": position, "K": K, "T": T,
+                         "r": 0.05, "q": 0.0, "option_type": option_type})
+    underlyings = pd.DataFrame({"S": [100.0], "mu": [0.05], "sigma": [0.3]}, index=["A"])
+    full = option_portfolio.compute_var_es(underlyings, 0.99, 0.975, options=book,
+                                           n_sims=100_000, rng=1, method="grid")
+    assert var == pytest.approx(full.loc["total", "var"], rel=0.03)
+    assert es == pytest.approx(full.loc["total", "es"], rel=0.03)
+
+    # a volatility shock only widens the distribution
+    var_v, es_v = option_parametric.delta_gamma_var_es(
+        100.0, K, T, 0.05, 0.3, position, 0.99, 0.975, option_type=option_type,
+        vol_shock=0.02)
+    assert var_v > var and es_v > es
@@ -0,0 +1,27 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import montecarlo
+from executor import Executor
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=6):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.RangeIndex(days))
+
+def test_backends_agree_for_same_seed():
+    prices = simulate_gbm(0.05, 0.20)
+    results = [
+        montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 1_000, rng=3,
+                                  executor=Executor(backend, workers=2, chunk_size=64))
+        for backend in ("serial", "thread", "process")
+    ]
+    for other in results[1:]:
+        pd.testing.assert_frame_equal(results[0], other)
@@ -0,0 +1,49 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import filtered_historical as fh
+import backtest
+
+def simulate_garch(omega=2e-6, alpha=0.08, beta=0.90, S0=100.0, days=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    s2, r = omega / (1 - alpha - beta), np.empty(days)
+    for t in range(days):
+        r[t] = np.sqrt(s2) * rng.standard_normal()
+        s2 = omega + alpha * r[t]**2 + beta * s2
+    return pd.Series(S0 * np.exp(np.cumsum(r)), index=pd.bdate_range('2000-01-03', periods=days))
+
+def test_conditional_variance_matches_recursion():
+    r = np.random.default_rng(1).standard_normal(300) * 0.01
+    omega, alpha, beta = 1e-6, 0.1, 0.85
+    expected = np.empty_like(r)
+    expected[0] = np.var(r)
+    for t in range(1, len(r)):
+        expected[t] = omega + alpha * r[t-1]**2 + beta * expected[t-1]
+    np.testing.assert_allclose(fh.conditional_variance(r, omega, alpha, beta), expected)
+
+def test_fit_recovers_garch_parameters():
+    prices = simulate_garch()
+    omega, alpha, beta = fh.vol_params(prices)
+    assert alpha == pytest.approx(0.08, abs=0.03)
+    assert beta == pytest.approx(0.90, abs=0.04)
+    assert fh.vol_params(prices, "ewma", 0.94) == (0.0, pytest.approx(0.06), 0.94)
+    with pytest.raises(ValueError):
+        fh.vol_params(prices, "arch")
+
+def test_horizon_variance_term_structure():
+    # flat at the long-run level, and days * next for EWMA
+    assert fh.horizon_variance(1e-4, 1e-6, 0.09, 0.9, 5) == pytest.approx(5e-4)
+    assert fh.horizon_variance(2e-4, 0.0, 0.06, 0.94, 5) == pytest.approx(1e-3)
+
+def test_exception_rate_with_short_window():
+    prices = simulate_garch()
+    for vol_model in ("garch", "ewma"):
+        out = fh.compute_var_es(prices, 0.99, 0.975, 500, vol_model=vol_model)
+        assert (out["es"] > 0).all()
+        res = backtest.backtest(backtest.realized_losses(prices), out["var"], 0.99, step=5)
+        assert abs(res["rate"].iloc[0] - 0.01) < 0.006
+    var = fh.compute_var(prices, 0.99, 500)
+    pd.testing.assert_series_equal(var, fh.compute_var_es(prices, 0.99, 0.99, 500)["var"].rename(None))
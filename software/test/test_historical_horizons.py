@@ -0,0 +1,62 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import historical
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=3):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal((mu - 0.5*sigma**2)*dt, sigma*np.sqrt(dt), size=days).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.bdate_range('2012-01-02', periods=days))
+
+def test_sqrt_time_scales_the_one_day_quantile():
+    prices = simulate_gbm(0.05, 0.2)
+    out = historical.compute_var_es_horizons(prices, 0.99, 0.975, 500, horizons=(1, 5, 10))
+    assert list(out["var"].columns) == [1, 5, 10]
+    r1 = np.log(prices / prices.shift(1)).dropna()
+    date = out.index[-1]
+    q1 = np.percentile(r1.iloc[-500:], 1)
+    S = prices[date]
+    assert out.loc[date, ("var", 1)] == pytest.approx(S * (1 - np.exp(q1)))
+    assert out.loc[date, ("var", 10)] == pytest.approx(S * (1 - np.exp(q1 * np.sqrt(10))))
+
+def test_non_overlapping_matches_direct_window():
+    prices = simulate_gbm(0.05, 0.2)
+    out = historical.compute_var_es_horizons(prices, 0.99, 0.975, 500, horizons=(1, 5),
+                                             method="non_overlapping")
+    r5 = np.log(prices / prices.shift(5))
+    date = out.index[-3]
+    pos = prices.index.get_loc(date)
+    sample = r5.iloc[pos - 5*99:pos + 1:5]          # 500 // 5 = 100 returns
+    assert len(sample) == 100
+    S = prices[date]
+    assert out.loc[date, ("var", 5)] == pytest.approx(S * (1 - np.exp(np.percentile(sample, 1))))
+    tail = sample[sample <= np.percentile(sample, 2.5)]
+    assert out.loc[date, ("es", 5)] == pytest.approx(S * (1 - np.exp(tail.mean())))
+    # one-day horizons coincide across methods
+    sqrt_t = historical.compute_var_es_horizons(prices, 0.99, 0.975, 500, horizons=(1,))
+    pd.testing.assert_series_equal(out[("var", 1)], sqrt_t[("var", 1)])
+
+def test_bootstrap_close_to_sqrt_time_for_iid_returns():
+    prices = simulate_gbm(0.0, 0.2)
+    args = (prices, 0.99, 0.975, 500, (1, 5, 10))
+    boot = historical.compute_var_es_horizons(*args, method="bootstrap", n_boot=4000, rng=0)
+    sqrt_t = historical.compute_var_es_horizons(*args)
+    rel = (boot / sqrt_t - 1).abs().median()
+    assert (rel < 0.12).all()
+    again = historical.compute_var_es_horizons(*args, method="bootstrap", n_boot=4000, rng=0,
+                                               mem_budget=2**20)
+    pd.testing.assert_frame_equal(boot, again)
+    with pytest.raises(ValueError):
+        historical.compute_var_es_horizons(*args, method="overlapping")
+
+def test_short_series_gives_empty_frame():
+    prices = simulate_gbm(0.05, 0.2, days=300)
+    for method in historical.HORIZON_METHODS:
+        for window in (300, 400):
+            out = historical.compute_var_es_horizons(prices, 0.99, 0.975, window,
+                                                     horizons=(1, 5), method=method, rng=0)
+            assert out.empty and list(out["var"].columns) == [1, 5]
@@ -0,0 +1,41 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import parametric5yr
+import parametric_ewm
+import historical
+from incremental import ModelState, Parametric5yrState, EwmState, HistoricalState
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=7):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments),
+                     index=pd.bdate_range('2010-01-01', periods=days))
+
+def test_delta_update_matches_full_recompute(tmp_path):
+    prices = simulate_gbm(0.05, 0.20)
+    head, new = prices.iloc[:-15], prices.iloc[-15:]
+
+    state = Parametric5yrState.from_prices(head, 0.99, 0.975)
+    state.save(tmp_path / "p5.pkl")
+    tail = ModelState.load(tmp_path / "p5.pkl").update(new)
+    full = parametric5yr.compute_var_es(prices, 0.99, 0.975).iloc[-15:]
+    assert tail.index.equals(full.index)
+    assert np.allclose(tail, full, rtol=1e-10)
+
+    tail = HistoricalState.from_prices(head, 0.99, 0.975, 5*252).update(new)
+    full = historical.compute_var_es(prices, 0.99, 0.975, 5*252).iloc[-15:]
+    assert np.allclose(tail, full, rtol=1e-12)
+
+    state = EwmState.from_prices(head, 0.99, 0.975, 0.9989)
+    tail = state.update(new)
+    full = parametric_ewm.compute_var_es(prices, 0.99, 0.975, 0.9989)
+    assert np.allclose(tail, full.iloc[-15:], rtol=1e-12)
+    assert len(state.results) == len(full)
@@ -0,0 +1,55 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import ingest
+import price_store
+
+def write_bloomberg(path, dates, px):
+    pd.DataFrame({
+        "Dates": [f"{d.month}/{d.day}/{d.year}" for d in dates],
+        "PX_LAST": px,
+    }).to_csv(path, index=False)
+
+def test_align_fill_and_skip_unchanged(tmp_path):
+    dates = pd.bdate_range('2022-03-01', periods=8)
+    write_bloomberg(tmp_path / "AAA-bloomberg.csv", dates, np.arange(8.0))
+    # BBB starts later and misses one day
+    write_bloomberg(tmp_path / "BBB-bloomberg.csv", dates[2:].delete(3), np.arange(5.0))
+    store = str(tmp_path / "store")
+
+    first = ingest.ingest(str(tmp_path), store, how="intersection", workers=1)
+    assert first["parsed"] == ["AAA", "BBB"]
+    panel = price_store.load_frame(store)
+    assert panel.index.equals(pd.DatetimeIndex(dates[2:].delete(3), name="Dates"))
+
+    again = ingest.ingest(str(tmp_path), store, how="intersection", workers=1)
+    assert again == {"parsed": [], "reused": ["AAA", "BBB"]}
+    pd.testing.assert_frame_equal(price_store.load_frame(store), panel)
+
+    # changing a setting invalidates the reuse; ffill closes the gap only
+    ingest.ingest(str(tmp_path), store, how="union", fill="ffill", workers=1)
+    panel = price_store.load_frame(store)
+    assert len(panel) == 8
+    assert panel["BBB"].iloc[:2].isna().all()
+    assert panel["BBB"].iloc[5] == panel["BBB"].iloc[4]
+
+def test_refuses_to_replace_unrelated_directory(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    write_bloomberg(src / "AAA-bloomberg.csv", pd.bdate_range('2022-03-01', periods=4),
+                    np.arange(4.0))
+    # pointing --out at the source directory must not delete the inputs
+    with pytest.raises(FileExistsError):
+        ingest.ingest(str(src), str(src), workers=1)
+    assert os.path.isfile(src / "AAA-bloomberg.csv")
+    assert not os.path.exists(str(src) + ".tmp")
+
+    store = tmp_path / "store"
+    store.mkdir()
+    ingest.ingest(str(src), str(store), workers=1)
+    ingest.ingest(str(src), str(store), workers=1)
+    assert list(price_store.load_frame(str(store)).columns) == ["AAA"]
+    assert not os.path.exists(str(store) + ".old")
@@ -0,0 +1,56 @@
+import sys, os
+import json
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import instrument
+import stats_cache
+import historical
+import montecarlo
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=3):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments),
+                     index=pd.bdate_range('2010-01-01', periods=days))
+
+def test_disabled_is_a_noop():
+    instrument.disable()
+    instrument.reset()
+    with instrument.stage("x"):
+        instrument.count("n", 5)
+    assert instrument.report() == {"stages": {}, "counters": {}}
+
+def test_stages_counters_and_report(tmp_path):
+    prices = simulate_gbm(0.05, 0.20)
+    stats_cache.clear()
+    instrument.reset()
+    instrument.enable(memory=True)
+    try:
+        with instrument.stage("models"):
+            with instrument.stage("historical"):
+                hist = historical.compute_var_es(prices, 0.99, 0.975, 252)
+            with instrument.stage("montecarlo"):
+                mc = montecarlo.compute_var_es(prices, 0.99, 0.975, 252, 500, rng=0)
+        rep = instrument.report()
+    finally:
+        instrument.disable()
+        stats_cache.clear()
+
+    assert set(rep["stages"]) >= {"models", "models/historical", "models/montecarlo",
+                                  "models/historical/stats_cache.log_ret"}
+    assert rep["stages"]["models"]["calls"] == 1
+    assert rep["stages"]["models"]["seconds"] >= rep["stages"]["models/montecarlo"]["seconds"]
+    # the outer stage's peak covers its children
+    assert rep["stages"]["models"]["peak_mb"] >= rep["stages"]["models/montecarlo"]["peak_mb"] > 0
+    assert rep["counters"] == {"historical.windows": len(hist),
+                               "montecarlo.simulations": len(mc) * 500}
+
+    instrument.write_report(str(tmp_path / "r.json"), rep)
+    assert json.load(open(tmp_path / "r.json"))["counters"] == rep["counters"]
@@ -0,0 +1,66 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import option_portfolio
+import option_mento_carlo
+
+UNDERLYINGS = pd.DataFrame({"S": [100.0, 50.0], "mu": [0.05, 0.08], "sigma": [0.2, 0.35]},
+                           index=["A", "B"])
+
+def random_book(n, seed=0):
+    rng = np.random.default_rng(seed)
+    opts = pd.DataFrame({
+        "code": rng.choice(["A", "B"], n),
+        "position": rng.integers(-50, 50, n).astype(float),
+        "T": rng.uniform(0.01, 2.0, n),
+        "r": 0.05, "q": 0.0,
+        "option_type": rng.choice(["call", "put"], n),
+    })
+    opts["K"] = opts["code"].map(UNDERLYINGS["S"]) * rng.uniform(0.7, 1.3, n)
+    return opts
+
+def test_single_option_matches_full_repricing():
+    Z = np.random.default_rng(5).standard_normal((1, 5000))
+    option = [{"code": "A", "position": 10.0, "K": 95.0, "T": 0.5, "r": 0.05,
+               "q": 0.0, "sigma": 0.2, "option_type": "put"}]
+    losses = option_portfolio.book_losses(UNDERLYINGS.iloc[:1], options=option, Z=Z)
+    ref = option_mento_carlo._reprice_losses(100.0, 95.0, 0.5, 0.05, 0.2, 10.0,
+                                             0.05, 0.0, False, Z[0])
+    assert np.allclose(losses["total"], ref)
+
+def test_grid_matches_exact_within_tolerance():
+    opts = random_book(500)
+    stocks = [("A", 1000.0), ("B", -200.0)]
+    exact = option_portfolio.book_losses(UNDERLYINGS, stocks, opts, n_sims=4000, rng=1)
+    grid = option_portfolio.book_losses(UNDERLYINGS, stocks, opts, n_sims=4000, rng=1,
+                                        method="grid", tol=0.01)
+    # tol is per underlying; the total adds two of them
+    assert (exact - grid).abs().to_numpy().max() < 0.02
+
+def test_book_aggregates_on_shared_paths():
+    # a protective put nets against the stock on the same paths
+    stocks = [("A", 100.0)]
+    put = [{"code": "A", "position": 100.0, "K": 100.0, "T": 0.25, "r": 0.05,
+            "q": 0.0, "option_type": "put"}]
+    stock_only = option_portfolio.compute_var_es(UNDERLYINGS.iloc[:1], 0.99, 0.975,
+                                                 stocks, None, n_sims=20_000, rng=2)
+    hedged = option_portfolio.compute_var_es(UNDERLYINGS.iloc[:1], 0.99, 0.975,
+                                             stocks, put, n_sims=20_000, rng=2)
+    assert hedged.loc["total", "var"] < 0.6 * stock_only.loc["total", "var"]
+
+    # perfectly correlated underlyings add up; independent ones diversify
+    stocks = [("A", 100.0), ("B", 200.0)]
+    corr = np.array([[1.0, 1.0 - 1e-12], [1.0 - 1e-12, 1.0]])
+    together = option_portfolio.compute_var_es(UNDERLYINGS, 0.99, 0.975, stocks,
+                                               n_sims=20_000, rng=3, corr=corr)
+    apart = option_portfolio.compute_var_es(UNDERLYINGS, 0.99, 0.975, stocks,
+                                            n_sims=20_000, rng=3)
+    assert together.loc["total", "var"] == pytest.approx(
+        together.loc[["A", "B"], "var"].sum(), rel=0.01)
+    assert apart.loc["total", "var"] < 0.9 * apart.loc[["A", "B"], "var"].sum()
+
+    with pytest.raises(KeyError):
+        option_portfolio.book_losses(UNDERLYINGS, [("C", 1.0)])
@@ -0,0 +1,62 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import option_parametric
+import option_mento_carlo
+from option_parametric import greeks
+
+def simulate_gbm(mu, sigma, S0=100.0, days=3*252, seed=5):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal((mu - 0.5*sigma**2)*dt, sigma*np.sqrt(dt), size=days).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.bdate_range('2015-01-01', periods=days))
+
+def test_series_matches_per_date_formula():
+    prices = simulate_gbm(0.05, 0.25)
+    K, T, w = 100.0, 2.0, 252
+    out = option_parametric.compute_var_es_series(prices, K, T, 0.99, 0.975, w, 1.0)
+    mu, sigma = option_parametric._window_estimates(prices, w)
+    for i in (0, 100, len(out) - 1):
+        date = out.index[i]
+        S, m, s, T_t = prices[date], mu[date], sigma[date], T - i/252
+        delta = greeks(S, K, 0.05, 0.0, T_t, s)["delta"]
+        dt = 5/252
+        drift = (m - 0.5*s**2) * dt
+        mu_P = delta * S * (np.exp(drift) - 1)
+        sigma_P = delta * S * np.exp(drift) * np.sqrt(np.exp(s**2*dt) - 1)
+        assert out["var"].iloc[i] == pytest.approx(-mu_P + 2.3263478740 * sigma_P)
+
+def test_time_to_maturity_decays_and_expires():
+    prices = simulate_gbm(0.05, 0.25)
+    w, T = 252, 1.0
+    fixed = option_parametric.compute_var_es_series(prices, 100.0, T, 0.99, 0.975, w, 1.0,
+                                                    decay=False)
+    decayed = option_parametric.compute_var_es_series(prices, 100.0, T, 0.99, 0.975, w, 1.0)
+    # same first date, then the decaying option's risk diverges and it expires after a year
+    assert decayed["var"].iloc[0] == pytest.approx(fixed["var"].iloc[0])
+    assert len(fixed) == len(prices) - w - 1
+    assert len(decayed) == 252
+    assert not np.allclose(decayed["var"].iloc[200:], fixed["var"].iloc[200:252])
+
+def test_short_positions_and_wrappers():
+    prices = simulate_gbm(0.05, 0.25)
+    long_ = option_parametric.compute_var_es_series(prices, 100.0, 2.0, 0.99, 0.975, 252, 1.0)
+    short = option_parametric.compute_var_es_series(prices, 100.0, 2.0, 0.99, 0.975, 252, -1.0)
+    assert (short > 0).all().all() and (long_ > 0).all().all()
+    assert (long_["es"] > long_["var"]).all()
+    var = option_parametric.compute_var_series(prices, 100.0, 2.0, 0.99, 252, 1.0)
+    pd.testing.assert_series_equal(var, long_["var"].rename(None))
+
+def test_delta_gamma_series_close_to_monte_carlo():
+    prices = simulate_gbm(0.05, 0.25, days=400)
+    args = (prices, 100.0, 0.25, 0.99, 0.975, 252, -1.0)
+    dg = option_parametric.compute_var_es_series(*args, method="delta_gamma", decay=False)
+    mc = option_mento_carlo.compute_var_es_series(*args, n_sims=20000, rng=3)
+    both = dg.index.intersection(mc.index)
+    rel = (dg.loc[both] / mc.loc[both] - 1).abs().median()
+    assert rel["var"] < 0.05 and rel["es"] < 0.05
+    with pytest.raises(ValueError):
+        option_parametric.compute_var_es_series(*args, method="full")
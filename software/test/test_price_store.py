@@ -0,0 +1,30 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import price_store
+
+def write_bloomberg(path, dates, px):
+    pd.DataFrame({
+        "Dates": [f"{d.month}/{d.day}/{d.year}" for d in dates],
+        "PX_LAST": px,
+        "PX_OPEN": px,
+    }).to_csv(path, index=False)
+
+def test_bloomberg_roundtrip_on_union_calendar(tmp_path):
+    dates = pd.bdate_range('2021-01-01', periods=10)
+    write_bloomberg(tmp_path / "AAA-bloomberg.csv", dates, np.arange(10.0))
+    write_bloomberg(tmp_path / "BBB-bloomberg.csv", dates[3:], np.arange(7.0) + 100)
+
+    store = tmp_path / "store"
+    price_store.convert_bloomberg(
+        [tmp_path / "AAA-bloomberg.csv", tmp_path / "BBB-bloomberg.csv"], store)
+    frame = price_store.load_prices(str(store))
+
+    assert list(frame.columns) == ["AAA", "BBB"]
+    assert frame.index.equals(pd.DatetimeIndex(dates, name="Dates"))
+    assert np.array_equal(frame["AAA"], np.arange(10.0))
+    assert frame["BBB"].iloc[:3].isna().all()
+    assert np.array_equal(frame["BBB"].iloc[3:], np.arange(7.0) + 100)
+    assert list(price_store.load_frame(str(store), "PX_OPEN")["AAA"]) == list(np.arange(10.0))
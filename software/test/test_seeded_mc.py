@@ -0,0 +1,50 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import montecarlo
+import input_mu_sigma
+from random_source import spawn
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=3):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.RangeIndex(days))
+
+def test_same_seed_same_series():
+    prices = simulate_gbm(0.05, 0.20)
+    a = montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 2_000, rng=7)
+    b = montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 2_000, rng=7)
+    pd.testing.assert_frame_equal(a, b)
+
+def test_spawned_streams_differ_and_repeat():
+    first  = [g.standard_normal(5) for g in spawn(11, 3)]
+    second = [g.standard_normal(5) for g in spawn(11, 3)]
+    assert all(np.array_equal(x, y) for x, y in zip(first, second))
+    assert not np.array_equal(first[0], first[1])
+
+def test_common_draws_scale_with_position():
+    # with shared draws, doubling the position exactly doubles VaR
+    Z = np.random.default_rng(0).standard_normal(10_000)
+    v1 = input_mu_sigma.mc_var(100.0, 1, 0.05, 0.2, 0.99, len(Z), Z=Z)
+    v2 = input_mu_sigma.mc_var(100.0, 2, 0.05, 0.2, 0.99, len(Z), Z=Z)
+    assert v2 == 2 * v1
+
+def test_book_uses_the_per_position_draws():
+    stocks = [("A", 10.0, 100.0, 0.0005, 0.02), ("B", -5.0, 50.0, 0.0003, 0.015)]
+    underlyings = input_mu_sigma._underlyings(stocks, [])
+    shocks = np.random.default_rng(0).standard_normal((2, 5000))
+    book = input_mu_sigma._portfolio_var_es(underlyings, stocks, [], 0.99, 0.975, 5000, shocks)
+    for (code, pos, S, mu, sigma), Z in zip(stocks, shocks):
+        assert book.loc[code, "var"] == pytest.approx(
+            input_mu_sigma.mc_var(S, pos, mu, sigma, 0.99, 5000, Z=Z))
+    # one code, two different sets of inputs
+    with pytest.raises(ValueError):
+        input_mu_sigma._underlyings(stocks + [("A", 1.0, 101.0, 0.0005, 0.02)], [])
@@ -0,0 +1,33 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import historical
+from historical import SortedWindow
+
+def test_matches_rolling_percentile():
+    rng = np.random.default_rng(0)
+    # rounded so the window holds ties
+    x = np.round(rng.standard_normal(600), 2)
+    window = 250
+    win = SortedWindow(window)
+    for t, v in enumerate(x):
+        win.push(v)
+        if not win.full():
+            continue
+        ref = x[t - window + 1:t + 1]
+        for alpha in (0.01, 0.025, 0.05, 0.5):
+            cutoff = np.percentile(ref, 100 * alpha)
+            assert win.quantile(alpha) == cutoff
+            assert np.isclose(win.tail_mean(alpha), ref[ref <= cutoff].mean(), rtol=1e-14)
+
+def test_historical_matches_rolling_reference():
+    rng = np.random.default_rng(1)
+    prices = pd.Series(100 * np.exp(np.cumsum(rng.standard_normal(800) * 0.01)),
+                       index=pd.bdate_range('2015-01-01', periods=800))
+    out = historical.compute_var_es(prices, 0.99, 0.975, 300)
+    r5 = np.log(prices / prices.shift(5)).dropna()
+    q = r5.rolling(300).apply(lambda w: np.percentile(w, 1), raw=True).dropna()
+    assert out.index.equals(q.index)
+    np.testing.assert_array_equal(out["var"], prices.loc[q.index] * (1 - np.exp(q)))
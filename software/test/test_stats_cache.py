@@ -0,0 +1,47 @@
+import sys, os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import stats_cache
+import parametric5yr
+import montecarlo
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=11):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments),
+                     index=pd.bdate_range('2010-01-01', periods=days))
+
+def test_moments_computed_once_across_models(tmp_path):
+    prices = simulate_gbm(0.05, 0.20)
+    stats_cache.clear()
+    parametric5yr.compute_var_es(prices, 0.99, 0.975)
+    montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 200, rng=1)
+    # log returns and the 1260-day moments, each built once
+    assert stats_cache.stats()["misses"] == 2
+
+    # a copy of the series hashes to the same entry
+    mu, sigma = parametric5yr.rolling_moments(prices.copy())
+    assert stats_cache.stats()["misses"] == 2
+    log_ret = np.log(prices / prices.shift(1)).dropna()
+    assert np.allclose(mu, log_ret.rolling(5*252).mean().shift(1), equal_nan=True)
+
+    # entries written to disk are picked up after the memory is cleared
+    stats_cache.configure(disk_dir=str(tmp_path))
+    try:
+        stats_cache.clear()
+        parametric5yr.rolling_moments(prices)
+        stats_cache.clear()
+        mu2, _ = parametric5yr.rolling_moments(prices)
+        assert stats_cache.stats() == {"hits": 1, "misses": 0, "size": 1}
+        assert mu2.equals(mu)
+    finally:
+        # never leave the cache pointing at the deleted tmp dir
+        stats_cache.configure(disk_dir="")
+        stats_cache.clear()
@@ -0,0 +1,99 @@
+import sys, os
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import parametric5yr
+import montecarlo
+import option_mento_carlo
+from random_source import SAMPLERS, normals
+
+def simulate_gbm(mu, sigma, S0=100.0, days=6*252, seed=2):
+    np.random.seed(seed)
+    dt = 1/252
+    increments = np.random.normal(
+        (mu - 0.5*sigma**2)*dt,
+        sigma*np.sqrt(dt),
+        size=days
+    ).cumsum()
+    return pd.Series(S0 * np.exp(increments), index=pd.RangeIndex(days))
+
+def rel_err(mc, ref):
+    idx = ref.index.intersection(mc.index)
+    return ((mc.loc[idx] - ref.loc[idx]) / ref.loc[idx]).abs().mean()
+
+def test_samplers_are_standard_normal():
+    for sampler in SAMPLERS:
+        Z = normals((4, 2, 512), rng=0, sampler=sampler)
+        assert Z.shape == (4, 2, 512) and np.isfinite(Z).all()
+        assert abs(Z.mean()) < 0.1 and abs(Z.std() - 1) < 0.1
+    with pytest.raises(ValueError):
+        normals(10, 0, "lhs")
+
+def test_stratified_matches_parametric_with_fewer_paths():
+    prices = simulate_gbm(0.05, 0.20)
+    ref = parametric5yr.compute_var_es(prices, 0.99, 0.975)
+    # the pseudo-random agreement test needs 20,000 paths for 10%
+    mc = montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 2_000, rng=1,
+                                   sampler="stratified")
+    assert rel_err(mc["var"], ref["var"]) < 0.01
+    assert rel_err(mc["es"], ref["es"]) < 0.01
+
+def test_standard_errors_and_control_variate():
+    prices = simulate_gbm(0.05, 0.20)
+    ref = parametric5yr.compute_var_es(prices, 0.99, 0.975)
+    plain = montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 1_000, rng=3, n_rep=10)
+    assert list(plain.columns) == ["var", "es", "var_se", "es_se"]
+    # the reported standard error matches the realised error
+    ratio = rel_err(plain["var"], ref["var"]) / (plain["var_se"] / plain["var"]).mean()
+    assert 0.5 < ratio < 1.5
+
+    cv = montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 1_000, rng=3, control=True)
+    assert rel_err(cv["var"], ref["var"]) < 0.1 * rel_err(plain["var"], ref["var"])
+    assert (cv["es_se"] < plain["es_se"]).all()
+
+    with pytest.raises(ValueError):
+        montecarlo.compute_var_es(prices, 0.99, 0.975, 5*252, 1_000, n_rep=7)
+
+def test_option_control_variate_for_short_and_long():
+    prices = simulate_gbm(0.05, 0.20, days=1400)
+    for position, option_type in [(1.0, "call"), (1.0, "put"), (-1.0, "call")]:
+        ref = option_mento_carlo.compute_var_es_series(
+            prices, 100.0, 0.5, 0.99, 0.975, 5*252, position, option_type=option_type,
+            n_sims=50_000, rng=0, sampler="stratified")
+        plain = option_mento_carlo.compute_var_es_series(
+            prices, 100.0, 0.5, 0.99, 0.975, 5*252, position, option_type=option_type,
+            n_sims=1_000, rng=5, n_rep=10)
+        cv = option_mento_carlo.compute_var_es_series(
+            prices, 100.0, 0.5, 0.99, 0.975, 5*252, position, option_type=option_type,
+            n_sims=1_000, rng=5, control=True)
+        assert rel_err(cv["var"], ref["var"]) < 0.5 * rel_err(plain["var"], ref["var"])
+        assert cv["var_se"].mean() < 0.5 * plain["var_se"].mean()
+
+def test_weighted_tail_stats_with_unit_weights():
+    L = np.random.default_rng(0).standard_normal((3, 50_000))
+    var, es = montecarlo.weighted_tail_stats(L, np.ones_like(L), 0.99, 0.975)
+    ref_var, ref_es = montecarlo.tail_stats(L, 0.99, 0.975)
+    assert np.allclose(var, ref_var, rtol=1e-3)
+    assert np.allclose(es, ref_es, rtol=1e-3)
+
+def test_importance_sampling_deep_tail():
+    prices = simulate_gbm(0.05, 0.20)
+    ref = parametric5yr.compute_var_es(prices, 0.999, 0.999)
+    plain = montecarlo.compute_var_es(prices, 0.999, 0.999, 5*252, 20_000, rng=1)
+    tilted = montecarlo.compute_var_es(prices, 0.999, 0.999, 5*252, 2_000, rng=1,
+                                       importance="auto")
+    # a tenth of the paths, still more precise
+    assert rel_err(tilted["es"], ref["es"]) < 0.5 * rel_err(plain["es"], ref["es"])
+    assert rel_err(tilted["var"], ref["var"]) < 0.5 * rel_err(plain["var"], ref["var"])
+
+    for position, option_type in [(1.0, "put"), (-1.0, "call")]:
+        args = (prices.iloc[:1400], 100.0, 0.5, 0.999, 0.999, 5*252, position)
+        ref = option_mento_carlo.compute_var_es_series(
+            *args, option_type=option_type, n_sims=100_000, rng=0, sampler="stratified")
+        plain = option_mento_carlo.compute_var_es_series(
+            *args, option_type=option_type, n_sims=20_000, rng=1)
+        tilted = option_mento_carlo.compute_var_es_series(
+            *args, option_type=option_type, n_sims=2_000, rng=1, importance="auto")
+        assert rel_err(tilted["es"], ref["es"]) < rel_err(plain["es"], ref["es"])